@@ -6,6 +6,10 @@ from textwrap import dedent
 
 from modi_firmware_updater.core.esp32_updater import ESP32FirmwareUpdater
 from modi_firmware_updater.core.stm32_updater import STM32FirmwareUpdater
+from modi_firmware_updater.util.firmware_bundle import (FirmwareBundle,
+                                                        build_firmware_bundle)
+from modi_firmware_updater.util.module_util import ModuleFilter
+from modi_firmware_updater.util.update_events import ERROR, MODULE_DONE
 
 
 def check_option(*options):
@@ -15,6 +19,29 @@ def check_option(*options):
     return False
 
 
+def get_list_option(*options):
+    value = check_option(*options)
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+def get_module_filter():
+    # Other modules keep running while the selected ones are updated
+    return ModuleFilter(
+        module_types=get_list_option('--types'),
+        module_ids=[int(module_id, 0) for module_id in get_list_option('--ids')],
+        module_uuids=[int(module_uuid, 0) for module_uuid in get_list_option('--uuids')],
+    )
+
+
+def print_update_event(update_event):
+    module_name = f"{update_event.module_type or 'module'} ({update_event.module_id})"
+    if update_event.event_type == ERROR:
+        print(f"\nUpdate of {module_name} failed: {update_event.message}")
+    else:
+        details = f": {update_event.message}" if update_event.message else ""
+        print(f"\nUpdate of {module_name} is done{details}")
+
+
 if __name__ == '__main__':
     usage = dedent(
         """
@@ -23,15 +50,25 @@ if __name__ == '__main__':
         -t, --tutorial: Interactive Tutorial
         -d, --debug: Auto initialization debugging mode
         -h, --help: Print out help page
+        -f, --bundle=<path>: Update from an offline firmware bundle
+        -j, --in_flight=<n>: Number of modules flashed at once (default 1)
+        --force: Flash modules even if they are already up to date
+        --types=<types>: Only update modules of these types, e.g. motor,led
+        --ids=<ids>: Only update modules with these ids
+        --uuids=<uuids>: Only update modules with these UUIDs, e.g. 0x40100000ABC
+        --timing=<path>: Append per-page timings to a JSON lines file
+        --build_bundle=<path>: Pack local firmware into an offline bundle
         """.rstrip()
     )
 
     try:
         # All commands should be defined here in advance
         opts, args = getopt(
-            sys.argv[1:], 'nbm',
+            sys.argv[1:], 'nbmf:j:',
             [
                 'update_network', 'update_network_base', 'update_modules',
+                'bundle=', 'build_bundle=', 'in_flight=', 'force', 'timing=',
+                'types=', 'ids=', 'uuids=',
             ]
         )
     # Exit program if an invalid option has been entered
@@ -45,10 +82,33 @@ if __name__ == '__main__':
         print(usage)
         os._exit(2)
 
+    # Pack local firmware into an offline bundle
+    bundle_path = check_option('--build_bundle')
+    if bundle_path:
+        init_time = time.time()
+        build_firmware_bundle(bundle_path)
+        fin_time = time.time()
+        print(f'Took {fin_time - init_time:.2f} seconds to build {bundle_path}')
+        os._exit(0)
+
+    # Flash from an offline bundle instead of the local firmware
+    firmware_bundle = None
+    bundle_path = check_option('-f', '--bundle')
+    if bundle_path:
+        firmware_bundle = FirmwareBundle(bundle_path)
+
+    # Interleave data of several modules behind one network module
+    max_in_flight = int(check_option('-j', '--in_flight') or 1)
+    timing_path = check_option('--timing') or None
+    module_filter = get_module_filter()
+
     # Update ESP32 module (only network module)
     if check_option('-n', '--update_network'):
         init_time = time.time()
-        updater = ESP32FirmwareUpdater()
+        updater = ESP32FirmwareUpdater(
+            firmware_bundle=firmware_bundle, timing_path=timing_path
+        )
+        updater.events.subscribe(print_update_event, (MODULE_DONE, ERROR))
         updater.update_firmware()
         fin_time = time.time()
         print(f'Took {fin_time - init_time:.2f} seconds to update :)')
@@ -57,7 +117,8 @@ if __name__ == '__main__':
     # Update STM32 base (of network module)
     if check_option('-b', '--update_network_base'):
         init_time = time.time()
-        updater = STM32FirmwareUpdater()
+        updater = STM32FirmwareUpdater(firmware_bundle=firmware_bundle)
+        updater.events.subscribe(print_update_event, (MODULE_DONE, ERROR))
         updater.update_module_firmware(update_network_base=True)
         fin_time = time.time()
         print(f'Took {fin_time - init_time:.2f} seconds to update')
@@ -66,8 +127,15 @@ if __name__ == '__main__':
     # Update MODI STM32 modules (every modules but network module)
     if check_option('-m', '--update_modules'):
         init_time = time.time()
-        updater = STM32FirmwareUpdater()
+        updater = STM32FirmwareUpdater(
+            firmware_bundle=firmware_bundle, max_in_flight=max_in_flight,
+            force=bool(check_option('--force')), timing_path=timing_path,
+            module_filter=module_filter,
+        )
+        updater.events.subscribe(print_update_event, (MODULE_DONE, ERROR))
         updater.update_module_firmware()
+        # Update only starts here, the modules are flashed in the background
+        updater.manager_thread.join()
         fin_time = time.time()
         print(f'Took {fin_time - init_time:.2f} seconds to update')
         os._exit(0)
@@ -1,29 +1,25 @@
 import json
-import pathlib
-import sys
 import threading as th
 import time
 from base64 import b64decode, b64encode
-from io import open
-from os import path
 
+from modi_firmware_updater.util.firmware_image import \
+    get_composed_firmware_image
+from modi_firmware_updater.util.firmware_manifest import (
+    ESP32, FIRMWARE_CHANNELS, get_firmware_manifest)
 from modi_firmware_updater.util.message_util import unpack_data
 from modi_firmware_updater.util.modi_winusb.modi_serialport import (
     ModiSerialPort, list_modi_serialports)
 from modi_firmware_updater.util.module_util import get_module_type_from_uuid
-
-
-def retry(exception_to_catch):
-    def decorator(func):
-        def wrapper(*args, **kwargs):
-            try:
-                return func(*args, **kwargs)
-            except exception_to_catch:
-                return wrapper(*args, **kwargs)
-
-        return wrapper
-
-    return decorator
+from modi_firmware_updater.util.page_timing import PageTiming, PageTimingLog
+from modi_firmware_updater.util.retry_policy import (format_retry_summary,
+                                                     get_retry_counts,
+                                                     get_retry_policy)
+from modi_firmware_updater.util.timing_profile import get_timing_profile
+from modi_firmware_updater.util.update_events import (
+    ERROR, MODULE_DONE, MODULE_STARTED, NETWORK_ESP32,
+    NETWORK_ESP32_INTERPRETER, PAGE_DONE, UPDATE_DONE, UPDATE_PROGRESS,
+    UPDATE_STARTED, UpdateEvents)
 
 
 class ESP32FirmwareUpdater(ModiSerialPort):
@@ -39,8 +35,12 @@ class ESP32FirmwareUpdater(ModiSerialPort):
     ESP_FLASH_CHUNK = 0x4000
     ESP_CHECKSUM_MAGIC = 0xEF
 
-    def __init__(self, device=None):
+    def __init__(self, device=None, firmware_bundle=None, timing_path=None):
         self.print = True
+        self.firmware_bundle = firmware_bundle
+        # Chunk timings are appended to timing_path if it is set
+        self.timing_path = timing_path
+        self.page_timing_log = None
         if device is not None:
             super().__init__(device, baudrate=921600, timeout=0.1)
         else:
@@ -57,19 +57,16 @@ class ESP32FirmwareUpdater(ModiSerialPort):
                     break
             self.__print(f"Connecting to MODI network module at {modi_port}")
 
-        self.__address = [0x1000, 0x8000, 0xD000, 0x10000, 0xD0000]
-        self.file_path = [
-            "bootloader.bin",
-            "partitions.bin",
-            "ota_data_initial.bin",
-            "modi_ota_factory.bin",
-            "esp32.bin",
-        ]
+        esp32_files = FIRMWARE_CHANNELS[ESP32]["files"]
+        self.__address = [offset for _, offset in esp32_files]
+        self.file_path = [file_name for file_name, _ in esp32_files]
         self.version = None
         self.__version_to_update = None
 
         self.update_in_progress = False
-        self.ui = None
+        # Progress and errors are reported to the subscribers of events
+        self.events = UpdateEvents()
+        self.__update = NETWORK_ESP32
 
         self.current_sequence = 0
         self.total_sequence = 0
@@ -77,11 +74,12 @@ class ESP32FirmwareUpdater(ModiSerialPort):
         self.raise_error_message = True
         self.update_error = 0
         self.update_error_message = ""
+        self.timing_profile = get_timing_profile()
 
         self.network_uuid = None
 
-    def set_ui(self, ui):
-        self.ui = ui
+    def set_events(self, events):
+        self.events = events
 
     def set_print(self, print):
         self.print = print
@@ -90,6 +88,7 @@ class ESP32FirmwareUpdater(ModiSerialPort):
         self.raise_error_message = raise_error_message
 
     def update_firmware(self, update_interpreter=False, force=False):
+        self.__update = NETWORK_ESP32_INTERPRETER if update_interpreter else NETWORK_ESP32
         if update_interpreter:
             self.current_sequence = 0
             self.total_sequence = 100
@@ -97,8 +96,9 @@ class ESP32FirmwareUpdater(ModiSerialPort):
 
             self.__print("get network uuid")
             self.network_uuid = self.get_network_uuid()
+            self.__emit(MODULE_STARTED, 0)
 
-            time.sleep(1)
+            self.timing_profile.wait("interpreter_reset")
             self.__print("Reset interpreter...")
 
             init_time = time.time()
@@ -130,40 +130,20 @@ class ESP32FirmwareUpdater(ModiSerialPort):
 
             self.__print("ESP interpreter reset is complete!!")
 
-            init_count = self.current_sequence
-            for _ in range(init_count, 100):
-                self.current_sequence = self.current_sequence + 5
-                if self.current_sequence > 100:
-                    self.current_sequence = 100
-                    break
-                time.sleep(0.05)
-
             self.current_sequence = 100
             self.total_sequence = 100
 
-            time.sleep(1)
+            self.timing_profile.wait("interpreter_reset")
             self.update_in_progress = False
             self.flushInput()
             self.flushOutput()
             self.close()
             self.update_error = 1
-
-            if self.ui:
-                self.ui.update_stm32_modules.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_stm32_modules.setEnabled(True)
-                self.ui.update_network_stm32.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_network_stm32.setEnabled(True)
-                self.ui.update_network_esp32.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_network_esp32.setEnabled(True)
-                self.ui.update_network_stm32_bootloader.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_network_stm32_bootloader.setEnabled(True)
-                if self.ui.is_english:
-                    self.ui.update_network_esp32_interpreter.setText("Update Network ESP32 Interpreter")
-                else:
-                    self.ui.update_network_esp32_interpreter.setText("네트워크 모듈 인터프리터 초기화")
+            self.__emit(MODULE_DONE, 100)
         else:
             self.__print("get network uuid")
             self.network_uuid = self.get_network_uuid()
+            self.__emit(MODULE_STARTED, 0)
 
             self.__print("Turning interpreter off...")
             self.write(b'{"c":160,"s":0,"d":18,"b":"AAMAAAAA","l":6}')
@@ -173,7 +153,7 @@ class ESP32FirmwareUpdater(ModiSerialPort):
             self.__version_to_update = self.__get_latest_version()
             self.version = self.__get_esp_version()
             if self.version and self.version == self.__version_to_update:
-                if not force and not self.ui:
+                if not force:
                     response = input(f"ESP version already up to date (v{self.version}). Do you still want to proceed? [y/n]: ")
                     if "y" not in response:
                         return
@@ -191,38 +171,20 @@ class ESP32FirmwareUpdater(ModiSerialPort):
             self.__print("Booting to application...")
             self.__wait_for_json()
             self.__boot_to_app()
-            time.sleep(1)
+            self.timing_profile.wait("esp32_boot")
             self.__set_esp_version(self.__version_to_update)
             self.__print("ESP firmware update is complete!!")
 
             self.current_sequence = 100
             self.total_sequence = 100
-            if self.ui:
-                if self.ui.is_english:
-                    self.ui.update_network_esp32.setText("Network ESP32 update is in progress. (100%)")
-                else:
-                    self.ui.update_network_esp32.setText("네트워크 모듈 업데이트가 진행중입니다. (100%)")
 
-            time.sleep(1.5)
+            self.timing_profile.wait("esp32_close")
             self.flushInput()
             self.flushOutput()
             self.close()
             self.update_in_progress = False
             self.update_error = 1
-
-            if self.ui:
-                self.ui.update_stm32_modules.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_stm32_modules.setEnabled(True)
-                self.ui.update_network_stm32.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_network_stm32.setEnabled(True)
-                self.ui.update_network_esp32_interpreter.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_network_esp32_interpreter.setEnabled(True)
-                self.ui.update_network_stm32_bootloader.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_network_stm32_bootloader.setEnabled(True)
-                if self.ui.is_english:
-                    self.ui.update_network_esp32.setText("Update Network ESP32")
-                else:
-                    self.ui.update_network_esp32.setText("네트워크 모듈 업데이트")
+            self.__emit(MODULE_DONE, 100)
 
     def get_network_uuid(self):
         init_time = time.time()
@@ -295,39 +257,43 @@ class ESP32FirmwareUpdater(ModiSerialPort):
         pkt = b"\xc0" + pkt + b"\xc0"
         return pkt
 
-    @retry(Exception)
     def __send_pkt(self, pkt, wait=True, timeout=None, continuous=False):
-        self.write(pkt)
-        if wait:
-            cmd = bytearray(pkt)[2]
-            init_time = time.time()
-            while not timeout or time.time() - init_time < timeout:
-                if continuous:
-                    time.sleep(0.1)
-                else:
-                    time.sleep(0.01)
-                recv_pkt = self.__read_slip()
-                if not recv_pkt:
-                    if continuous:
-                        self.__send_pkt(pkt, wait=False)
-                    continue
-                recv_cmd = bytearray(recv_pkt)[2]
-                if cmd == recv_cmd:
-                    if bytearray(recv_pkt)[1] != 0x01:
-                        self.update_error_message = "Packet error"
-                        if self.raise_error_message:
-                            raise Exception(self.update_error_message)
-                        else:
-                            self.update_error = -1
-                    return True
-                elif continuous:
-                    self.__send_pkt(pkt, wait=False)
-            self.__print("Sending Again...")
-            self.update_error_message = "Timeout Expired!"
+        # Failed attempts are retried quietly, the error is only reported
+        # once the retry policy gives up
+        try:
+            return get_retry_policy("esp32_packet").call(self.__attempt_pkt, pkt, wait, timeout, continuous)
+        except Exception as err:
+            self.update_error_message = str(err)
+            self.__emit(ERROR, message=self.update_error_message)
             if self.raise_error_message:
-                raise Exception(self.update_error_message)
+                raise
+            self.update_error = -1
+
+    def __attempt_pkt(self, pkt, wait, timeout, continuous):
+        self.write(pkt)
+        if not wait:
+            return True
+        cmd = bytearray(pkt)[2]
+        init_time = time.time()
+        while not timeout or time.time() - init_time < timeout:
+            if continuous:
+                time.sleep(0.1)
             else:
-                self.update_error = -1
+                time.sleep(0.01)
+            recv_pkt = self.__read_slip()
+            if not recv_pkt:
+                if continuous:
+                    self.write(pkt)
+                continue
+            recv_cmd = bytearray(recv_pkt)[2]
+            if cmd == recv_cmd:
+                if bytearray(recv_pkt)[1] != 0x01:
+                    raise Exception("Packet error")
+                return True
+            elif continuous:
+                self.write(pkt)
+        self.__print("Sending Again...")
+        raise Exception("Timeout Expired!")
 
     def __read_slip(self):
         slip_pkt = b""
@@ -410,36 +376,23 @@ class ESP32FirmwareUpdater(ModiSerialPort):
         self.__print("The version info has been set!!")
 
     def __compose_binary_firmware(self):
-        binary_firmware = b""
-        for i, bin_path in enumerate(self.file_path):
-            if self.ui:
-                if sys.platform.startswith("win"):
-                    root_path = pathlib.PurePosixPath(pathlib.PurePath(__file__), "..", "..", "assets", "firmware", "latest", "esp32")
-                else:
-                    root_path = path.join(path.dirname(__file__), "..", "assets", "firmware", "latest", "esp32")
+        if self.firmware_bundle:
+            # Bundle holds the binaries already laid out at their addresses
+            return self.firmware_bundle.get_composed_image()
+
+        firmware_manifest = get_firmware_manifest()
+        segment_paths = [
+            (address, firmware_manifest.get_bin_path(ESP32, bin_path))
+            for address, bin_path in zip(self.__address, self.file_path)
+        ]
 
-                if sys.platform.startswith("win"):
-                    firmware_path = pathlib.PurePosixPath(root_path, bin_path)
-                else:
-                    firmware_path = path.join(root_path, bin_path)
-                with open(firmware_path, "rb") as bin_file:
-                    bin_data = bin_file.read()
-            else:
-                root_path = path.join(path.dirname(__file__), "..", "assets", "firmware", "latest", "esp32")
-                firmware_path = path.join(root_path, bin_path)
-                with open(firmware_path, "rb") as bin_file:
-                    bin_data = bin_file.read()
-            binary_firmware += bin_data
-            if i < len(self.__address) - 1:
-                binary_firmware += b"\xFF" * (self.__address[i + 1] - self.__address[i] - len(bin_data))
-        return binary_firmware
+        # Composed image is shared by every updater in this process
+        return get_composed_firmware_image(segment_paths)
 
     def __get_latest_version(self):
-        root_path = path.join(path.dirname(__file__), "..", "assets", "firmware", "latest", "esp32")
-        version_path = path.join(root_path, "esp_version.txt")
-        with open(version_path, "r") as version_file:
-            version_info = version_file.readline().lstrip("v").rstrip("\n")
-        return version_info
+        if self.firmware_bundle:
+            return self.firmware_bundle.get_version_info(ESP32)
+        return get_firmware_manifest().get_version_info(ESP32)
 
     def __erase_chunk(self, size, offset):
         num_blocks = size // self.ESP_FLASH_BLOCK + 1
@@ -469,30 +422,37 @@ class ESP32FirmwareUpdater(ModiSerialPort):
         block_pkt = self.__parse_pkt(block_data)
         self.__send_pkt(block_pkt)
 
-    def __write_binary_firmware(self, binary_firmware: bytes, manager):
-        chunk_queue = []
+    def __write_binary_firmware(self, binary_firmware, manager):
         self.total_sequence = len(binary_firmware) // self.ESP_FLASH_BLOCK + 1
-        while binary_firmware:
-            if self.ESP_FLASH_CHUNK < len(binary_firmware):
-                chunk_queue.append(binary_firmware[: self.ESP_FLASH_CHUNK])
-                binary_firmware = binary_firmware[self.ESP_FLASH_CHUNK:]
-            else:
-                chunk_queue.append(binary_firmware[:])
-                binary_firmware = b""
 
         blocks_downloaded = 0
         self.current_sequence = blocks_downloaded
         self.__print("Start uploading firmware data...")
-        for seq, chunk in enumerate(chunk_queue):
-            self.__erase_chunk(len(chunk), self.__address[0] + seq * self.ESP_FLASH_CHUNK)
-            blocks_downloaded += self.__write_chunk(chunk, blocks_downloaded, self.total_sequence, manager)
+        # Every chunk is timed as a page, its blocks are acked one by one
+        network_id = self.network_uuid & 0xFFF if self.network_uuid else 0xFFF
+        self.page_timing_log = PageTimingLog("esp32", network_id)
+        # Image starts at the address of its first binary, wherever the
+        # bundle or the manifest has laid it out
+        base_address = binary_firmware.base_address
+        for chunk_begin in range(0, len(binary_firmware), self.ESP_FLASH_CHUNK):
+            chunk = binary_firmware.read(chunk_begin, self.ESP_FLASH_CHUNK)
+            page_timing = PageTiming(base_address + chunk_begin)
+            chunk_written = False
+            try:
+                with page_timing.measure("erase"):
+                    self.__erase_chunk(len(chunk), base_address + chunk_begin)
+                with page_timing.measure("data"):
+                    blocks_downloaded += self.__write_chunk(chunk, blocks_downloaded, self.total_sequence, manager)
+                chunk_written = True
+            finally:
+                self.page_timing_log.add_page(page_timing, failed=not chunk_written)
+        self.page_timing_log.finish()
+        self.__print(self.page_timing_log.format_summary())
+        if self.timing_path:
+            self.page_timing_log.export(self.timing_path)
         if manager:
             manager.quit()
-        if self.ui:
-            if self.ui.is_english:
-                self.ui.update_network_esp32.setText("Network ESP32 update is in progress. (99%)")
-            else:
-                self.ui.update_network_esp32.setText("네트워크 모듈 업데이트가 진행중입니다. (99%)")
+        self.__emit(PAGE_DONE, 99)
         self.current_sequence = 99
         self.total_sequence = 100
         self.__print(f"{self.__progress_bar(99, 100)}")
@@ -511,11 +471,7 @@ class ESP32FirmwareUpdater(ModiSerialPort):
             self.current_sequence = curr_seq + seq
             if manager:
                 manager.status = self.__progress_bar(curr_seq + seq, total_seq)
-            if self.ui:
-                if self.ui.is_english:
-                    self.ui.update_network_esp32.setText(f"Network ESP32 update is in progress. ({int((curr_seq+seq)/total_seq*100)}%)")
-                else:
-                    self.ui.update_network_esp32.setText(f"네트워크 모듈 업데이트가 진행중입니다. ({int((curr_seq+seq)/total_seq*100)}%)")
+            self.__emit(PAGE_DONE, 100 * (curr_seq + seq) // total_seq)
             self.__print(
                 f"{self.__progress_bar(curr_seq + seq, total_seq)}", end=""
             )
@@ -525,6 +481,10 @@ class ESP32FirmwareUpdater(ModiSerialPort):
     def __boot_to_app(self):
         self.write(b'{"c":160,"s":0,"d":174,"b":"AAAAAAAAAA==","l":8}')
 
+    def __emit(self, event_type, progress=None, message=None):
+        network_id = self.network_uuid & 0xFFF if self.network_uuid else None
+        self.events.emit(event_type, self.__update, "esp32", network_id, progress, message)
+
     def __print(self, data, end="\n"):
         if self.print:
             print(data, end)
@@ -540,16 +500,22 @@ class ESP32FirmwareUpdater(ModiSerialPort):
 
 
 class ESP32FirmwareMultiUpdater():
-    def __init__(self):
+    def __init__(self, firmware_bundle=None, timing_path=None):
+        self.firmware_bundle = firmware_bundle
+        self.timing_path = timing_path
         self.update_in_progress = False
-        self.ui = None
+        # Events of every ESP32 updater are reported to these subscribers
+        self.events = UpdateEvents()
         self.list_ui = None
 
-    def set_ui(self, ui, list_ui):
-        self.ui = ui
+    def set_list_ui(self, list_ui):
         self.list_ui = list_ui
 
     def update_firmware(self, modi_ports, update_interpreter=False, force=True):
+        update = NETWORK_ESP32_INTERPRETER if update_interpreter else NETWORK_ESP32
+        timing_profile = get_timing_profile()
+        timing_profile.reset_idle_time()
+        retry_counts = get_retry_counts()
         self.esp32_updaters = []
         self.network_uuid = []
         self.state = []
@@ -558,9 +524,13 @@ class ESP32FirmwareMultiUpdater():
             if i > 9:
                 break
             try:
-                esp32_updater = ESP32FirmwareUpdater(modi_port)
+                esp32_updater = ESP32FirmwareUpdater(
+                    modi_port, firmware_bundle=self.firmware_bundle,
+                    timing_path=self.timing_path,
+                )
                 esp32_updater.set_print(False)
                 esp32_updater.set_raise_error(False)
+                esp32_updater.set_events(self.events)
             except Exception as e:
                 print(e)
             else:
@@ -570,9 +540,9 @@ class ESP32FirmwareMultiUpdater():
 
         if self.list_ui:
             self.list_ui.set_device_num(len(self.esp32_updaters))
-            self.list_ui.ui.close_button.setEnabled(False)
 
         self.update_in_progress = True
+        self.events.emit(UPDATE_STARTED, update, progress=0)
 
         for index, esp32_updater in enumerate(self.esp32_updaters):
             th.Thread(
@@ -632,29 +602,7 @@ class ESP32FirmwareMultiUpdater():
                     total_sequence += 100
 
             if total_sequence != 0:
-                if self.ui:
-                    if update_interpreter:
-                        if self.ui.is_english:
-                            self.ui.update_network_esp32_interpreter.setText(
-                                f"Network ESP32 Interpreter reset is in progress. "
-                                f"({int(current_sequence/total_sequence*100)}%)"
-                            )
-                        else:
-                            self.ui.update_network_esp32_interpreter.setText(
-                                f"네트워크 모듈 인터프리터 초기화가 진행중입니다. "
-                                f"({int(current_sequence/total_sequence*100)}%)"
-                            )
-                    else:
-                        if self.ui.is_english:
-                            self.ui.update_network_esp32.setText(
-                                f"Network ESP32 update is in progress. "
-                                f"({int(current_sequence/total_sequence*100)}%)"
-                            )
-                        else:
-                            self.ui.update_network_esp32.setText(
-                                f"네트워크 모듈 업데이트가 진행중입니다. "
-                                f"({int(current_sequence/total_sequence*100)}%)"
-                            )
+                self.events.emit(UPDATE_PROGRESS, update, progress=current_sequence / total_sequence * 100)
 
                 if self.list_ui:
                     self.list_ui.total_progress_signal.emit(current_sequence / total_sequence * 100.0)
@@ -670,39 +618,15 @@ class ESP32FirmwareMultiUpdater():
         self.update_in_progress = False
 
         if self.list_ui:
-            self.list_ui.ui.close_button.setEnabled(True)
             self.list_ui.total_status_signal.emit("Complete")
 
-        if update_interpreter:
-            if self.ui:
-                self.ui.update_stm32_modules.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_stm32_modules.setEnabled(True)
-                self.ui.update_network_stm32.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_network_stm32.setEnabled(True)
-                self.ui.update_network_stm32_bootloader.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_network_stm32_bootloader.setEnabled(True)
-                self.ui.update_network_esp32.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_network_esp32.setEnabled(True)
-                if self.ui.is_english:
-                    self.ui.update_network_esp32_interpreter.setText("Update Network ESP32 Interpreter")
-                else:
-                    self.ui.update_network_esp32_interpreter.setText("네트워크 모듈 인터프리터 초기화")
-        else:
-            if self.ui:
-                self.ui.update_stm32_modules.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_stm32_modules.setEnabled(True)
-                self.ui.update_network_stm32.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_network_stm32.setEnabled(True)
-                self.ui.update_network_stm32_bootloader.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_network_stm32_bootloader.setEnabled(True)
-                self.ui.update_network_esp32_interpreter.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_network_esp32_interpreter.setEnabled(True)
-                if self.ui.is_english:
-                    self.ui.update_network_esp32.setText("Update Network ESP32")
-                else:
-                    self.ui.update_network_esp32.setText("네트워크 모듈 업데이트")
+        self.events.emit(UPDATE_DONE, update, progress=100)
 
         print("\nESP firmware update is complete!!")
+        print(f"Intentional idle time: {timing_profile.idle_time:.2f}s")
+        retry_summary = format_retry_summary(retry_counts)
+        if retry_summary:
+            print(retry_summary)
 
     @staticmethod
     def __progress_bar(current: int, total: int) -> str:
@@ -1,30 +1,34 @@
 import json
-import sys
 import threading as th
 import time
-from io import open
-from os import path
 
 from serial.serialutil import SerialException
 
+from modi_firmware_updater.util.crc_util import calc_crc32
+from modi_firmware_updater.util.firmware_image import get_firmware_image
+from modi_firmware_updater.util.firmware_manifest import (
+    NETWORK, get_firmware_manifest)
 from modi_firmware_updater.util.message_util import parse_message, unpack_data
 from modi_firmware_updater.util.modi_winusb.modi_serialport import (
     ModiSerialPort, list_modi_serialports)
 from modi_firmware_updater.util.module_util import (Module,
                                                     get_module_type_from_uuid)
-
-
-def retry(exception_to_catch):
-    def decorator(func):
-        def wrapper(*args, **kwargs):
-            try:
-                return func(*args, **kwargs)
-            except exception_to_catch:
-                return wrapper(*args, **kwargs)
-
-        return wrapper
-
-    return decorator
+from modi_firmware_updater.util.pacer import get_pacer
+from modi_firmware_updater.util.page_timing import PageTimingLog
+from modi_firmware_updater.util.paged_flash import FLASH_LAYOUTS, PagedFlash
+from modi_firmware_updater.util.rate_controller import get_rate_controller
+from modi_firmware_updater.util.retry_policy import (format_retry_summary,
+                                                     get_retry_counts,
+                                                     get_retry_policy)
+from modi_firmware_updater.util.timing_profile import get_timing_profile
+from modi_firmware_updater.util.update_events import (ERROR, MODULE_DONE,
+                                                      MODULE_STARTED,
+                                                      NETWORK_BOOTLOADER,
+                                                      NETWORK_STM32, PAGE_DONE,
+                                                      UPDATE_DONE,
+                                                      UPDATE_PROGRESS,
+                                                      UPDATE_STARTED,
+                                                      UpdateEvents)
 
 
 class NetworkFirmwareUpdater(ModiSerialPort):
@@ -49,8 +53,12 @@ class NetworkFirmwareUpdater(ModiSerialPort):
     REQUEST_SOFT_DISCONNECT = 3
     REQUEST_SOFT_RECONNECT = 4
 
-    def __init__(self, device=None):
+    def __init__(self, device=None, firmware_bundle=None, timing_path=None):
         self.print = True
+        self.firmware_bundle = firmware_bundle
+        # Page timings are appended to timing_path if it is set
+        self.timing_path = timing_path
+        self.page_timing_log = None
         if device is not None:
             super().__init__(device, baudrate=921600, timeout=0.1, write_timeout=0)
         else:
@@ -73,20 +81,24 @@ class NetworkFirmwareUpdater(ModiSerialPort):
         self.network_id = None
 
         self.update_in_progress = False
-        self.ui = None
+        # Progress and errors are reported to the subscribers of events
+        self.events = UpdateEvents()
 
         self.progress = 0
+        self.rate_controller = None
+        self.pages_per_second = None
 
         self.raise_error_message = True
         self.update_error = 0
         self.update_error_message = ""
         self.has_update_error = False
 
-        self.thread_event = th.Event()
-        self.__delay_flag = 0
+        # Data frames of every updater are spaced by one shared pacer
+        self.pacer = get_pacer()
+        self.timing_profile = get_timing_profile()
 
-    def set_ui(self, ui):
-        self.ui = ui
+    def set_events(self, events):
+        self.events = events
 
     def set_print(self, print):
         self.print = print
@@ -220,18 +232,26 @@ class NetworkFirmwareUpdater(ModiSerialPort):
         if self.is_open:
             self.write(send_pkt.encode("utf8"))
 
-    def set_firmware_command(self, oper_type, module_id, crc_val, page_addr):
+    def send_encoded_firmware_data(self, module_id, seq_num, encoded_data):
+        # Same message as send_firmware_data, data is already base64 encoded
+        send_pkt = json.dumps(
+            {"c": 0x0B, "s": seq_num, "d": module_id, "b": encoded_data, "l": 8},
+            separators=(",", ":"),
+        )
+        if self.is_open:
+            self.write(send_pkt.encode("utf8"))
+
+    def request_firmware_command(self, oper_type, module_id, crc_val, page_addr):
+        # Single attempt, retries are up to the caller
         self.send_firmware_command(oper_type, module_id, crc_val, page_addr)
-        ret = self.receive_firmware_command_response()
+        return self.receive_firmware_command_response()
+
+    def set_firmware_command(self, oper_type, module_id, crc_val, page_addr):
+        ret = self.request_firmware_command(oper_type, module_id, crc_val, page_addr)
         if not ret and oper_type == "erase":
-            retry_count = 0
-            max_retry = 5
-            while not ret:
-                self.send_firmware_command(oper_type, module_id, crc_val, page_addr)
-                ret = self.receive_firmware_command_response()
-                retry_count += 1
-                if retry_count > max_retry:
-                    break
+            erase_attempts = get_retry_policy("network_erase").begin()
+            while not ret and erase_attempts.retry():
+                ret = self.request_firmware_command(oper_type, module_id, crc_val, page_addr)
         return ret
 
     def set_firmware_data(self, module_id, seq_num, bin_data, checksum):
@@ -240,12 +260,13 @@ class NetworkFirmwareUpdater(ModiSerialPort):
 
     def set_end_flash_data(self, module_id, end_flash_data):
         end_flash_success = False
-        page_retry_count = 0
-        page_retry_max_count = 10
+        crc_attempts = get_retry_policy("network_end_flash").begin()
 
         while not end_flash_success:
             # Erase page (send erase request and receive erase response)
-            erase_page_success = self.set_firmware_command("erase", module_id, 0, 0x0801F800)
+            erase_page_success = self.set_firmware_command(
+                "erase", module_id, 0, FLASH_LAYOUTS[NETWORK].end_flash_addr
+            )
             if not erase_page_success:
                 self.update_error = -1
                 self.update_error_message = "End erase error"
@@ -255,19 +276,17 @@ class NetworkFirmwareUpdater(ModiSerialPort):
             checksum = self.set_firmware_data(module_id, 0, end_flash_data, 0)
 
             # CRC on current page (send CRC request and receive CRC response)
-            crc_page_success = self.set_firmware_command("crc", module_id, checksum, 0x0801F800)
+            crc_page_success = self.set_firmware_command(
+                "crc", module_id, checksum, FLASH_LAYOUTS[NETWORK].end_flash_addr
+            )
             if not crc_page_success:
                 if self.update_error == -1:
                     return False
-                else:
-                    page_retry_count += 1
-                    if page_retry_count > page_retry_max_count:
-                        self.update_error = -1
-                        self.update_error_message = "End crc error"
-                        return False
-                    continue
-            else:
-                page_retry_count = 0
+                elif not crc_attempts.retry():
+                    self.update_error = -1
+                    self.update_error_message = "End crc error"
+                    return False
+                continue
 
             end_flash_success = True
         self.__print(f"End flash is written for network ({module_id})")
@@ -288,23 +307,14 @@ class NetworkFirmwareUpdater(ModiSerialPort):
                 self.network_id = self.network_uuid & 0xFFF
             else:
                 self.network_id = 0xFFF
+            self.__emit(MODULE_STARTED, 0)
 
             self.__print("update network module")
-            for _ in range(0, 30):
-                self.progress = self.progress + 5
-                if self.progress > 30:
-                    self.progress = 30
-                    break
-                time.sleep(0.05)
-
+            self.progress = 30
             self.send_set_network_module_state(self.network_id, Module.UPDATE_FIRMWARE, Module.PNP_OFF)
 
-            for _ in range(0, 100):
-                self.progress = self.progress + 5
-                if self.progress > 100:
-                    self.progress = 100
-                    break
-                time.sleep(0.05)
+            # Network module jumps to its bootloader before the port is closed
+            self.timing_profile.wait("bootloader_settle")
 
             if self.is_open:
                 try:
@@ -315,8 +325,6 @@ class NetworkFirmwareUpdater(ModiSerialPort):
                 self.close()
 
             self.progress = 100
-
-            time.sleep(0.5)
             self.update_in_progress = False
             self.update_error = 1
         else:
@@ -359,35 +367,13 @@ class NetworkFirmwareUpdater(ModiSerialPort):
                 except json.decoder.JSONDecodeError as jde:
                     self.__print("json parse error: " + str(jde))
 
-                time.sleep(0.01)
-
             if is_timeout:
                 self.update_in_progress = False
                 self.update_error = -1
                 self.update_error_message = "Warning timeout"
                 self.close()
 
-                if self.ui:
-                    self.ui.update_stm32_modules.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                    self.ui.update_stm32_modules.setEnabled(True)
-                    self.ui.update_network_esp32.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                    self.ui.update_network_esp32.setEnabled(True)
-                    self.ui.update_network_esp32_interpreter.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                    self.ui.update_network_esp32_interpreter.setEnabled(True)
-                    if self.bootloader:
-                        self.ui.update_network_stm32.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                        self.ui.update_network_stm32.setEnabled(True)
-                        if self.ui.is_english:
-                            self.ui.update_network_stm32_bootloader.setText("Set Network Bootloader STM32")
-                        else:
-                            self.ui.update_network_stm32_bootloader.setText("네트워크 모듈 부트로더")
-                    else:
-                        self.ui.update_network_stm32_bootloader.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                        self.ui.update_network_stm32_bootloader.setEnabled(True)
-                        if self.ui.is_english:
-                            self.ui.update_network_stm32.setText("Update Network STM32")
-                        else:
-                            self.ui.update_network_stm32.setText("네트워크 모듈 초기화")
+                self.__emit(ERROR, message=self.update_error_message)
 
                 return
 
@@ -405,146 +391,87 @@ class NetworkFirmwareUpdater(ModiSerialPort):
 
             self.update_in_progress = False
 
-        if self.ui:
-            self.ui.update_stm32_modules.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-            self.ui.update_stm32_modules.setEnabled(True)
-            self.ui.update_network_esp32.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-            self.ui.update_network_esp32.setEnabled(True)
-            self.ui.update_network_esp32_interpreter.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-            self.ui.update_network_esp32_interpreter.setEnabled(True)
-            if self.bootloader:
-                self.ui.update_network_stm32.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_network_stm32.setEnabled(True)
-                if self.ui.is_english:
-                    self.ui.update_network_stm32_bootloader.setText("Set Network Bootloader STM32")
-                else:
-                    self.ui.update_network_stm32_bootloader.setText("네트워크 모듈 부트로더")
-            else:
-                self.ui.update_network_stm32_bootloader.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_network_stm32_bootloader.setEnabled(True)
-                if self.ui.is_english:
-                    self.ui.update_network_stm32.setText("Update Network STM32")
-                else:
-                    self.ui.update_network_stm32.setText("네트워크 모듈 초기화")
+        if self.update_error == 1:
+            self.__emit(MODULE_DONE, 100)
+        else:
+            self.__emit(ERROR, message=self.update_error_message)
 
     def update_network_module(self, module_id):
-        root_path = path.join(path.dirname(__file__), "..", "assets", "firmware", "latest", "stm32")
-        bin_path = path.join(root_path, "network.bin")
-        with open(bin_path, "rb") as bin_file:
-            bin_buffer = bin_file.read()
-
-        # Init metadata of the bytes loaded
-        page_size = 0x800
-        flash_memory_addr = 0x08000000
-
-        bin_size = sys.getsizeof(bin_buffer)
-        bin_begin = page_size
-        bin_end = bin_size - ((bin_size - bin_begin) % page_size)
-
-        page_offset = 0x8800
-        page_begin = bin_begin
-
-        erase_error_limit = 2
-        erase_error_count = 0
-        crc_error_limit = 2
-        crc_error_count = 0
-        while page_begin < bin_end:
-            progress = 100 * page_begin // bin_end
-            self.progress = progress
-
-            self.__print(f"\rUpdating network ({module_id}) {self.__progress_bar(page_begin, bin_end)} {progress}%", end="")
-
-            if self.ui:
-                if self.bootloader:
-                    if self.ui.is_english:
-                        self.ui.update_network_stm32_bootloader.setText(f"Network bootloader is in progress. ({progress}%)")
-                    else:
-                        self.ui.update_network_stm32_bootloader.setText(f"네트워크 모듈 부트로터 진행중입니다. ({progress}%)")
-                else:
-                    if self.ui.is_english:
-                        self.ui.update_network_stm32.setText(f"Network STM32 update is in progress. ({progress}%)")
-                    else:
-                        self.ui.update_network_stm32.setText(f"네트워크 모듈 초기화가 진행중입니다. ({progress}%)")
-
-            page_end = page_begin + page_size
-            curr_page = bin_buffer[page_begin:page_end]
-
-            # Skip current page if empty
-            if curr_page == bytes(len(curr_page)):
-                page_begin = page_begin + page_size
-                time.sleep(0.02)
-                continue
-
-            erase_page_success = self.set_firmware_command(
-                oper_type="erase",
-                module_id=module_id,
-                crc_val=0,
-                page_addr=flash_memory_addr + page_begin + page_offset
+        flash_layout = FLASH_LAYOUTS[NETWORK]
+        if self.firmware_bundle:
+            # Image and its page plan are read from the offline bundle
+            version_info = self.firmware_bundle.get_version_info(NETWORK)
+            firmware_image = self.firmware_bundle.get_image(NETWORK, "network.bin")
+        else:
+            # Get binary and version info from the local firmware manifest
+            firmware_manifest = get_firmware_manifest()
+            bin_path = firmware_manifest.get_bin_path(NETWORK, "network.bin")
+            version_info = firmware_manifest.get_version_info(NETWORK)
+            firmware_image = get_firmware_image(
+                bin_path, flash_layout.bin_begin, flash_layout.page_size, version_info,
             )
+        bin_end = firmware_image.bin_end
+
+        plan_summary = firmware_image.get_plan_summary()
+        self.__print(
+            f"Page plan of network ({module_id}): "
+            f"{plan_summary['data_pages']} data, {plan_summary['erased_pages']} erased, "
+            f"{plan_summary['empty_pages']} empty pages, saving {plan_summary['frames_saved']} frames "
+            f"and {plan_summary['round_trips_saved']} round trips"
+        )
 
-            if not erase_page_success:
-                erase_error_count = erase_error_count + 1
-                if erase_error_count > erase_error_limit:
-                    erase_error_count = 0
-                    self.has_update_error = True
-                    self.update_error_message = f"network ({module_id}) erase flash failed."
-                    break
-                continue
-            else:
-                erase_error_count = 0
+        # Data frames are paced at the rate learned for network modules
+        self.rate_controller = get_rate_controller("network", self.port)
+        self.page_timing_log = PageTimingLog("network", module_id)
+        paged_flash = PagedFlash(
+            flash_layout, firmware_image,
+            erase_page=lambda page_addr: self.request_firmware_command("erase", module_id, 0, page_addr),
+            send_data=lambda seq_num, encoded_data: self.send_encoded_firmware_data(
+                module_id, seq_num, encoded_data
+            ),
+            check_crc=lambda page_addr, page_crc: self.request_firmware_command("crc", module_id, page_crc, page_addr),
+            # Erases of the network module keep their longer retry policy
+            erase_policy="network_erase",
+            rate_controller=self.rate_controller,
+            pacer=self.pacer,
+            sender=self,
+            page_timing_log=self.page_timing_log,
+        )
 
-            checksum = 0
-            for curr_ptr in range(0, page_size, 8):
-                if page_begin + curr_ptr >= bin_size:
-                    break
+        def on_page(page_begin: int) -> None:
+            progress = 100 * page_begin // bin_end
+            self.progress = progress
 
-                curr_data = curr_page[curr_ptr:curr_ptr + 8]
-                checksum = self.set_firmware_data(module_id, curr_ptr // 8, curr_data, checksum)
-                self.__delay(0.001)
+            self.__print(f"\rUpdating network ({module_id}) {self.__progress_bar(page_begin, bin_end)} {progress}%", end="")
 
-            # CRC on current page (send CRC request / receive CRC response)
-            crc_page_success = self.set_firmware_command(
-                oper_type="crc",
-                module_id=module_id,
-                crc_val=checksum,
-                page_addr=flash_memory_addr + page_begin + page_offset
-            )
+            self.__emit(PAGE_DONE, progress)
 
-            if crc_page_success:
-                crc_error_count = 0
-            else:
-                crc_error_count = crc_error_count + 1
-                if crc_error_count > crc_error_limit:
-                    crc_error_count = 0
-                    self.has_update_error = True
-                    self.update_error_message = "Check crc failed."
-                    break
-                continue
+        self.__emit(MODULE_STARTED, 0)
+        if not paged_flash.write(on_page=on_page):
+            self.has_update_error = True
+            self.update_error_message = f"network ({module_id}) {paged_flash.error_message}"
 
-            page_begin = page_begin + page_size
-            time.sleep(0.01)
+        self.page_timing_log.finish()
+        self.__print(self.page_timing_log.format_summary())
+        if self.timing_path:
+            self.page_timing_log.export(self.timing_path)
 
         self.progress = 99
         self.__print(f"\rUpdating network ({module_id}) {self.__progress_bar(99, 100)} 99%")
 
+        self.pages_per_second = paged_flash.pages_per_second
+        if self.pages_per_second is not None:
+            self.__print(
+                f"network ({module_id}) data pages written at "
+                f"{self.pages_per_second:.1f} pages/s, "
+                f"{self.rate_controller.rate:.0f} frames/s"
+            )
+
         verify_header = 0xAA
         if self.has_update_error:
             verify_header = 0xFF
 
-        # Get version info from version_path, using appropriate methods
-        version_info, version_file = None, "base_version.txt"
-        version_path = root_path + "/" + version_file
-        with open(version_path) as version_file:
-            version_info = version_file.readline().lstrip("v").rstrip("\n")
-        version_digits = [int(digit) for digit in version_info.split(".")]
-        """ Version number is formed by concatenating all three version bits
-            e.g. 2.2.4 -> 010 00010 00000100 -> 0100 0010 0000 0100
-        """
-        version = (
-            version_digits[0] << 13
-            | version_digits[1] << 8
-            | version_digits[2]
-        )
+        version = firmware_image.version
 
         # Set end-flash data to be sent at the end of the firmware update
         end_flash_data = bytearray(8)
@@ -565,38 +492,16 @@ class NetworkFirmwareUpdater(ModiSerialPort):
         self.send_set_module_state(0xFFF, Module.REBOOT, Module.PNP_OFF)
         self.__print("Reboot message has been sent to all connected modules")
 
-        time.sleep(1)
+        self.timing_profile.wait("reboot_settle")
 
         self.progress = 100
         self.__print(f"\rUpdating network ({module_id}) {self.__progress_bar(100, 100)} 100%")
         self.__print("Module firmwares have been updated!")
 
-        time.sleep(1)
+        self.timing_profile.wait("close_settle")
 
         self.close()
 
-        if self.ui:
-            self.ui.update_stm32_modules.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-            self.ui.update_stm32_modules.setEnabled(True)
-            self.ui.update_network_esp32.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-            self.ui.update_network_esp32.setEnabled(True)
-            self.ui.update_network_esp32_interpreter.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-            self.ui.update_network_esp32_interpreter.setEnabled(True)
-            if self.bootloader:
-                self.ui.update_network_stm32.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_network_stm32.setEnabled(True)
-                if self.ui.is_english:
-                    self.ui.update_network_stm32_bootloader.setText("Set Network Bootloader STM32")
-                else:
-                    self.ui.update_network_stm32_bootloader.setText("네트워크 모듈 부트로더")
-            else:
-                self.ui.update_network_stm32_bootloader.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_network_stm32_bootloader.setEnabled(True)
-                if self.ui.is_english:
-                    self.ui.update_network_stm32.setText("Update Network STM32")
-                else:
-                    self.ui.update_network_stm32.setText("네트워크 모듈 초기화")
-
         return not self.has_update_error
 
     def read_json(self):
@@ -622,60 +527,45 @@ class NetworkFirmwareUpdater(ModiSerialPort):
         return json_msg
 
     def calc_crc32(self, data: bytes, crc: int) -> int:
-        crc ^= int.from_bytes(data, byteorder="little", signed=False)
-
-        for _ in range(32):
-            if crc & (1 << 31) != 0:
-                crc = (crc << 1) ^ 0x4C11DB7
-            else:
-                crc <<= 1
-            crc &= 0xFFFFFFFF
-
-        return crc
+        return calc_crc32(data, crc)
 
     def calc_crc64(self, data, checksum):
         checksum = self.calc_crc32(data[:4], checksum)
         checksum = self.calc_crc32(data[4:], checksum)
         return checksum
 
-    def __delay(self, span):
-        if self.__delay_flag == 0:
-            start_time = time.time()
-            self.thread_event.wait(span)
-            check = time.time() - start_time
-            import math
-            if math.fabs(check - span) > 0.005:
-                self.__delay_flag = 1
-            else:
-                self.__delay_flag = 2
-        elif self.__delay_flag == 1:
-            init_time = time.perf_counter()
-            while time.perf_counter() - init_time < span:
-                pass
-        elif self.__delay_flag == 2:
-            self.thread_event.wait(span)
-
     def __progress_bar(self, current, total):
         curr_bar = 50 * current // total
         rest_bar = 50 - curr_bar
         return f"[{'=' * curr_bar}>{'.' * rest_bar}]"
 
+    def __emit(self, event_type, progress=None, message=None):
+        update = NETWORK_BOOTLOADER if self.bootloader else NETWORK_STM32
+        self.events.emit(event_type, update, "network", self.network_id, progress, message)
+
     def __print(self, data, end="\n"):
         if self.print:
             print(data, end)
 
 
 class NetworkFirmwareMultiUpdater():
-    def __init__(self):
+    def __init__(self, firmware_bundle=None, timing_path=None):
+        self.firmware_bundle = firmware_bundle
+        self.timing_path = timing_path
         self.update_in_progress = False
-        self.ui = None
+        # Events of every network updater are reported to these subscribers
+        self.events = UpdateEvents()
         self.list_ui = None
 
-    def set_ui(self, ui, list_ui):
-        self.ui = ui
+    def set_list_ui(self, list_ui):
         self.list_ui = list_ui
 
     def update_module_firmware(self, modi_ports, bootloader):
+        update = NETWORK_BOOTLOADER if bootloader else NETWORK_STM32
+        timing_profile = get_timing_profile()
+        timing_profile.reset_idle_time()
+        pacing_idle_time = get_pacer().idle_time
+        retry_counts = get_retry_counts()
         self.network_updaters = []
         self.network_uuid = []
         self.state = []
@@ -686,9 +576,13 @@ class NetworkFirmwareMultiUpdater():
             if i > 9:
                 break
             try:
-                network_updater = NetworkFirmwareUpdater(modi_port)
+                network_updater = NetworkFirmwareUpdater(
+                    modi_port, firmware_bundle=self.firmware_bundle,
+                    timing_path=self.timing_path,
+                )
                 network_updater.set_print(False)
                 network_updater.set_raise_error(False)
+                network_updater.set_events(self.events)
             except Exception:
                 print("open " + modi_port + " error")
             else:
@@ -700,9 +594,9 @@ class NetworkFirmwareMultiUpdater():
 
         if self.list_ui:
             self.list_ui.set_device_num(len(self.network_updaters))
-            self.list_ui.ui.close_button.setEnabled(False)
 
         self.update_in_progress = True
+        self.events.emit(UPDATE_STARTED, update, progress=0)
 
         for index, network_updater in enumerate(self.network_updaters):
             th.Thread(
@@ -764,17 +658,7 @@ class NetworkFirmwareMultiUpdater():
             if len(self.network_updaters):
                 print(f"{self.__progress_bar(total_progress, 100)}", end="")
 
-                if self.ui:
-                    if bootloader:
-                        if self.ui.is_english:
-                            self.ui.update_network_stm32_bootloader.setText(f"Network bootloader is in progress. ({int(total_progress)}%)")
-                        else:
-                            self.ui.update_network_stm32_bootloader.setText(f"네트워크 모듈 부트로터 진행중입니다. ({int(total_progress)}%)")
-                    else:
-                        if self.ui.is_english:
-                            self.ui.update_network_stm32.setText(f"Network STM32 update is in progress. ({int(total_progress)}%)")
-                        else:
-                            self.ui.update_network_stm32.setText(f"네트워크 모듈 초기화가 진행중입니다. ({int(total_progress)}%)")
+                self.events.emit(UPDATE_PROGRESS, update, progress=total_progress)
 
                 if self.list_ui:
                     self.list_ui.total_progress_signal.emit(total_progress)
@@ -786,37 +670,22 @@ class NetworkFirmwareMultiUpdater():
             time.sleep(delay)
 
         self.update_in_progress = False
-
-        if self.ui:
-            self.ui.update_stm32_modules.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-            self.ui.update_stm32_modules.setEnabled(True)
-            self.ui.update_network_esp32.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-            self.ui.update_network_esp32.setEnabled(True)
-            self.ui.update_network_esp32_interpreter.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-            self.ui.update_network_esp32_interpreter.setEnabled(True)
-            if bootloader:
-                self.ui.update_network_stm32.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_network_stm32.setEnabled(True)
-                if self.ui.is_english:
-                    self.ui.update_network_stm32_bootloader.setText("Set Network Bootloader STM32")
-                else:
-                    self.ui.update_network_stm32_bootloader.setText("네트워크 모듈 부트로더")
-            else:
-                self.ui.update_network_stm32_bootloader.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-                self.ui.update_network_stm32_bootloader.setEnabled(True)
-                if self.ui.is_english:
-                    self.ui.update_network_stm32.setText("Update Network STM32")
-                else:
-                    self.ui.update_network_stm32.setText("네트워크 모듈 초기화")
+        self.events.emit(UPDATE_DONE, update, progress=100)
 
         if self.list_ui:
-            self.list_ui.ui.close_button.setEnabled(True)
             self.list_ui.total_status_signal.emit("Complete")
             self.list_ui.total_progress_signal.emit(100)
             for index, network_updater in enumerate(self.network_updaters):
                 self.list_ui.progress_signal.emit(index, 100, 100)
 
         print("\nSTM firmware update is complete!!")
+        print(
+            f"Intentional idle time: {timing_profile.idle_time:.2f}s, "
+            f"frame pacing: {get_pacer().idle_time - pacing_idle_time:.2f}s"
+        )
+        retry_summary = format_retry_summary(retry_counts)
+        if retry_summary:
+            print(retry_summary)
 
     @staticmethod
     def __progress_bar(current: int, total: int) -> str:
@@ -1,37 +1,52 @@
 import json
-import sys
 import threading as th
 import time
 from base64 import b64encode
-from io import open
-from os import path
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 from serial.serialutil import SerialException
 
+from modi_firmware_updater.util.crc_util import calc_crc32
+from modi_firmware_updater.util.firmware_image import get_firmware_image
+from modi_firmware_updater.util.firmware_journal import get_firmware_journal
+from modi_firmware_updater.util.firmware_ledger import get_firmware_ledger
+from modi_firmware_updater.util.firmware_manifest import (
+    FIRMWARE_CHANNELS, MODULE, get_firmware_manifest)
 from modi_firmware_updater.util.message_util import (decode_message,
                                                      parse_message,
                                                      unpack_data)
 from modi_firmware_updater.util.modi_winusb.modi_serialport import (
     ModiSerialPort, list_modi_serialports)
-from modi_firmware_updater.util.module_util import (Module,
+from modi_firmware_updater.util.module_registry import (ModuleRegistry,
+                                                        ModuleState)
+from modi_firmware_updater.util.module_util import (BROADCAST_ID, Module,
+                                                    ModuleFilter,
                                                     get_module_type_from_uuid)
-
-
-def retry(exception_to_catch):
-    def decorator(func):
-        def wrapper(*args, **kwargs):
-            try:
-                return func(*args, **kwargs)
-            except exception_to_catch:
-                return wrapper(*args, **kwargs)
-
-        return wrapper
-
-    return decorator
+from modi_firmware_updater.util.pacer import get_pacer
+from modi_firmware_updater.util.page_timing import PageTimingLog
+from modi_firmware_updater.util.paged_flash import FLASH_LAYOUTS, PagedFlash
+from modi_firmware_updater.util.progress_model import (ProgressModel,
+                                                       get_image_work,
+                                                       get_page_work)
+from modi_firmware_updater.util.rate_controller import get_rate_controller
+from modi_firmware_updater.util.retry_policy import (format_retry_summary,
+                                                     get_retry_counts,
+                                                     get_retry_policy)
+from modi_firmware_updater.util.timing_profile import get_timing_profile
+from modi_firmware_updater.util.update_events import (ERROR, MODULE_DONE,
+                                                      MODULE_STARTED,
+                                                      PAGE_DONE, STM32_MODULES,
+                                                      UPDATE_DONE,
+                                                      UPDATE_PROGRESS,
+                                                      UPDATE_STARTED,
+                                                      UpdateEvents)
 
 
 class STM32FirmwareUpdater(ModiSerialPort):
-    """STM32 Firmware Updater: Updates a firmware of given module"""
+    """STM32 Firmware Updater: Updates the firmware of the modules behind
+    one network module
+    """
 
     NO_ERROR = 0
     UPDATE_READY = 1
@@ -42,35 +57,77 @@ class STM32FirmwareUpdater(ModiSerialPort):
     ERASE_ERROR = 6
     ERASE_COMPLETE = 7
 
-    def __init__(self, device=None):
+    def __init__(
+        self, device=None, firmware_bundle=None, max_in_flight=1, force=False,
+        timing_path=None, scheduling_policy="longest_first", module_filter=None,
+    ):
         self.print = True
-
-        self.__target_ids = (0xFFF, )
+        self.firmware_bundle = firmware_bundle
+        self.max_in_flight = max(1, max_in_flight)
+        # Modules already at the latest version are flashed anyway if set
+        self.force = force
+        # Page timings of every module are appended to timing_path if it is set
+        self.timing_path = timing_path
+
+        # Only selected modules are told to enter update mode, the others
+        # keep running
+        self.module_filter = module_filter if module_filter is not None else ModuleFilter()
+        # Ids of the modules told to enter update mode
+        self.__requested_ids = set()
         self.response_flag = False
         self.response_error_flag = False
         self.response_error_count = 0
         self.__running = True
 
-        self.update_in_progress = False
+        # Pending firmware command requests by module id, each one is a
+        # future resolved with the stream state of its ack
+        self.__responses = dict()
+        self.__responses_lock = th.Lock()
+        # Serializes frames written by the threads of modules in flight
+        self.__send_lock = th.Lock()
 
-        self.modules_to_update_all = []
-        self.modules_to_update = []
+        self.update_in_progress = False
 
-        self.modules_updated = []
+        # Every discovered module by id and the queue of modules to flash,
+        # ordered by scheduling_policy with failed modules retried last
+        self.module_registry = ModuleRegistry(scheduling_policy)
+        # Versions reported by the modules during discovery by module id
+        self.module_versions = dict()
+        self.module_uuids = dict()
+        self.module_update_times = []
+        # Page timings of every updated module by its id
+        self.page_timing_logs = dict()
+        # Work left across the whole module queue, for progress and ETA
+        self.progress_model = ProgressModel()
         self.network_id = None
         self.network_uuid = None
         self.network_version = None
-        self.ui = None
-        self.module_type = None
-        self.progress = None
+        # Progress and errors are reported to the subscribers of events
+        self.events = UpdateEvents()
+        # Progress of every module being flashed by its id
+        self.module_progress = dict()
+        # Type and progress of the last module flashed
+        self.__last_module = (None, None)
+        self.pages_per_second = None
+        self.kit_update_time = None
         self.raise_error_message = True
         self.update_error = 0
         self.update_error_message = ""
         self.has_update_error = False
-        self.this_update_error = False
 
-        self.thread_event = th.Event()
-        self.__delay_flag = 0
+        # Data frames of every updater are spaced by one shared pacer
+        self.pacer = get_pacer()
+        self.timing_profile = get_timing_profile()
+        # Set whenever there may be a module to update
+        self.__modules_changed = th.Event()
+        # Modules which have sent an update warning, as (module id, warning type)
+        self.discovered_modules = set()
+        # Modules which have sent their type 1 warning but not their type 2
+        # one yet, by module id with the time of their type 1 warning
+        self.__ready_modules = dict()
+        self.discovery_time = None
+        self.__discovery_start = None
+        self.__last_discovery_change = None
 
         if device is not None:
             super().__init__(device, baudrate=921600, timeout=0.1, write_timeout=0)
@@ -90,37 +147,104 @@ class STM32FirmwareUpdater(ModiSerialPort):
 
         self.open_recv_thread()
 
-        th.Thread(
+        # Modules are flashed by the manager, which ends with the update
+        self.manager_thread = th.Thread(
             target=self.module_firmware_update_manager, daemon=True
-        ).start()
+        )
+        self.manager_thread.start()
 
     def module_firmware_update_manager(self):
-        timeout_count = 0
-        timeout_delay = 0.1
-        while timeout_count < 10:
-            time.sleep(timeout_delay)
-            timeout_count += timeout_delay
+        # Woken up whenever a module is queued or its update is done. Waits
+        # module_wait_timeout for the update to be started and then until
+        # discovery has settled
+        module_wait_timeout = self.timing_profile.get("module_wait_timeout")
+        wait_deadline = time.monotonic() + module_wait_timeout
+        discovery_settle = self.timing_profile.get("discovery_settle")
+        kit_start_time = None
+        # Module updates in flight by module id, data of one module is sent
+        # while another one waits for its erase or CRC ack
+        in_flight = dict()
+        executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        while True:
+            # Finished updates set the event as well, so there is no need for
+            # a timeout while modules are in flight
+            if in_flight:
+                timeout = None
+            elif not self.update_in_progress:
+                timeout = wait_deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+            else:
+                timeout = max(0, self.__get_discovery_deadline(discovery_settle, module_wait_timeout) - time.monotonic())
+            self.__modules_changed.wait(timeout)
+            self.__modules_changed.clear()
+
+            for module_id, update in list(in_flight.items()):
+                if not update.done():
+                    continue
+                del in_flight[module_id]
+                if update.exception() is None:
+                    continue
+                if self.module_registry.finish(module_id, failed=True):
+                    self.__print(f"\nUpdate of module ({module_id}) failed, retrying later: {update.exception()}")
+                else:
+                    self.has_update_error = True
+                    self.update_error_message = str(update.exception())
+                    self.events.emit(ERROR, STM32_MODULES, module_id=module_id, message=self.update_error_message)
 
             if not self.update_in_progress:
                 # 장치 연결까지 대기
                 continue
 
-            if len(self.modules_to_update) != 0:
-                update_module_id, update_module_type = self.modules_to_update[0]
-                self.modules_to_update.pop(0)
-                self.__update_firmware(update_module_id, update_module_type)
-                timeout_count = 0
-
-            if len(self.modules_updated) != 0 and len(self.modules_to_update_all) != 0:
-                if len(self.modules_updated) == len(self.modules_to_update_all):
-                    # 모든 업데이트가 끝날 경우, 종료
+            # A module is queued once, repeated warnings do not queue it again.
+            # Failed modules are queued behind the others by the registry.
+            # Modules are only popped into free slots, so the ones queued
+            # while the slots are busy are still ordered by the policy; the
+            # done callback wakes this loop up to fill the slot again
+            while len(in_flight) < self.max_in_flight:
+                module_record = self.module_registry.pop_queued()
+                if module_record is None:
                     break
+                if kit_start_time is None:
+                    kit_start_time = time.perf_counter()
+                update = executor.submit(self.__update_firmware, module_record.module_id, module_record.module_type)
+                update.add_done_callback(lambda _: self.__modules_changed.set())
+                in_flight[module_record.module_id] = update
+
+            if in_flight:
+                continue
+
+            if time.monotonic() >= self.__get_discovery_deadline(discovery_settle, module_wait_timeout):
+                # 모든 업데이트가 끝날 경우, 종료
+                self.discovery_time = self.__last_discovery_change - self.__discovery_start
+                self.__print(
+                    f"Discovered {len(self.module_registry)} modules in "
+                    f"{self.discovery_time:.2f}s, settled for {discovery_settle:.2f}s"
+                )
+                if len(self.module_registry) == 0:
+                    self.has_update_error = True
+                    self.update_error_message = "No modules"
+                break
+        executor.shutdown()
+
+        num_skipped = self.module_registry.count(ModuleState.SKIPPED)
+        if kit_start_time is not None:
+            self.kit_update_time = time.perf_counter() - kit_start_time
+            self.__print(
+                f"{self.module_registry.count(ModuleState.DONE, ModuleState.FAILED)} modules updated "
+                f"in {self.kit_update_time:.2f}s, up to {self.max_in_flight} at once"
+            )
+        if num_skipped:
+            self.__print(
+                f"{num_skipped} modules already up to date were skipped, "
+                f"saving about {self.get_skipped_time():.1f}s"
+            )
 
-        reboot_message = self.__set_module_state(0xFFF, Module.REBOOT, Module.PNP_OFF)
-        self.__send_conn(reboot_message)
-        self.__print("Reboot message has been sent to all connected modules")
+        for target in self.__get_reboot_targets():
+            self.__send_conn(self.__set_module_state(target, Module.REBOOT, Module.PNP_OFF))
+        self.__print("Reboot message has been sent to the updated modules")
 
-        time.sleep(1)
+        self.timing_profile.wait("reboot_settle")
 
         self.__print("Module firmwares have been updated!")
         self.close_recv_thread()
@@ -132,25 +256,49 @@ class STM32FirmwareUpdater(ModiSerialPort):
         else:
             self.update_error = 1
 
-        time.sleep(0.5)
+        self.__print(
+            f"Intentional idle time: {self.timing_profile.idle_time:.2f}s, "
+            f"frame pacing: {self.pacer.idle_time:.2f}s"
+        )
         self.reset_state()
 
-        if self.ui:
-            self.ui.update_network_stm32.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-            self.ui.update_network_stm32.setEnabled(True)
-            self.ui.update_network_stm32_bootloader.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-            self.ui.update_network_stm32_bootloader.setEnabled(True)
-            self.ui.update_network_esp32.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-            self.ui.update_network_esp32.setEnabled(True)
-            self.ui.update_network_esp32_interpreter.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-            self.ui.update_network_esp32_interpreter.setEnabled(True)
-            if self.ui.is_english:
-                self.ui.update_stm32_modules.setText("Update STM32 Modules.")
-            else:
-                self.ui.update_stm32_modules.setText("모듈 초기화")
-
-    def set_ui(self, ui):
-        self.ui = ui
+    @property
+    def module_type(self) -> str:
+        return self.__get_current_module()[0]
+
+    @property
+    def progress(self) -> int:
+        return self.__get_current_module()[1]
+
+    def __get_current_module(self) -> tuple:
+        # Modules in flight report their own progress, the one furthest
+        # behind stands for the updater
+        module_progress = self.module_progress.copy()
+        if not module_progress:
+            return self.__last_module
+        module_id = min(module_progress, key=module_progress.get)
+        module_record = self.module_registry.get(module_id)
+        if module_record is None:
+            return self.__last_module
+        return module_record.module_type, module_progress[module_id]
+
+    def __get_discovery_deadline(self, discovery_settle: float, module_wait_timeout: float) -> float:
+        # Discovery settles once no module has shown up for discovery_settle.
+        # A kit where no module has shown up yet and modules getting ready
+        # for their update, i.e. told to but not queued yet, are waited for
+        # up to module_wait_timeout instead of ending with no modules
+        deadline = self.__last_discovery_change + discovery_settle
+        if not self.discovered_modules and not len(self.module_registry):
+            deadline = max(deadline, self.__discovery_start + module_wait_timeout)
+        for ready_time in list(self.__ready_modules.values()):
+            deadline = max(deadline, ready_time + module_wait_timeout)
+        return deadline
+
+    def set_events(self, events):
+        self.events = events
+
+    def set_module_filter(self, module_filter):
+        self.module_filter = module_filter
 
     def set_print(self, print):
         self.print = print
@@ -161,11 +309,16 @@ class STM32FirmwareUpdater(ModiSerialPort):
     def request_network_id(self):
         self.__send_conn(parse_message(0x28, 0x0, 0xFFF, (0xFF, 0x0F)))
 
-    def __assign_network_id(self, sid, data):
+    def __assign_module_id(self, sid, data):
         unpacked_data = unpack_data(data, (6, 2))
         module_uuid = unpacked_data[0]
         module_version_digits = unpacked_data[1]
         module_type = get_module_type_from_uuid(module_uuid)
+        self.module_versions[sid] = module_version_digits
+        self.module_uuids[sid] = module_uuid
+        if self.update_in_progress and module_type != "network":
+            # Modules selected by type are known once they tell their UUID
+            self.__request_selected_module(sid, module_uuid)
         if module_type == "network":
             self.network_uuid = module_uuid
             self.network_id = sid
@@ -177,16 +330,42 @@ class STM32FirmwareUpdater(ModiSerialPort):
             self.network_version = ".".join(module_version)
 
     def update_module_firmware(self):
+        self.module_registry.reset()
+        self.discovered_modules = set()
+        self.__ready_modules = dict()
+        self.__discovery_start = self.__last_discovery_change = time.monotonic()
         self.update_in_progress = True
+        self.__modules_changed.set()
         self.has_update_error = False
+        self.__requested_ids = set()
         self.request_network_id()
         self.reset_state()
-        for target in self.__target_ids:
+        if self.module_filter.selects_all:
+            self.request_to_update_firmware(BROADCAST_ID)
+            return
+
+        self.__print(f"Updating selected modules only: {self.module_filter}")
+        for target in self.module_filter.get_module_ids():
+            self.__requested_ids.add(target)
             self.request_to_update_firmware(target)
+        for module_id, module_uuid in list(self.module_uuids.items()):
+            if module_id != self.network_id:
+                self.__request_selected_module(module_id, module_uuid)
+
+    def __request_selected_module(self, module_id: int, module_uuid: int) -> None:
+        if module_id in self.__requested_ids or not self.module_filter.matches(module_id, module_uuid):
+            return
+        self.__requested_ids.add(module_id)
+        self.request_to_update_firmware(module_id)
+
+    def __get_reboot_targets(self) -> tuple:
+        if self.module_filter.selects_all:
+            return (BROADCAST_ID, )
+        return tuple(sorted(self.__requested_ids))
 
     def close_recv_thread(self):
+        # Receive thread stops waiting for messages as soon as it is told to
         self.__running = False
-        time.sleep(2)
         if self.recv_thread:
             self.recv_thread.join()
 
@@ -203,17 +382,14 @@ class STM32FirmwareUpdater(ModiSerialPort):
         if not update_in_progress:
             self.__print("Make sure you have connected module(s) to update")
             self.__print("Resetting firmware updater's state")
-            self.modules_to_update = []
-            self.modules_updated = []
 
     def request_to_update_firmware(self, module_id) -> None:
         firmware_update_message = self.__set_module_state(module_id, Module.UPDATE_FIRMWARE, Module.PNP_OFF)
         self.__send_conn(firmware_update_message)
-        time.sleep(0.01)
+        self.timing_profile.wait("request_gap")
         self.__send_conn(firmware_update_message)
-        time.sleep(0.01)
+        self.timing_profile.wait("request_gap")
         self.__send_conn(firmware_update_message)
-        time.sleep(0.01)
         self.__print("Firmware update has been requested")
 
     def check_to_update_firmware(self, module_id: int) -> None:
@@ -221,29 +397,84 @@ class STM32FirmwareUpdater(ModiSerialPort):
         self.__send_conn(firmware_update_ready_message)
 
     def add_to_module_list(self, module_id: int, module_type: str) -> None:
-        modules_update_all_flag = True
-
-        for curr_module_id, curr_module_type in self.modules_to_update_all:
-            if module_id == curr_module_id:
-                modules_update_all_flag = False
-                break
-
-        if modules_update_all_flag:
-            module_elem = module_id, module_type
-            self.modules_to_update_all.append(module_elem)
-
-        for curr_module_id, curr_module_type in self.modules_updated:
-            if module_id == curr_module_id:
-                return
+        # Only modules seen for the first time are queued or skipped
+        module_record = self.module_registry.discover(module_id, module_type)
+        if module_record.state != ModuleState.DISCOVERED:
+            return
 
-        for curr_module_id, curr_module_type in self.modules_to_update:
-            if module_id == curr_module_id:
-                return
+        if not self.force and self.is_up_to_date(module_id):
+            self.module_registry.skip(module_id)
+            self.__modules_changed.set()
+            self.events.emit(MODULE_DONE, STM32_MODULES, module_type, module_id, 100, "up to date")
+            print(f"\n{module_type} ({module_id}) is already up to date, skipping...{' ' * 60}\n")
+            return
 
-        module_elem = module_id, module_type
-        self.modules_to_update.append(module_elem)
+        self.module_registry.queue(module_id, self.__queue_work(module_id, module_type))
+        self.__modules_changed.set()
         print(f"\nAdding {module_type} ({module_id}) to update waiting list...{' ' * 60}\n")
 
+    def __queue_work(self, module_id: int, module_type: str) -> int:
+        try:
+            firmware_image = self.__get_firmware_image(module_type)[1]
+        except (OSError, KeyError, ValueError):
+            # Update of this module fails anyway, it is left out of the ETA
+            return 0
+        image_work = get_image_work(firmware_image)
+        self.progress_model.add_module(module_id, image_work)
+        return image_work
+
+    def get_eta(self) -> float:
+        """Seconds left until every queued module is updated, None if unknown"""
+        return self.progress_model.eta
+
+    def is_up_to_date(self, module_id: int) -> bool:
+        # Version of a module is only known if it has answered the id request
+        module_version = self.module_versions.get(module_id)
+        if module_version is None:
+            return False
+        if self.firmware_bundle:
+            latest_version = self.firmware_bundle.get_version(MODULE)
+        else:
+            latest_version = get_firmware_manifest().get_version(MODULE)
+        return latest_version is not None and latest_version <= module_version
+
+    def get_skipped_time(self) -> float:
+        """Estimate the time saved by skipping up-to-date modules"""
+        skipped_records = self.module_registry.get_records(ModuleState.SKIPPED)
+        if not skipped_records:
+            return 0
+        if self.module_update_times:
+            module_update_time = sum(self.module_update_times) / len(self.module_update_times)
+            return module_update_time * len(skipped_records)
+
+        # Nothing has been flashed, so data frames are counted at the
+        # learned rate instead
+        skipped_time = 0
+        for module_record in skipped_records:
+            module_type = module_record.module_type
+            firmware_image = self.__get_firmware_image(module_type)[1]
+            plan_summary = firmware_image.get_plan_summary()
+            num_frames = plan_summary["data_pages"] * firmware_image.page_size // 8
+            skipped_time += num_frames / get_rate_controller(module_type, self.port).rate
+        return skipped_time
+
+    def __get_firmware_image(self, module_type: str) -> tuple:
+        bin_name = f"{module_type.lower()}.bin"
+        if self.firmware_bundle:
+            # Image and its page plan are read from the offline bundle
+            version_info = self.firmware_bundle.get_version_info(MODULE)
+            firmware_image = self.firmware_bundle.get_image(MODULE, bin_name)
+        else:
+            # Get binary and version info from the local firmware manifest
+            firmware_manifest = get_firmware_manifest()
+            bin_path = firmware_manifest.get_bin_path(MODULE, bin_name)
+            version_info = firmware_manifest.get_version_info(MODULE)
+            firmware_image = get_firmware_image(
+                bin_path, FIRMWARE_CHANNELS[MODULE]["bin_begin"],
+                FIRMWARE_CHANNELS[MODULE]["page_size"], version_info,
+            )
+        return version_info, firmware_image
+
     def update_response(self, response: bool, is_error_response: bool = False) -> None:
         if not is_error_response:
             self.response_flag = response
@@ -253,190 +484,170 @@ class STM32FirmwareUpdater(ModiSerialPort):
             self.response_error_flag = response
 
     def __update_firmware(self, module_id: int, module_type: str) -> None:
-        is_already_updated = False
-        # Check if module is already updated
-        for curr_module_id, curr_module_type in self.modules_updated:
-            if module_id == curr_module_id:
-                is_already_updated = True
-
-        if not is_already_updated:
-            self.module_type = module_type
-
-            # Init base root_path, utilizing local binary files
-            root_path = path.join(path.dirname(__file__), "..", "assets", "firmware", "latest", "stm32")
-            bin_path = path.join(root_path, f"{module_type.lower()}.bin")
-
-            with open(bin_path, "rb") as bin_file:
-                bin_buffer = bin_file.read()
-
-            self.this_update_error = False
-
-            # Init metadata of the bytes loaded
-            page_size = 0x800
-            flash_memory_addr = 0x08000000
-
-            bin_size = sys.getsizeof(bin_buffer)
-            bin_begin = 0x9000
-            bin_end = bin_size - ((bin_size - bin_begin) % page_size)
-
-            page_offset = 0
-            # for page_begin in range(bin_begin, bin_end + 1, page_size):
-            page_begin = bin_begin
-
-            erase_error_limit = 2
-            erase_error_count = 0
-            crc_error_limit = 2
-            crc_error_count = 0
-            while page_begin < bin_end:
-                progress = 100 * page_begin // bin_end
-                self.progress = progress
-
-                self.__print(f"\rUpdating: {module_type} ({module_id}) {self.__progress_bar(page_begin, bin_end)} {progress}%", end="")
-
-                if self.ui:
-                    update_module_num = len(self.modules_to_update)
-                    num_updated = len(self.modules_updated)
-                    if self.ui.is_english:
-                        self.ui.update_stm32_modules.setText(
-                            f"STM32 modules update is in progress. "
-                            f"({num_updated} / "
-                            f"{update_module_num})"
-                            f"({progress}%)"
-                        )
-                    else:
-                        self.ui.update_stm32_modules.setText(
-                            f"모듈 초기화가 진행중입니다. "
-                            f"({num_updated} / "
-                            f"{update_module_num})"
-                            f"({progress}%)"
-                        )
-
-                page_end = page_begin + page_size
-                curr_page = bin_buffer[page_begin:page_end]
-
-                # Skip current page if empty
-                if curr_page == bytes(len(curr_page)):
-                    page_begin = page_begin + page_size
-                    time.sleep(0.02)
-                    continue
-
-                # Erase page (send erase request and receive its response)
-                erase_page_success = self.send_firmware_command(
-                    oper_type="erase",
-                    module_id=module_id,
-                    crc_val=0,
-                    dest_addr=flash_memory_addr,
-                    page_addr=page_begin + page_offset,
-                )
-
-                if not erase_page_success:
-                    erase_error_count = erase_error_count + 1
-                    if erase_error_count > erase_error_limit:
-                        erase_error_count = 0
-                        self.has_update_error = True
-                        self.update_error_message = f"{module_type} ({module_id}) erase flash failed."
-                        break
-                    continue
-                else:
-                    erase_error_count = 0
-
-                # Copy current page data to the module's memory
-                checksum = 0
-                for curr_ptr in range(0, page_size, 8):
-                    if page_begin + curr_ptr >= bin_size:
-                        break
-
-                    curr_data = curr_page[curr_ptr:curr_ptr + 8]
-                    checksum = self.send_firmware_data(
-                        module_id,
-                        seq_num=curr_ptr // 8,
-                        bin_data=curr_data,
-                        crc_val=checksum,
-                    )
-                    self.__delay(0.001)
-                # CRC on current page (send CRC request / receive CRC response)
-                crc_page_success = self.send_firmware_command(
-                    oper_type="crc",
-                    module_id=module_id,
-                    crc_val=checksum,
-                    dest_addr=flash_memory_addr,
-                    page_addr=page_begin + page_offset,
-                )
+        # Modules in flight share this updater, so their progress and errors
+        # are kept by module id and on their records
+        module_record = self.module_registry.get(module_id)
+        self.module_progress[module_id] = 0
+        module_start_time = time.perf_counter()
+        self.events.emit(MODULE_STARTED, STM32_MODULES, module_type, module_id, 0)
+
+        flash_layout = FLASH_LAYOUTS[MODULE]
+        version_info, firmware_image = self.__get_firmware_image(module_type)
+        bin_end = firmware_image.bin_end
+
+        plan_summary = firmware_image.get_plan_summary()
+        self.__print(
+            f"Page plan of {module_type} ({module_id}): "
+            f"{plan_summary['data_pages']} data, {plan_summary['erased_pages']} erased, "
+            f"{plan_summary['empty_pages']} empty pages, saving {plan_summary['frames_saved']} frames "
+            f"and {plan_summary['round_trips_saved']} round trips"
+        )
 
-                if crc_page_success:
-                    crc_error_count = 0
-                else:
-                    crc_error_count = crc_error_count + 1
-                    if crc_error_count > crc_error_limit:
-                        crc_error_count = 0
-                        self.has_update_error = True
-                        self.update_error_message = f"{module_type} ({module_id}) check crc failed."
-                        break
-                    continue
+        # A module still holding the image recorded in the ledger only
+        # gets the pages that differ in this image
+        firmware_ledger = get_firmware_ledger()
+        module_uuid = self.module_uuids.get(module_id)
+        module_version = self.module_versions.get(module_id)
+        changed_pages = None
+        if module_uuid is not None and module_version is not None and not self.force:
+            changed_pages = firmware_ledger.get_changed_pages(module_uuid, module_version, firmware_image)
+        if changed_pages is not None:
+            self.__print(
+                f"Ledger of {module_type} ({module_id}): {len(changed_pages)} of "
+                f"{plan_summary['data_pages'] + plan_summary['erased_pages']} pages changed"
+            )
+        elif module_uuid is not None:
+            # Pages are about to be overwritten, the entry is no longer
+            # valid until the whole image has been written
+            firmware_ledger.forget(module_uuid)
+
+        # Pages confirmed before an interrupted update of this image are
+        # not written again
+        firmware_journal = get_firmware_journal()
+        resume_page = None
+        if module_uuid is not None and not self.force:
+            resume_page = firmware_journal.get_resume_page(module_uuid, firmware_image)
+        if resume_page is not None:
+            self.__print(f"Resuming {module_type} ({module_id}) from page 0x{resume_page:X}")
+
+        # Only pages to be written are left in the queue's work
+        pages_to_write = None
+        if changed_pages is not None or resume_page is not None:
+            pages_to_write = {
+                page_begin for page_begin in range(flash_layout.bin_begin, bin_end, flash_layout.page_size)
+                if (changed_pages is None or page_begin in changed_pages)
+                and (resume_page is None or page_begin >= resume_page)
+            }
+        self.progress_model.add_module(module_id, get_image_work(firmware_image, pages_to_write))
+
+        # Data frames are paced at the rate learned for this module type,
+        # frames of all modules in flight share the link through one
+        # pacer schedule
+        rate_controller = get_rate_controller(module_type, self.port)
+        page_timing_log = PageTimingLog(module_type, module_id)
+        self.page_timing_logs[module_id] = page_timing_log
+        paged_flash = PagedFlash(
+            flash_layout, firmware_image,
+            erase_page=lambda page_addr: self.send_firmware_command(
+                oper_type="erase", module_id=module_id, crc_val=0, dest_addr=page_addr,
+            ),
+            send_data=lambda seq_num, encoded_data: self.__send_conn(
+                self.get_encoded_firmware_data(module_id, seq_num=seq_num, encoded_data=encoded_data)
+            ),
+            check_crc=lambda page_addr, page_crc: self.send_firmware_command(
+                oper_type="crc", module_id=module_id, crc_val=page_crc, dest_addr=page_addr,
+            ),
+            rate_controller=rate_controller,
+            pacer=self.pacer,
+            sender=self,
+            page_timing_log=page_timing_log,
+        )
 
-                page_begin = page_begin + page_size
-                time.sleep(0.01)
-
-            self.progress = 99
-            self.__print(f"\rUpdating {module_type} ({module_id}) {self.__progress_bar(99, 100)} 99%")
-
-            verify_header = 0xAA
-            if self.has_update_error:
-                self.has_update_error = True
-                verify_header = 0xFF
-
-            # Get version info from version_path, using appropriate methods
-            version_info, version_file = None, "version.txt"
-            version_path = root_path + "/" + version_file
-            with open(version_path) as version_file:
-                version_info = version_file.readline().lstrip("v").rstrip("\n")
-            version_digits = [int(digit) for digit in version_info.split(".")]
-            """ Version number is formed by concatenating all three version bits
-                e.g. 2.2.4 -> 010 00010 00000100 -> 0100 0010 0000 0100
-            """
-            version = (
-                version_digits[0] << 13
-                | version_digits[1] << 8
-                | version_digits[2]
+        def on_page(page_begin: int) -> None:
+            progress = 100 * page_begin // bin_end
+            self.module_progress[module_id] = progress
+
+            eta = self.progress_model.eta
+            eta_text = f" ETA {eta:.0f}s" if eta is not None else ""
+            self.__print(f"\rUpdating: {module_type} ({module_id}) {self.__progress_bar(page_begin, bin_end)} {progress}%{eta_text}", end="")
+
+            self.events.emit(PAGE_DONE, STM32_MODULES, module_type, module_id, progress)
+
+        def on_page_written(page_begin: int) -> None:
+            if module_uuid is not None:
+                firmware_journal.confirm_page(module_uuid, firmware_image, page_begin)
+            self.progress_model.advance(module_id, get_page_work(firmware_image, page_begin))
+
+        update_failed = not paged_flash.write(pages_to_write, on_page, on_page_written)
+        error_message = ""
+        if update_failed:
+            error_message = f"{module_type} ({module_id}) {paged_flash.error_message}"
+
+        page_timing_log.finish()
+        self.__print(page_timing_log.format_summary())
+        if self.timing_path:
+            page_timing_log.export(self.timing_path)
+
+        self.module_progress[module_id] = 99
+        self.__print(f"\rUpdating {module_type} ({module_id}) {self.__progress_bar(99, 100)} 99%")
+
+        pages_per_second = paged_flash.pages_per_second
+        if pages_per_second is not None:
+            self.pages_per_second = pages_per_second
+            self.__print(
+                f"{module_type} ({module_id}) data pages written at "
+                f"{pages_per_second:.1f} pages/s, "
+                f"{rate_controller.rate:.0f} frames/s"
             )
 
-            # Set end-flash data to be sent at the end of the firmware update
-            end_flash_data = bytearray(8)
-            end_flash_data[0] = verify_header
-            end_flash_data[6] = version & 0xFF
-            end_flash_data[7] = (version >> 8) & 0xFF
-
-            success_end_flash = self.send_end_flash_data(module_type, module_id, end_flash_data)
-            if not success_end_flash:
-                self.update_error_message = f"{module_type} ({module_id}) version writing failed."
-                self.has_update_error = True
-
-            self.__print(f"Version info (v{version_info}) has been written to its firmware!")
-
-            # Firmware update flag down, resetting used flags
-            self.__print(f"Firmware update is done for {module_type} ({module_id})")
-            self.reset_state(update_in_progress=True)
-
-            self.progress = 100
-            self.__print(f"\rUpdating {module_type} ({module_id}) {self.__progress_bar(1, 1)} 100%")
-            self.modules_updated.append((module_id, module_type))
-
-    def __delay(self, span):
-        if self.__delay_flag == 0:
-            start_time = time.time()
-            self.thread_event.wait(span)
-            check = time.time() - start_time
-            import math
-            if math.fabs(check - span) > 0.005:
-                self.__delay_flag = 1
+        # Other modules in flight do not fail the verification of this one
+        verify_header = 0xAA
+        if update_failed:
+            verify_header = 0xFF
+
+        version = firmware_image.version
+
+        # Set end-flash data to be sent at the end of the firmware update
+        end_flash_data = bytearray(8)
+        end_flash_data[0] = verify_header
+        end_flash_data[6] = version & 0xFF
+        end_flash_data[7] = (version >> 8) & 0xFF
+
+        success_end_flash = self.send_end_flash_data(module_type, module_id, end_flash_data)
+        if not success_end_flash:
+            error_message = f"{module_type} ({module_id}) version writing failed."
+            update_failed = True
+        if module_record is not None:
+            module_record.error_message = error_message
+
+        if module_uuid is not None:
+            if update_failed:
+                firmware_ledger.forget(module_uuid)
             else:
-                self.__delay_flag = 2
-        elif self.__delay_flag == 1:
-            init_time = time.perf_counter()
-            while time.perf_counter() - init_time < span:
-                pass
-        elif self.__delay_flag == 2:
-            self.thread_event.wait(span)
+                firmware_ledger.record(module_uuid, firmware_image)
+                firmware_journal.finish(module_uuid)
+
+        self.__print(f"Version info (v{version_info}) has been written to its firmware!")
+
+        # Firmware update flag down, resetting used flags
+        self.__print(f"Firmware update is done for {module_type} ({module_id})")
+        self.reset_state(update_in_progress=True)
+
+        self.__print(f"\rUpdating {module_type} ({module_id}) {self.__progress_bar(1, 1)} 100%")
+        self.module_update_times.append(time.perf_counter() - module_start_time)
+        self.__last_module = (module_type, 100)
+        self.module_progress.pop(module_id, None)
+        self.progress_model.complete(module_id)
+        # One bad module does not fail the kit until its retries are used up
+        if self.module_registry.finish(module_id, update_failed):
+            self.__print(f"{module_type} ({module_id}) failed, retrying after the other modules")
+        elif update_failed:
+            # The kit reports the last module given up
+            self.has_update_error = True
+            self.update_error_message = error_message
+            self.events.emit(ERROR, STM32_MODULES, module_type, module_id, 100, error_message)
+        else:
+            self.events.emit(MODULE_DONE, STM32_MODULES, module_type, module_id, 100, f"v{version_info}")
 
     @staticmethod
     def __set_module_state(
@@ -457,36 +668,27 @@ class STM32FirmwareUpdater(ModiSerialPort):
 
         return json.dumps(message, separators=(",", ":"))
 
-    # TODO: Use retry decorator here
-    @retry(Exception)
+    @get_retry_policy("end_flash")
     def send_end_flash_data(
         self, module_type: str, module_id: int, end_flash_data: bytearray
-    ) -> None:
-        # Write end-flash data until success
+    ) -> bool:
+        # Write end-flash data until success or until retries run out
         end_flash_success = False
 
-        erase_error_limit = 2
-        erase_error_count = 0
-        crc_error_limit = 2
-        crc_error_count = 0
+        erase_attempts = get_retry_policy("page_erase").begin()
+        crc_attempts = get_retry_policy("page_crc").begin()
         while not end_flash_success:
             # Erase page (send erase request and receive erase response)
             erase_page_success = self.send_firmware_command(
                 oper_type="erase",
                 module_id=module_id,
                 crc_val=0,
-                dest_addr=0x0801F800,
+                dest_addr=FLASH_LAYOUTS[MODULE].end_flash_addr,
             )
-            # TODO: Remove magic number of dest_addr above, try using flash_mem
             if not erase_page_success:
-                erase_error_count = erase_error_count + 1
-                if erase_error_count > erase_error_limit:
-                    erase_error_count = 0
-                    self.update_error_message = "Response timed-out"
+                if not erase_attempts.retry():
                     break
                 continue
-            else:
-                erase_error_count = 0
 
             # Send data
             checksum = self.send_firmware_data(
@@ -498,17 +700,12 @@ class STM32FirmwareUpdater(ModiSerialPort):
                 oper_type="crc",
                 module_id=module_id,
                 crc_val=checksum,
-                dest_addr=0x0801F800,
+                dest_addr=FLASH_LAYOUTS[MODULE].end_flash_addr,
             )
             if not crc_page_success:
-                crc_error_count = crc_error_count + 1
-                if crc_error_count > crc_error_limit:
-                    crc_error_count = 0
-                    self.update_error_message = "Response timed-out"
+                if not crc_attempts.retry():
                     break
                 continue
-            else:
-                crc_error_count = 0
 
             end_flash_success = True
         self.__print(f"End flash is written for {module_type} ({module_id})")
@@ -564,17 +761,22 @@ class STM32FirmwareUpdater(ModiSerialPort):
 
         return json.dumps(message, separators=(",", ":"))
 
-    def calc_crc32(self, data: bytes, crc: int) -> int:
-        crc ^= int.from_bytes(data, byteorder="little", signed=False)
+    def get_encoded_firmware_data(
+        self, module_id: int, seq_num: int, encoded_data: str
+    ) -> str:
+        # Same message as get_firmware_data, data is already base64 encoded
+        message = dict()
+        message["c"] = 0x0B
+        message["s"] = seq_num
+        message["d"] = module_id
 
-        for _ in range(32):
-            if crc & (1 << 31) != 0:
-                crc = (crc << 1) ^ 0x4C11DB7
-            else:
-                crc <<= 1
-            crc &= 0xFFFFFFFF
+        message["b"] = encoded_data
+        message["l"] = 8
+
+        return json.dumps(message, separators=(",", ":"))
 
-        return crc
+    def calc_crc32(self, data: bytes, crc: int) -> int:
+        return calc_crc32(data, crc)
 
     def calc_crc64(self, data: bytes, checksum: int) -> int:
         checksum = self.calc_crc32(data[:4], checksum)
@@ -590,47 +792,62 @@ class STM32FirmwareUpdater(ModiSerialPort):
         page_addr: int = 0,
     ) -> bool:
         rot_scmd = 2 if oper_type == "erase" else 1
-        # Send firmware command request
+        # Send firmware command request, registered before it is sent so
+        # that its ack can not arrive unnoticed
         self.reset_state(True)
+        response = self.__expect_response(module_id)
         request_message = self.get_firmware_command(
             module_id, 1, rot_scmd, crc_val, page_addr=dest_addr + page_addr
         )
         self.__send_conn(request_message)
 
-        return self.receive_command_response()
+        return self.receive_command_response(response)
 
     def receive_command_response(
-        self,
-        response_delay: float = 0.01,
-        response_timeout: float = 2,
-        max_response_error_count: int = 10,
+        self, response: Future, response_timeout: float = 2,
     ) -> bool:
+        # Receive firmware command response, the future wakes up as soon as
+        # the ack is handled and times out on a monotonic clock
+        try:
+            stream_state = response.result(timeout=response_timeout)
+        except FutureTimeoutError:
+            self.__discard_response(response)
+            # Raised to the module's own update, other modules in flight
+            # share this updater
+            if self.raise_error_message:
+                raise Exception("Response timed-out")
+            return False
+
+        # If error is raised
+        if stream_state in (self.CRC_ERROR, self.ERASE_ERROR):
+            if self.raise_error_message:
+                raise Exception("Response Errored")
+            return False
 
-        # Receive firmware command response
-        response_wait_time = 0
-        while not self.response_flag:
-            # Calculate timeout at each iteration
-            time.sleep(response_delay)
-            response_wait_time += response_delay
-
-            # If timed-out
-            if response_wait_time > response_timeout:
-                self.update_error_message = "Response timed-out"
-                if self.raise_error_message:
-                    raise Exception(self.update_error_message)
-                return False
-
-            # If error is raised
-            if self.response_error_flag:
-                self.update_error_message = "Response Errored"
-                if self.raise_error_message:
-                    raise Exception(self.update_error_message)
-                self.response_error_flag = False
-                return False
-
-        self.response_flag = False
         return True
 
+    def __expect_response(self, module_id: int) -> Future:
+        response = Future()
+        with self.__responses_lock:
+            prev_response = self.__responses.get(module_id)
+            if prev_response is not None:
+                prev_response.cancel()
+            self.__responses[module_id] = response
+        return response
+
+    def __discard_response(self, response: Future) -> None:
+        with self.__responses_lock:
+            for module_id, pending_response in list(self.__responses.items()):
+                if pending_response is response:
+                    del self.__responses[module_id]
+
+    def __resolve_response(self, module_id: int, stream_state: int) -> None:
+        with self.__responses_lock:
+            # Acks of other modules, e.g. late ones, never complete a request
+            response = self.__responses.pop(module_id, None)
+        if response is not None and response.set_running_or_notify_cancel():
+            response.set_result(stream_state)
+
     def send_firmware_data(
         self, module_id: int, seq_num: int, bin_data: bytes, crc_val: int
     ) -> int:
@@ -651,13 +868,15 @@ class STM32FirmwareUpdater(ModiSerialPort):
 
     def __send_conn(self, data):
         # print("send", data)
-        self.write(data)
-        self.flush()
+        # Frames of modules in flight are written whole, one at a time
+        with self.__send_lock:
+            self.write(data)
+            self.flush()
 
     def __read_conn(self):
         for _ in range(0, 3):
             self.request_network_id()
-            time.sleep(0.01)
+            self.timing_profile.wait("request_gap")
 
         while self.__running:
             self.__handle_message()
@@ -681,7 +900,7 @@ class STM32FirmwareUpdater(ModiSerialPort):
         while not json_msg:
             json_msg = self.read_json()
             time.sleep(0.001)
-            if time.time() - init_time > timeout:
+            if time.time() - init_time > timeout or not self.__running:
                 return None
         return json_msg
 
@@ -696,7 +915,7 @@ class STM32FirmwareUpdater(ModiSerialPort):
             return
 
         command = {
-            0x05: self.__assign_network_id,
+            0x05: self.__assign_module_id,
             0x0A: self.__update_warning,
             0x0C: self.__update_firmware_state,
         }.get(ins)
@@ -716,6 +935,11 @@ class STM32FirmwareUpdater(ModiSerialPort):
             self.update_response(response=True, is_error_response=True)
         elif stream_state == self.ERASE_COMPLETE:
             self.update_response(response=True)
+        else:
+            return
+
+        # Wake up the request waiting for this ack
+        self.__resolve_response(sid, stream_state)
 
     def __update_warning(self, sid: int, data: str) -> None:
         module_uuid = unpack_data(data, (6, 1))[0]
@@ -727,13 +951,25 @@ class STM32FirmwareUpdater(ModiSerialPort):
 
         module_id = sid
         module_type = get_module_type_from_uuid(module_uuid)
+        self.module_uuids[module_id] = module_uuid
+        if not self.module_filter.matches(module_id, module_uuid):
+            # Modules which were not selected are left as they are
+            return
+        if self.update_in_progress and (module_id, warning_type) not in self.discovered_modules:
+            # Discovery settles once no module has shown up for a while
+            self.discovered_modules.add((module_id, warning_type))
+            self.__last_discovery_change = time.monotonic()
+            self.__modules_changed.set()
         if module_type == "network":
             self.network_uuid = module_uuid
 
         if warning_type == 1:
+            if self.update_in_progress:
+                self.__ready_modules.setdefault(module_id, time.monotonic())
             self.check_to_update_firmware(module_id)
         elif warning_type == 2:
             # Note that more than one warning type 2 message can be received
+            self.__ready_modules.pop(module_id, None)
             self.add_to_module_list(module_id, module_type)
 
     def __print(self, data, end="\n"):
@@ -742,16 +978,30 @@ class STM32FirmwareUpdater(ModiSerialPort):
 
 
 class STM32FirmwareMultiUpdater():
-    def __init__(self):
+    def __init__(
+        self, firmware_bundle=None, max_in_flight=1, force=False, timing_path=None,
+        module_filter=None,
+    ):
+        self.firmware_bundle = firmware_bundle
+        self.max_in_flight = max_in_flight
+        self.force = force
+        self.timing_path = timing_path
+        # Modules selected on every network module, all of them if None
+        self.module_filter = module_filter
         self.update_in_progress = False
-        self.ui = None
+        # Events of every module updater are reported to these subscribers
+        self.events = UpdateEvents()
         self.list_ui = None
 
-    def set_ui(self, ui, list_ui):
-        self.ui = ui
+    def set_list_ui(self, list_ui):
         self.list_ui = list_ui
 
     def update_module_firmware(self, modi_ports):
+        timing_profile = get_timing_profile()
+        timing_profile.reset_idle_time()
+        pacing_idle_time = get_pacer().idle_time
+        update_start_time = time.perf_counter()
+        retry_counts = get_retry_counts()
         self.module_updaters = []
         self.network_uuid = []
         self.state = []
@@ -761,9 +1011,14 @@ class STM32FirmwareMultiUpdater():
             if i > 9:
                 break
             try:
-                module_updater = STM32FirmwareUpdater(device=modi_port)
+                module_updater = STM32FirmwareUpdater(
+                    device=modi_port, firmware_bundle=self.firmware_bundle,
+                    max_in_flight=self.max_in_flight, force=self.force,
+                    timing_path=self.timing_path, module_filter=self.module_filter,
+                )
                 module_updater.set_print(False)
                 module_updater.set_raise_error(False)
+                module_updater.set_events(self.events)
             except Exception:
                 print("open " + modi_port + " error")
             else:
@@ -774,9 +1029,9 @@ class STM32FirmwareMultiUpdater():
 
         if self.list_ui:
             self.list_ui.set_device_num(len(self.module_updaters))
-            self.list_ui.ui.close_button.setEnabled(False)
 
         self.update_in_progress = True
+        self.events.emit(UPDATE_STARTED, STM32_MODULES, progress=0)
 
         for index, module_updater in enumerate(self.module_updaters):
             th.Thread(
@@ -787,9 +1042,14 @@ class STM32FirmwareMultiUpdater():
                 self.list_ui.error_message_signal.emit(index, "Waiting for network uuid")
 
         delay = 0.1
+        # A network module whose update has not started by the time its
+        # updater gives up waiting has no modules to update
+        module_wait_timeout = timing_profile.get("module_wait_timeout")
         while True:
             is_done = True
             total_progress = 0
+            # Network modules update in parallel, the slowest one sets the ETA
+            station_eta = None
             for index, module_updater in enumerate(self.module_updaters):
                 if module_updater.network_uuid is not None:
                     self.network_uuid[index] = f'0x{module_updater.network_uuid:X}'
@@ -805,7 +1065,7 @@ class STM32FirmwareMultiUpdater():
                         self.state[index] = 0
                     else:
                         self.wait_timeout[index] += delay
-                        if self.wait_timeout[index] > 5:
+                        if self.wait_timeout[index] > module_wait_timeout:
                             self.wait_timeout[index] = 0
                             self.state[index] = 1
                             module_updater.update_error = -1
@@ -820,12 +1080,23 @@ class STM32FirmwareMultiUpdater():
                         current_module_progress = 0
                         total_module_progress = 0
 
-                        if module_updater.progress is not None and len(module_updater.modules_to_update_all) != 0:
+                        module_registry = module_updater.module_registry
+                        if module_updater.progress is not None and len(module_registry) != 0:
                             current_module_progress = module_updater.progress
-                            if len(module_updater.modules_updated) == len(module_updater.modules_to_update_all):
+                            num_finished = module_registry.count(*ModuleState.FINISHED_STATES)
+                            if num_finished == len(module_registry):
                                 total_module_progress = 100
+                            elif module_updater.progress_model.total_work:
+                                # Bytes and round trips left across the queue
+                                total_module_progress = module_updater.progress_model.progress
                             else:
-                                total_module_progress = (module_updater.progress + len(module_updater.modules_updated) * 100) / (len(module_updater.modules_to_update_all) * 100) * 100
+                                # Every module in flight adds its own progress
+                                in_flight_progress = sum(module_updater.module_progress.copy().values())
+                                total_module_progress = (in_flight_progress + num_finished * 100) / (len(module_registry) * 100) * 100
+
+                            eta = module_updater.get_eta()
+                            if eta is not None:
+                                station_eta = max(station_eta or 0, eta)
 
                             total_progress += total_module_progress / len(self.module_updaters)
 
@@ -858,13 +1129,10 @@ class STM32FirmwareMultiUpdater():
                 time.sleep(0.001)
 
             if len(self.module_updaters):
-                print(f"{self.__progress_bar(total_progress, 100)}", end="")
+                eta_text = f" ETA {station_eta:.0f}s" if station_eta is not None else ""
+                print(f"{self.__progress_bar(total_progress, 100)}{eta_text}", end="")
 
-                if self.ui:
-                    if self.ui.is_english:
-                        self.ui.update_stm32_modules.setText(f"STM32 modules update is in progress. ({int(total_progress)}%)")
-                    else:
-                        self.ui.update_stm32_modules.setText(f"모듈 초기화가 진행중입니다. ({int(total_progress)}%)")
+                self.events.emit(UPDATE_PROGRESS, STM32_MODULES, progress=total_progress)
 
                 if self.list_ui:
                     self.list_ui.total_progress_signal.emit(total_progress)
@@ -876,29 +1144,36 @@ class STM32FirmwareMultiUpdater():
             time.sleep(delay)
 
         self.update_in_progress = False
-
-        if self.ui:
-            self.ui.update_network_stm32.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-            self.ui.update_network_stm32.setEnabled(True)
-            self.ui.update_network_esp32.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-            self.ui.update_network_esp32.setEnabled(True)
-            self.ui.update_network_stm32_bootloader.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-            self.ui.update_network_stm32_bootloader.setEnabled(True)
-            self.ui.update_network_esp32_interpreter.setStyleSheet(f"border-image: url({self.ui.active_path}); font-size: 16px; color: black;")
-            self.ui.update_network_esp32_interpreter.setEnabled(True)
-            if self.ui.is_english:
-                self.ui.update_stm32_modules.setText("Update STM32 Modules.")
-            else:
-                self.ui.update_stm32_modules.setText("모듈 초기화")
+        self.events.emit(UPDATE_DONE, STM32_MODULES, progress=100)
 
         if self.list_ui:
-            self.list_ui.ui.close_button.setEnabled(True)
             self.list_ui.total_status_signal.emit("Complete")
             self.list_ui.total_progress_signal.emit(100)
             for index, module_updater in enumerate(self.module_updaters):
                 self.list_ui.progress_signal.emit(index, 100, 100)
 
         print("\nSTM firmware update is complete!!")
+        num_skipped = sum(
+            module_updater.module_registry.count(ModuleState.SKIPPED) for module_updater in self.module_updaters
+        )
+        num_updated = sum(
+            module_updater.module_registry.count(ModuleState.DONE, ModuleState.FAILED)
+            for module_updater in self.module_updaters
+        )
+        print(
+            f"{num_updated} modules updated in {time.perf_counter() - update_start_time:.2f}s, "
+            f"up to {self.max_in_flight} at once per network module"
+        )
+        if num_skipped:
+            skipped_time = sum(module_updater.get_skipped_time() for module_updater in self.module_updaters)
+            print(f"{num_skipped} modules already up to date were skipped, saving about {skipped_time:.1f}s")
+        print(
+            f"Intentional idle time: {timing_profile.idle_time:.2f}s, "
+            f"frame pacing: {get_pacer().idle_time - pacing_idle_time:.2f}s"
+        )
+        retry_summary = format_retry_summary(retry_counts)
+        if retry_summary:
+            print(retry_summary)
 
     @staticmethod
     def __progress_bar(current: int, total: int) -> str:
@@ -1,16 +1,9 @@
-import io
 import os
 import pathlib
-import shutil
 import sys
 import threading as th
 import time
 import traceback as tb
-import urllib.request as ur
-import zipfile
-from io import open
-from os import path
-from urllib.error import URLError
 
 from PyQt5 import QtGui, QtWidgets, uic
 from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
@@ -20,8 +13,48 @@ from modi_firmware_updater.core.esp32_updater import ESP32FirmwareMultiUpdater
 from modi_firmware_updater.core.stm32_network_updater import \
     NetworkFirmwareMultiUpdater
 from modi_firmware_updater.core.stm32_updater import STM32FirmwareMultiUpdater
+from modi_firmware_updater.util.firmware_download import (
+    DownloadError, download_file, extract_firmware, fetch_sha256,
+    get_default_download_path)
+from modi_firmware_updater.util.firmware_manifest import (
+    ESP32, FIRMWARE_CHANNELS, MODULE, NETWORK, reload_firmware_manifest)
+from modi_firmware_updater.util.firmware_refresher import FirmwareRefresher
+from modi_firmware_updater.util.firmware_store import get_firmware_store
 from modi_firmware_updater.util.modi_winusb.modi_serialport import \
     list_modi_serialports
+from modi_firmware_updater.util.update_events import (
+    NETWORK_BOOTLOADER, NETWORK_ESP32, NETWORK_ESP32_INTERPRETER,
+    NETWORK_STM32, STM32_MODULES, UPDATE_DONE, UPDATE_PROGRESS, UPDATE_STARTED)
+
+BUTTON_TEXTS_EN = [
+    "Update Network ESP32",
+    "Update Network ESP32 Interpreter",
+    "Update STM32 Modules",
+    "Update Network STM32",
+    "Set Network Bootloader STM32",
+    "Dev Mode",
+    "한국어",
+]
+BUTTON_TEXTS_KR = [
+    "네트워크 모듈 업데이트",
+    "네트워크 모듈 인터프리터 초기화",
+    "모듈 초기화",
+    "네트워크 모듈 초기화",
+    "네트워크 모듈 부트로더",
+    "개발자 모드",
+    "English",
+]
+
+""" Button of every kind of update and its progress text in English and Korean """
+UPDATE_BUTTONS = {
+    NETWORK_ESP32: (0, "Network ESP32 update is in progress.", "네트워크 모듈 업데이트가 진행중입니다."),
+    NETWORK_ESP32_INTERPRETER: (
+        1, "Network ESP32 Interpreter reset is in progress.", "네트워크 모듈 인터프리터 초기화가 진행중입니다."
+    ),
+    STM32_MODULES: (2, "STM32 modules update is in progress.", "모듈 초기화가 진행중입니다."),
+    NETWORK_STM32: (3, "Network STM32 update is in progress.", "네트워크 모듈 초기화가 진행중입니다."),
+    NETWORK_BOOTLOADER: (4, "Network bootloader is in progress.", "네트워크 모듈 부트로터 진행중입니다."),
+}
 
 
 class StdoutRedirect(QObject):
@@ -108,6 +141,7 @@ class PopupMessageBox(QtWidgets.QMessageBox):
 class ThreadSignal(QObject):
     thread_error = pyqtSignal(object)
     thread_signal = pyqtSignal(object)
+    update_event = pyqtSignal(object)
 
     def __init__(self):
         super().__init__()
@@ -172,8 +206,10 @@ class Form(QDialog):
         self.stdout.start()
         self.stdout.printOccur.connect(lambda line: self.__append_text_line(line))
 
-        # Set signal for thread communication
+        # Set signal for thread communication, update events are emitted
+        # from updater threads and handled on the GUI thread
         self.stream = ThreadSignal()
+        self.stream.update_event.connect(self.__handle_update_event)
 
         # Connect up the buttons
         self.ui.update_network_esp32.clicked.connect(self.update_network_esp32)
@@ -215,21 +251,14 @@ class Form(QDialog):
         self.ui.language_frame_pressed_path = self.language_frame_pressed_path
         self.ui.stream = self.stream
 
-        # Check module firmware
-        self.local_firmware_path = path.join(path.dirname(__file__), "assets", "firmware", "latest")
+        # Check module firmware, downloads are kept in the firmware store
         # module
-        self.local_module_firmware_path = path.join(self.local_firmware_path, "stm32")
-        self.local_module_version_path = path.join(self.local_module_firmware_path, "version.txt")
         self.latest_module_firmware_path = "https://download.luxrobo.com/modi-skeleton/skeleton.zip"
         self.latest_module_version_path = "https://download.luxrobo.com/modi-skeleton/version.txt"
         # network base
-        self.local_network_firmware_path = path.join(self.local_firmware_path, "stm32")
-        self.local_network_version_path = path.join(self.local_network_firmware_path, "base_version.txt")
         self.latest_network_firmware_path = "https://download.luxrobo.com/modi-network-os/network.zip"
         self.latest_network_version_path = "https://download.luxrobo.com/modi-network-os/version.txt"
         # esp32
-        self.local_esp32_firmware_path = path.join(self.local_firmware_path, "esp32")
-        self.local_esp32_version_path = path.join(self.local_esp32_firmware_path, "esp_version.txt")
         self.latest_esp32_firmware_path = [
             "https://download.luxrobo.com/modi-ota-firmware/ota.zip",
             "https://download.luxrobo.com/modi-esp32-firmware/esp.zip",
@@ -265,7 +294,7 @@ class Form(QDialog):
 
         def run_task(self, modi_ports):
             self.firmware_updater = ESP32FirmwareMultiUpdater()
-            self.firmware_updater.set_ui(self.ui, None)
+            self.firmware_updater.events.subscribe(self.stream.update_event.emit)
             self.firmware_updater.update_firmware([modi_ports[0]], False)
 
         th.Thread(
@@ -295,7 +324,7 @@ class Form(QDialog):
 
         def run_task(self, modi_ports):
             self.firmware_updater = ESP32FirmwareMultiUpdater()
-            self.firmware_updater.set_ui(self.ui, None)
+            self.firmware_updater.events.subscribe(self.stream.update_event.emit)
             self.firmware_updater.update_firmware([modi_ports[0]], True)
 
         th.Thread(
@@ -324,7 +353,7 @@ class Form(QDialog):
         # self.stm32_update_list_form.ui.show()
         def run_task(self, modi_ports):
             self.firmware_updater = STM32FirmwareMultiUpdater()
-            self.firmware_updater.set_ui(self.ui, None)
+            self.firmware_updater.events.subscribe(self.stream.update_event.emit)
             self.firmware_updater.update_module_firmware([modi_ports[0]])
 
         th.Thread(
@@ -353,7 +382,7 @@ class Form(QDialog):
         # self.stm32_update_list_form.ui.show()
         def run_task(self, modi_ports):
             self.firmware_updater = NetworkFirmwareMultiUpdater()
-            self.firmware_updater.set_ui(self.ui, None)
+            self.firmware_updater.events.subscribe(self.stream.update_event.emit)
             self.firmware_updater.update_module_firmware([modi_ports[0]], False)
 
         th.Thread(
@@ -382,7 +411,7 @@ class Form(QDialog):
         # self.stm32_update_list_form.ui.show()
         def run_task(self, modi_ports):
             self.firmware_updater = NetworkFirmwareMultiUpdater()
-            self.firmware_updater.set_ui(self.ui, None)
+            self.firmware_updater.events.subscribe(self.stream.update_event.emit)
             self.firmware_updater.update_module_firmware([modi_ports[0]], True)
 
         th.Thread(
@@ -411,26 +440,8 @@ class Form(QDialog):
         th.Thread(
             target=self.__click_motion, args=(6, button_start), daemon=True
         ).start()
-        button_en = [
-            "Update Network ESP32",
-            "Update Network ESP32 Interpreter",
-            "Update STM32 Modules",
-            "Update Network STM32",
-            "Set Network Bootloader STM32",
-            "Dev Mode",
-            "한국어",
-        ]
-        button_kr = [
-            "네트워크 모듈 업데이트",
-            "네트워크 모듈 인터프리터 초기화",
-            "모듈 초기화",
-            "네트워크 모듈 초기화",
-            "네트워크 모듈 부트로더",
-            "개발자 모드",
-            "English",
-        ]
         appropriate_translation = (
-            button_kr if self.button_in_english else button_en
+            BUTTON_TEXTS_KR if self.button_in_english else BUTTON_TEXTS_EN
         )
         self.button_in_english = not self.button_in_english
         self.ui.is_english = not self.ui.is_english
@@ -438,189 +449,108 @@ class Form(QDialog):
             button.setText(appropriate_translation[i])
 
     def check_module_firmware(self):
-        if not os.path.exists(self.local_firmware_path):
-            os.mkdir(self.local_firmware_path)
-
-        self.__check_module_version()
-        self.__check_network_base_version()
-        self.__check_esp32_version()
-
-    def __download_module_firmware(self):
-        try:
-            # read latest version
-            with ur.urlopen(self.latest_module_version_path, timeout=5) as conn:
-                last_version_name = conn.read().decode("utf8")
-
-            # skeleton update
-            with ur.urlopen(self.latest_module_firmware_path, timeout=5) as conn:
-                module_name = [
-                    "button",
-                    "dial",
-                    "display",
-                    "environment",
-                    "gyro",
-                    "ir",
-                    "led",
-                    "mic",
-                    "motor",
-                    "speaker",
-                    "ultrasonic"
-                ]
-                download_response = conn.read()
-                zip_content = zipfile.ZipFile(io.BytesIO(download_response), "r")
-
-                for i, module in enumerate(module_name):
-                    src_path = module + "/Base_module.bin"
-                    bin_buffer = zip_content.read(src_path)
-
-                    if module == "environment":
-                        dest_path = path.join(self.local_module_firmware_path, "env" + ".bin")
-                    else:
-                        dest_path = path.join(self.local_module_firmware_path, module + ".bin")
-
-                    with open(dest_path, "wb") as data_file:
-                        data_file.write(bin_buffer)
-
-            # version update
-            with open(path.join(self.local_module_firmware_path, "version.txt"), "w") as data_file:
-                data_file.write(last_version_name)
-
-            return True
-
-        except URLError:
-            return False
-
-    def __download_network_firmware(self):
-        try:
-            # read latest version
-            with ur.urlopen(self.latest_network_version_path, timeout=5) as conn:
-                last_version_name = conn.read().decode("utf8")
-
-            # network base update
-            with ur.urlopen(self.latest_network_firmware_path, timeout=5) as conn:
-                download_response = conn.read()
-                zip_content = zipfile.ZipFile(io.BytesIO(download_response), "r")
-
-                with open(path.join(self.local_network_firmware_path, "network.bin"), "wb") as data_file:
-                    data_file.write(zip_content.read("network.bin"))
+        # Version files are checked concurrently in the background so the
+        # window does not wait for the network
+        self.firmware_refresher = FirmwareRefresher()
+        self.firmware_refresher.add_channel(
+            MODULE, self.latest_module_version_path, self.__download_module_firmware
+        )
+        self.firmware_refresher.add_channel(
+            NETWORK, self.latest_network_version_path, self.__download_network_firmware
+        )
+        self.firmware_refresher.add_channel(
+            ESP32, self.latest_esp32_version_path, self.__download_esp32_firmware
+        )
+        self.firmware_refresher.start()
+
+    def __download_module_firmware(self, last_version_name):
+        # skeleton update
+        module_name = [
+            "button",
+            "dial",
+            "display",
+            "environment",
+            "gyro",
+            "ir",
+            "led",
+            "mic",
+            "motor",
+            "speaker",
+            "ultrasonic"
+        ]
+        members = dict()
+        for module in module_name:
+            src_path = module + "/Base_module.bin"
+            if module == "environment":
+                members[src_path] = "env" + ".bin"
+            else:
+                members[src_path] = module + ".bin"
 
-            # version update
-            with open(path.join(self.local_network_firmware_path, "base_version.txt"), "w") as data_file:
-                data_file.write(last_version_name)
+        return self.__download_firmware(
+            MODULE, last_version_name, [(self.latest_module_firmware_path, members)]
+        )
 
-            return True
+    def __download_network_firmware(self, last_version_name):
+        # network base update
+        return self.__download_firmware(
+            NETWORK, last_version_name,
+            [(self.latest_network_firmware_path, {"network.bin": "network.bin"})],
+        )
 
-        except URLError:
-            return False
+    def __download_esp32_firmware(self, last_version_name):
+        # ota, bootloader, partitions and esp32 update
+        ota_members = ["modi_ota_factory.bin", "ota_data_initial.bin"]
+        esp_members = ["bootloader.bin", "partitions.bin", "esp32.bin"]
+        return self.__download_firmware(
+            ESP32, last_version_name, [
+                (self.latest_esp32_firmware_path[0], {name: name for name in ota_members}),
+                (self.latest_esp32_firmware_path[1], {name: name for name in esp_members}),
+            ],
+        )
 
-    def __download_esp32_firmware(self):
+    def __download_firmware(self, channel, version_name, archives):
+        # Archives are streamed to disk and resumed if the connection drops,
+        # members are extracted into the store without loading whole archives.
+        # An archive not matching the SHA-256 of its release is never
+        # extracted, so its version is not activated. Releases without a
+        # published SHA-256 are extracted unverified
+        firmware_store = get_firmware_store()
+        firmware_files = dict()
         try:
-            # read latest version
-            with ur.urlopen(self.latest_esp32_version_path, timeout=5) as conn:
-                last_version_name = conn.read().decode("utf8")
-
-            # ota update
-            with ur.urlopen(self.latest_esp32_firmware_path[0], timeout=5) as conn:
-                download_response = conn.read()
-                zip_content = zipfile.ZipFile(io.BytesIO(download_response), "r")
-
-                with open(path.join(self.local_esp32_firmware_path, "modi_ota_factory.bin"), "wb") as data_file:
-                    data_file.write(zip_content.read("modi_ota_factory.bin"))
-
-                with open(path.join(self.local_esp32_firmware_path, "ota_data_initial.bin"), "wb") as data_file:
-                    data_file.write(zip_content.read("ota_data_initial.bin"))
-
-            # bootloader, partitions, esp32 update
-            with ur.urlopen(self.latest_esp32_firmware_path[1], timeout=5) as conn:
-                download_response = conn.read()
-                zip_content = zipfile.ZipFile(io.BytesIO(download_response), "r")
-
-                with open(path.join(self.local_esp32_firmware_path, "bootloader.bin"), "wb") as data_file:
-                    data_file.write(zip_content.read("bootloader.bin"))
-
-                with open(path.join(self.local_esp32_firmware_path, "partitions.bin"), "wb") as data_file:
-                    data_file.write(zip_content.read("partitions.bin"))
-
-                with open(path.join(self.local_esp32_firmware_path, "esp32.bin"), "wb") as data_file:
-                    data_file.write(zip_content.read("esp32.bin"))
-
-            # version update
-            with open(path.join(self.local_esp32_firmware_path, "esp_version.txt"), "w") as data_file:
-                data_file.write(last_version_name)
-
-            return True
-
-        except URLError:
+            for url, members in archives:
+                zip_path = os.path.join(
+                    get_default_download_path(), f"{channel}-{os.path.basename(url)}"
+                )
+                sha256 = fetch_sha256(url)
+                if sha256 is None:
+                    print(f"No SHA-256 is published for {url}, the archive is not verified")
+                download_file(url, zip_path, sha256)
+                firmware_files.update(extract_firmware(zip_path, members, firmware_store))
+                os.remove(zip_path)
+        except (DownloadError, OSError):
             return False
 
-    def __check_module_version(self):
-        try:
-            local_version_info = None
-            latest_version_info = None
-
-            with ur.urlopen(self.latest_module_version_path, timeout=5) as conn:
-                latest_version_name = conn.read().decode("utf8")
-                latest_version_info = latest_version_name.lstrip("v").rstrip("\n")
-
-            if os.path.exists(self.local_module_firmware_path):
-                with open(self.local_module_version_path) as version_file:
-                    local_version_info = version_file.readline().lstrip("v").rstrip("\n")
-            else:
-                os.mkdir(self.local_module_firmware_path)
-
-            if (local_version_info is None) or (local_version_info != latest_version_info):
-                self.__download_module_firmware()
-
-        except URLError:
-            if not os.path.exists(self.local_module_firmware_path):
-                assert_path = path.join(path.dirname(__file__), "assets", "firmware", "stm32")
-                shutil.copytree(assert_path, self.local_module_firmware_path)
-
-    def __check_network_base_version(self):
-        try:
-            local_version_info = None
-            latest_version_info = None
-
-            with ur.urlopen(self.latest_network_version_path, timeout=5) as conn:
-                latest_version_name = conn.read().decode("utf8")
-                latest_version_info = latest_version_name.lstrip("v").rstrip("\n")
-
-            if os.path.exists(self.local_network_firmware_path):
-                with open(self.local_module_version_path) as version_file:
-                    local_version_info = version_file.readline().lstrip("v").rstrip("\n")
-            else:
-                os.mkdir(self.local_network_firmware_path)
-
-            if (local_version_info is None) or (local_version_info != latest_version_info):
-                self.__download_network_firmware()
-
-        except URLError:
-            if not os.path.exists(self.local_network_firmware_path):
-                assert_path = path.join(path.dirname(__file__), "assets", "firmware", "stm32")
-                shutil.copytree(assert_path, self.local_network_firmware_path)
+        # version update
+        self.__activate_firmware(channel, version_name, firmware_files)
+        return True
 
-    def __check_esp32_version(self):
+    @staticmethod
+    def __activate_firmware(channel, version_name, firmware_files):
+        # Firmware is written aside in the store, updaters only see it once
+        # the whole version is in place and activated
+        firmware_store = get_firmware_store()
+        version_key = firmware_store.add_version(
+            channel, version_name, firmware_files,
+            FIRMWARE_CHANNELS[channel]["version_file"],
+        )
+        firmware_store.activate(channel, version_key)
+        reload_firmware_manifest()
+        # Old versions are dropped once the new one is active, files still
+        # open by an updater are left for the next time
         try:
-            local_version_info = None
-            latest_version_info = None
-
-            with ur.urlopen(self.latest_esp32_version_path, timeout=5) as conn:
-                latest_version_name = conn.read().decode("utf8")
-                latest_version_info = latest_version_name.lstrip("v").rstrip("\n")
-
-            if os.path.exists(self.local_esp32_firmware_path):
-                with open(self.local_module_version_path) as version_file:
-                    local_version_info = version_file.readline().lstrip("v").rstrip("\n")
-            else:
-                os.mkdir(self.local_esp32_firmware_path)
-
-            if (local_version_info is None) or (local_version_info != latest_version_info):
-                self.__download_esp32_firmware()
-
-        except URLError:
-            if not os.path.exists(self.local_esp32_firmware_path):
-                assert_path = path.join(path.dirname(__file__), "assets", "firmware", "esp32")
-                shutil.copytree(assert_path, self.local_esp32_firmware_path)
+            firmware_store.prune()
+        except OSError:
+            pass
 
     # Helper functions
     def __popup_excepthook(self, exctype, value, traceback):
@@ -645,6 +575,31 @@ class Form(QDialog):
             err_msg.exc_type, err_msg.exc_value, err_msg.exc_traceback
         )
 
+    @pyqtSlot(object)
+    def __handle_update_event(self, update_event):
+        if update_event.update not in UPDATE_BUTTONS:
+            return
+        button_type, text_en, text_kr = UPDATE_BUTTONS[update_event.update]
+        # Widgets are only touched here, in the GUI thread, never by the
+        # updater threads emitting the events
+        if update_event.event_type == UPDATE_STARTED:
+            self.__get_update_list_form(update_event.update).ui.close_button.setEnabled(False)
+        elif update_event.event_type == UPDATE_PROGRESS:
+            text = text_en if self.ui.is_english else text_kr
+            self.buttons[button_type].setText(f"{text} ({int(update_event.progress)}%)")
+        elif update_event.event_type == UPDATE_DONE:
+            for q_button in self.buttons[:5]:
+                q_button.setStyleSheet(f"border-image: url({self.active_path}); font-size: 16px; color: black;")
+                q_button.setEnabled(True)
+            button_texts = BUTTON_TEXTS_EN if self.ui.is_english else BUTTON_TEXTS_KR
+            self.buttons[button_type].setText(button_texts[button_type])
+            self.__get_update_list_form(update_event.update).ui.close_button.setEnabled(True)
+
+    def __get_update_list_form(self, update):
+        if update in (NETWORK_ESP32, NETWORK_ESP32_INTERPRETER):
+            return self.esp32_update_list_form
+        return self.stm32_update_list_form
+
     def __click_motion(self, button_type, start_time):
         # Busy wait for 0.2 seconds
         while time.time() - start_time < 0.2:
@@ -0,0 +1,39 @@
+import json
+import os
+import threading as th
+from io import open
+from os import path
+
+
+def get_tmp_path(dest_path: str) -> str:
+    """Path next to dest_path to build its new contents in, one per thread"""
+    return f"{dest_path}.{os.getpid()}.{th.get_ident()}.tmp"
+
+
+def write_atomic(dest_path: str, data, mode: str = "w") -> None:
+    """Replace dest_path with data in one step, readers never see a partial
+    file
+
+    :param str dest_path: Path of the file to be replaced
+    :param data: Text or, in mode "wb", bytes
+    :param str mode: Mode the new contents are written in
+    """
+    os.makedirs(path.dirname(dest_path) or ".", exist_ok=True)
+    tmp_path = get_tmp_path(dest_path)
+    with open(tmp_path, mode) as dest_file:
+        dest_file.write(data)
+    os.replace(tmp_path, dest_path)
+
+
+def write_json(json_path: str, data) -> bool:
+    """Replace json_path with data in one step, False if it can not be
+    written, e.g. in a read-only directory
+
+    Caches, ledgers and journals are only worth their speed-up, so a
+    failed write is not raised.
+    """
+    try:
+        write_atomic(json_path, json.dumps(data, separators=(",", ":")))
+    except OSError:
+        return False
+    return True
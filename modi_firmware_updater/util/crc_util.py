@@ -0,0 +1,43 @@
+CRC32_POLYNOMIAL = 0x4C11DB7
+
+
+def __make_crc32_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 24
+        for _ in range(8):
+            if crc & (1 << 31) != 0:
+                crc = (crc << 1) ^ CRC32_POLYNOMIAL
+            else:
+                crc <<= 1
+            crc &= 0xFFFFFFFF
+        table.append(crc)
+    return tuple(table)
+
+
+CRC32_TABLE = __make_crc32_table()
+
+
+def calc_crc32(data: bytes, crc: int) -> int:
+    """Calculate STM32 hardware CRC over a single 32-bit word
+
+    The word is XORed into the running CRC and shifted out MSB first, one
+    byte at a time using a lookup table.
+    """
+    crc ^= int.from_bytes(data, byteorder="little", signed=False)
+    for _ in range(4):
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ CRC32_TABLE[crc >> 24]
+    return crc
+
+
+def calc_crc64(data: bytes, crc: int) -> int:
+    crc = calc_crc32(data[:4], crc)
+    crc = calc_crc32(data[4:], crc)
+    return crc
+
+
+def calc_page_crc(page: bytes, crc: int = 0) -> int:
+    """Calculate checksum of a page as it is streamed in 8-byte frames"""
+    for curr_ptr in range(0, len(page), 8):
+        crc = calc_crc64(page[curr_ptr:curr_ptr + 8], crc)
+    return crc
@@ -0,0 +1,241 @@
+import json
+import mmap
+import os
+import struct
+import threading as th
+from base64 import b64encode
+from io import open
+from os import path
+
+from modi_firmware_updater.util.firmware_cache import get_version_word
+from modi_firmware_updater.util.firmware_image import (
+    FirmwareImage, get_composed_firmware_image, get_firmware_image)
+from modi_firmware_updater.util.firmware_manifest import (
+    ESP32, FIRMWARE_CHANNELS, MODULE, NETWORK, get_firmware_manifest)
+
+BUNDLE_MAGIC = b"MODIFWB\x00"
+BUNDLE_FORMAT = 2
+
+""" Bundle starts with its magic, format and the size of its index. The JSON
+    index follows, then every blob aligned to BLOB_ALIGN bytes. Offsets in
+    the index are relative to the first blob.
+"""
+BUNDLE_HEADER = struct.Struct("<8sII")
+BLOB_ALIGN = 8
+
+# Base64 text of 8 bytes of firmware data
+ENCODED_DATA_SIZE = 12
+
+
+def align_blob_offset(offset):
+    return (offset + BLOB_ALIGN - 1) // BLOB_ALIGN * BLOB_ALIGN
+
+
+def build_firmware_bundle(bundle_path: str, firmware_manifest=None) -> dict:
+    """Pack every firmware binary of firmware_manifest into one bundle file
+
+    STM32 images are packed with their page tables, page CRCs and the base64
+    text of every data frame, ESP32 binaries are packed already laid out at
+    their flash addresses, so updaters flash a bundle without deriving
+    anything from it.
+
+    :param bundle_path: Path of the bundle to be written
+    :param firmware_manifest: Manifest of the binaries, the local one if None
+    :return: Index of the bundle
+    """
+    if firmware_manifest is None:
+        firmware_manifest = get_firmware_manifest()
+
+    blobs = []
+    blobs_size = 0
+
+    def add_blob(data):
+        nonlocal blobs_size
+        blob = {"offset": blobs_size, "size": len(data)}
+        blobs.append((blobs_size, data))
+        blobs_size = align_blob_offset(blobs_size + len(data))
+        return blob
+
+    channels = dict()
+    for channel in (MODULE, NETWORK):
+        bin_begin = FIRMWARE_CHANNELS[channel]["bin_begin"]
+        page_size = FIRMWARE_CHANNELS[channel]["page_size"]
+        version_info = firmware_manifest.get_version_info(channel)
+        files = dict()
+        for file in firmware_manifest.get_files(channel):
+            if file["sha256"] is None:
+                continue
+            image = get_firmware_image(file["path"], bin_begin, page_size, version_info)
+            frames = b"".join(
+                b64encode(image.read(page_begin + curr_ptr, 8))
+                for page_begin, _ in image.page_table
+                for curr_ptr in range(0, page_size, 8)
+            )
+            files[file["name"]] = {
+                "address": file["offset"],
+                "sha256": image.sha256,
+                "bin_begin": bin_begin,
+                "bin_end": image.bin_end,
+                "page_size": page_size,
+                "pages": [list(page) for page in image.page_table],
+                "erased_pages": sorted(image.erased_pages),
+                "data": add_blob(image.read(0, image.size)),
+                "frames": add_blob(frames),
+            }
+        channels[channel] = {"version_info": version_info, "files": files}
+
+    esp32_files = [
+        file for file in firmware_manifest.get_files(ESP32) if file["sha256"]
+    ]
+    channels[ESP32] = {
+        "version_info": firmware_manifest.get_version_info(ESP32),
+        "files": {
+            file["name"]: {"address": file["offset"], "sha256": file["sha256"]}
+            for file in esp32_files
+        },
+    }
+    if esp32_files:
+        composed_image = get_composed_firmware_image(
+            [(file["offset"], file["path"]) for file in esp32_files]
+        )
+        channels[ESP32]["image"] = add_blob(composed_image.read(0, len(composed_image)))
+        channels[ESP32]["image"]["address"] = composed_image.base_address
+
+    index = {"format": BUNDLE_FORMAT, "channels": channels}
+    index_data = json.dumps(index, separators=(",", ":")).encode("utf8")
+    blobs_begin = align_blob_offset(BUNDLE_HEADER.size + len(index_data))
+
+    os.makedirs(path.dirname(path.abspath(bundle_path)), exist_ok=True)
+    tmp_path = f"{bundle_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as bundle_file:
+        bundle_file.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_FORMAT, len(index_data)))
+        bundle_file.write(index_data)
+        for offset, data in blobs:
+            bundle_file.seek(blobs_begin + offset)
+            bundle_file.write(data)
+        bundle_file.truncate(blobs_begin + blobs_size)
+    os.replace(tmp_path, bundle_path)
+    return index
+
+
+class BundledFirmwareImage(FirmwareImage):
+    """Firmware image read from a memory-mapped bundle
+
+    Behaves as a FirmwareImage, its page plan and encoded data frames are
+    read from the bundle instead of being derived from the binary.
+    """
+
+    def __init__(self, bundle, entry: dict, version_info: str = None):
+        self.bin_path = bundle.bundle_path
+        self.bin_begin = entry.get("bin_begin", 0)
+        self.page_size = entry.get("page_size")
+        self.version_info = version_info
+        self.version = get_version_word(version_info) if version_info else None
+        self.signature = bundle.signature
+
+        # Composed ESP32 image has no separate data blob
+        blob = entry["data"] if "data" in entry else entry
+        self.buffer = bundle.buffer
+        self.__data_begin = bundle.blobs_begin + blob["offset"]
+        self.size = blob["size"]
+
+        self.page_table = []
+        self._page_crcs = dict()
+        self.empty_pages = bytearray()
+        self.erased_pages = frozenset()
+        self.__frame_index = dict()
+        if self.page_size is None:
+            self.sha256 = entry.get("sha256")
+            self.bin_end = self.size
+            return
+
+        self._set_page_plan(entry)
+        self.__frames_begin = bundle.blobs_begin + entry["frames"]["offset"]
+        self.__frame_index = {
+            page_begin: index for index, (page_begin, _) in enumerate(self.page_table)
+        }
+
+    def page(self, page_begin: int) -> bytes:
+        return self.read(page_begin, self.page_size)
+
+    def read(self, offset: int, size: int) -> bytes:
+        size = max(0, min(size, self.size - offset))
+        begin = self.__data_begin + offset
+        return self.buffer[begin:begin + size]
+
+    def get_encoded_data(self, offset: int) -> str:
+        page_offset = (offset - self.bin_begin) % self.page_size
+        page_index = self.__frame_index.get(offset - page_offset)
+        if page_index is None:
+            return b64encode(self.read(offset, 8)).decode("utf-8")
+        frame_index = page_index * (self.page_size // 8) + page_offset // 8
+        begin = self.__frames_begin + frame_index * ENCODED_DATA_SIZE
+        return self.buffer[begin:begin + ENCODED_DATA_SIZE].decode("utf-8")
+
+    def close(self) -> None:
+        # Buffer belongs to the bundle
+        pass
+
+
+class FirmwareBundle:
+    """Offline firmware bundle, memory-mapped and ready to be flashed
+
+    :param str bundle_path: Path of a bundle written by build_firmware_bundle
+    """
+
+    def __init__(self, bundle_path: str):
+        self.bundle_path = path.abspath(bundle_path)
+        with open(self.bundle_path, "rb") as bundle_file:
+            stat = os.fstat(bundle_file.fileno())
+            self.signature = (stat.st_mtime_ns, stat.st_size)
+            if stat.st_size < BUNDLE_HEADER.size:
+                raise ValueError(f"{bundle_path} is not a firmware bundle")
+            self.buffer = mmap.mmap(bundle_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, bundle_format, index_size = BUNDLE_HEADER.unpack_from(self.buffer)
+        if magic != BUNDLE_MAGIC or bundle_format != BUNDLE_FORMAT:
+            self.buffer.close()
+            raise ValueError(f"{bundle_path} is not a firmware bundle")
+        index_end = BUNDLE_HEADER.size + index_size
+        self.index = json.loads(self.buffer[BUNDLE_HEADER.size:index_end])
+        self.blobs_begin = align_blob_offset(index_end)
+        self.__images = dict()
+        self.__lock = th.Lock()
+
+    def get_version_info(self, channel: str) -> str:
+        return self.index["channels"][channel]["version_info"]
+
+    def get_version(self, channel: str) -> int:
+        version_info = self.get_version_info(channel)
+        return get_version_word(version_info) if version_info else None
+
+    def get_file_names(self, channel: str) -> list:
+        return list(self.index["channels"][channel]["files"])
+
+    def get_image(self, channel: str, file_name: str) -> BundledFirmwareImage:
+        """Get the image of an STM32 binary in the bundle"""
+        with self.__lock:
+            image = self.__images.get((channel, file_name))
+            if image is None:
+                entry = self.index["channels"][channel]["files"].get(file_name)
+                if entry is None:
+                    raise KeyError(f"{file_name} of {channel} is not in {self.bundle_path}")
+                image = BundledFirmwareImage(self, entry, self.get_version_info(channel))
+                self.__images[(channel, file_name)] = image
+            return image
+
+    def get_composed_image(self) -> BundledFirmwareImage:
+        """Get the ESP32 binaries laid out at their flash addresses"""
+        with self.__lock:
+            image = self.__images.get(ESP32)
+            if image is None:
+                entry = self.index["channels"][ESP32].get("image")
+                if entry is None:
+                    raise KeyError(f"ESP32 firmware is not in {self.bundle_path}")
+                image = BundledFirmwareImage(self, entry, self.get_version_info(ESP32))
+                image.base_address = entry["address"]
+                self.__images[ESP32] = image
+            return image
+
+    def close(self) -> None:
+        self.buffer.close()
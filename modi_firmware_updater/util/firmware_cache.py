@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import threading as th
+from io import open
+from os import path
+
+from modi_firmware_updater.util.atomic_json import write_json
+from modi_firmware_updater.util.crc_util import calc_page_crc
+from modi_firmware_updater.util.shared_instance import shared_instance
+
+CACHE_FORMAT = 2
+
+
+def get_default_cache_dir() -> str:
+    return path.join(path.expanduser("~"), ".modi_firmware_updater", "cache")
+
+
+def get_version_word(version_info: str) -> int:
+    """ Version number is formed by concatenating all three version bits
+        e.g. 2.2.4 -> 010 00010 00000100 -> 0100 0010 0000 0100
+    """
+    version_digits = [int(digit) for digit in version_info.lstrip("v").split(".")]
+    return (
+        version_digits[0] << 13
+        | version_digits[1] << 8
+        | version_digits[2]
+    )
+
+
+class FirmwareCache:
+    """Persistent store of page plans derived from firmware binaries
+
+    Each entry is keyed by the SHA-256 of the binary and the page layout used
+    to split it, so a replaced binary never hits a stale entry. The index maps
+    every source path to the key it was last derived into and old entries are
+    dropped as soon as the binary at that path changes.
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, cache_dir: str = None):
+        self.cache_dir = cache_dir if cache_dir else get_default_cache_dir()
+        self.__lock = th.Lock()
+        self.__entries = dict()
+        self.__sources = dict()
+
+    def get_page_plan(
+        self, bin_path: str, bin_begin: int, page_size: int,
+        version_info: str = None, bin_buffer: bytes = None,
+    ) -> dict:
+        """Get data pages with their CRCs, erased pages and the version word
+
+        Pages of 0x00 are left out of the plan, pages of 0xFF only have to be
+        erased since that is the erased state of STM32 flash.
+
+        :param bin_path: Path of the firmware binary
+        :param bin_begin: Offset of the first page to be flashed
+        :param page_size: Size of a flash page
+        :param version_info: Version text to be packed into the version word
+        :param bin_buffer: Contents of bin_path if it is already loaded
+        """
+        if bin_buffer is None:
+            with open(bin_path, "rb") as bin_file:
+                bin_buffer = bin_file.read()
+        bin_hash = hashlib.sha256(bin_buffer).hexdigest()
+        key = f"{bin_hash}-{bin_begin:x}-{page_size:x}"
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                entry = self.__load_entry(key)
+            if entry is None:
+                entry = self.__make_entry(bin_buffer, bin_hash, bin_begin, page_size)
+                self.__store_entry(key, entry)
+
+            if version_info is not None and entry["version_info"] != version_info:
+                entry["version_info"] = version_info
+                entry["version"] = get_version_word(version_info)
+                self.__store_entry(key, entry)
+
+            self.__entries[key] = entry
+            source_path = path.abspath(bin_path)
+            if self.__sources.get(source_path) != key:
+                self.__update_index(source_path, key)
+                self.__sources[source_path] = key
+        return entry
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries = dict()
+            self.__sources = dict()
+            if not path.isdir(self.cache_dir):
+                return
+            for file_name in os.listdir(self.cache_dir):
+                if file_name.endswith(".json"):
+                    os.remove(path.join(self.cache_dir, file_name))
+
+    @staticmethod
+    def __make_entry(bin_buffer, bin_hash, bin_begin, page_size):
+        bin_size = len(bin_buffer)
+        bin_end = bin_size - ((bin_size - bin_begin) % page_size)
+
+        pages = []
+        erased_pages = []
+        empty_page = bytes(page_size)
+        erased_page = b"\xFF" * page_size
+        for page_begin in range(bin_begin, bin_end, page_size):
+            curr_page = bin_buffer[page_begin:page_begin + page_size]
+            # Skip current page if empty
+            if curr_page == empty_page:
+                continue
+            if curr_page == erased_page:
+                erased_pages.append(page_begin)
+                continue
+            pages.append([page_begin, calc_page_crc(curr_page)])
+
+        return {
+            "format": CACHE_FORMAT,
+            "sha256": bin_hash,
+            "bin_size": bin_size,
+            "bin_begin": bin_begin,
+            "bin_end": bin_end,
+            "page_size": page_size,
+            "pages": pages,
+            "erased_pages": erased_pages,
+            "version_info": None,
+            "version": None,
+        }
+
+    def __entry_path(self, key):
+        return path.join(self.cache_dir, key + ".json")
+
+    def __load_entry(self, key):
+        try:
+            with open(self.__entry_path(key)) as entry_file:
+                entry = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+        if entry.get("format") != CACHE_FORMAT:
+            return None
+        return entry
+
+    def __store_entry(self, key, entry):
+        write_json(self.__entry_path(key), entry)
+
+    def __update_index(self, source_path, key):
+        index_path = path.join(self.cache_dir, self.INDEX_FILE)
+        try:
+            with open(index_path) as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            index = dict()
+
+        prev_key = index.get(source_path)
+        if prev_key == key:
+            return
+        index[source_path] = key
+        write_json(index_path, index)
+
+        # Binary at source_path has changed, drop what was derived from it
+        if prev_key and prev_key not in index.values():
+            self.__entries.pop(prev_key, None)
+            try:
+                os.remove(self.__entry_path(prev_key))
+            except OSError:
+                pass
+
+
+@shared_instance
+def get_firmware_cache() -> FirmwareCache:
+    return FirmwareCache()
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import re
+import urllib.request as ur
+import zipfile
+from http.client import HTTPException
+from io import open
+from os import path
+from urllib.error import HTTPError, URLError
+
+CHUNK_SIZE = 64 * 1024
+
+
+def get_default_download_path() -> str:
+    return path.join(path.expanduser("~"), ".modi_firmware_updater", "downloads")
+
+
+class DownloadError(Exception):
+    pass
+
+
+def download_file(
+    url: str, dest_path: str, sha256: str = None, timeout: float = 5,
+    retries: int = 3, chunk_size: int = CHUNK_SIZE,
+) -> str:
+    """Stream url to dest_path, resuming where a previous attempt stopped
+
+    Data is written to dest_path.part and only moved to dest_path once it is
+    complete. A dropped connection is resumed with an HTTP Range request
+    guarded by If-Range, so a changed file on the server restarts the
+    download instead of corrupting it. Returns the SHA-256 of the file,
+    raises DownloadError when it does not match sha256.
+
+    :param url: URL of the file
+    :param dest_path: Path the complete file is written to
+    :param sha256: Expected SHA-256 of the file, not verified if None
+    :param timeout: Timeout of every request in seconds
+    :param retries: Number of times a dropped connection is resumed
+    :param chunk_size: Size of the blocks read from the connection
+    """
+    part_path = f"{dest_path}.part"
+    meta_path = f"{dest_path}.part.json"
+    os.makedirs(path.dirname(path.abspath(dest_path)), exist_ok=True)
+
+    for attempt in range(retries + 1):
+        validator = __read_validator(meta_path)
+        offset = path.getsize(part_path) if path.exists(part_path) else 0
+        request = ur.Request(url)
+        if offset and validator:
+            request.add_header("Range", f"bytes={offset}-")
+            request.add_header("If-Range", validator)
+
+        try:
+            with ur.urlopen(request, timeout=timeout) as conn:
+                if conn.status != 206:
+                    # Server sent the whole file, start over
+                    offset = 0
+                total_size = __get_total_size(conn, offset)
+                validator = conn.headers.get("ETag") or conn.headers.get("Last-Modified")
+                with open(meta_path, "w") as meta_file:
+                    json.dump({"url": url, "validator": validator}, meta_file)
+
+                with open(part_path, "r+b" if offset else "wb") as part_file:
+                    part_file.seek(offset)
+                    part_file.truncate()
+                    while True:
+                        chunk = conn.read(chunk_size)
+                        if not chunk:
+                            break
+                        part_file.write(chunk)
+        except HTTPError as err:
+            if err.code == 416:
+                # Range is not satisfiable, the part file is stale
+                __remove(part_path, meta_path)
+            elif attempt == retries:
+                raise DownloadError(f"Failed to download {url}: {err}")
+            continue
+        except (URLError, HTTPException, OSError) as err:
+            if attempt == retries:
+                raise DownloadError(f"Failed to download {url}: {err}")
+            continue
+
+        if total_size is not None and path.getsize(part_path) < total_size:
+            # Connection closed early, resume on the next attempt
+            continue
+        break
+    else:
+        raise DownloadError(f"Failed to download {url}: connection dropped")
+
+    file_sha256 = get_file_sha256(part_path)
+    if sha256 and file_sha256 != sha256:
+        __remove(part_path, meta_path)
+        raise DownloadError(f"Failed to download {url}: SHA-256 mismatch")
+    os.replace(part_path, dest_path)
+    __remove(meta_path)
+    return file_sha256
+
+
+def fetch_sha256(url: str, timeout: float = 5) -> str:
+    """Get the SHA-256 published for the file at url, None if there is none
+
+    The digest is read from url.sha256 in the format of sha256sum, so an
+    archive is verified against its release before it is extracted. None
+    is only returned when the release publishes no digest (404), which
+    leaves the archive unverified and is up to the caller to report. A
+    digest which is published but can not be fetched or read raises
+    DownloadError.
+    """
+    sha256_url = f"{url}.sha256"
+    try:
+        with ur.urlopen(sha256_url, timeout=timeout) as conn:
+            sha256_text = conn.read().decode("utf8", "replace")
+    except HTTPError as err:
+        if err.code == 404:
+            return None
+        raise DownloadError(f"Failed to download {sha256_url}: {err}")
+    except (URLError, HTTPException, OSError) as err:
+        raise DownloadError(f"Failed to download {sha256_url}: {err}")
+
+    fields = sha256_text.split()
+    if not fields or not re.fullmatch(r"[0-9a-fA-F]{64}", fields[0]):
+        raise DownloadError(f"Invalid SHA-256 published at {sha256_url}")
+    return fields[0].lower()
+
+
+def get_file_sha256(file_path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as src_file:
+        for chunk in iter(lambda: src_file.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def extract_firmware(zip_path: str, members: dict, firmware_store) -> dict:
+    """Copy members of the archive at zip_path into firmware_store
+
+    Members are decompressed one block at a time and checked against the
+    CRC of the archive while they are read, so memory use does not depend
+    on the size of the archive.
+
+    :param members: Maps each member of the archive to a firmware file name
+    :return: Firmware file names mapped to the SHA-256 of their objects
+    """
+    firmware_files = dict()
+    try:
+        with zipfile.ZipFile(zip_path, "r") as zip_content:
+            for member, file_name in members.items():
+                with zip_content.open(member, "r") as member_file:
+                    firmware_files[file_name] = firmware_store.add_stream(member_file)
+    except (zipfile.BadZipFile, KeyError) as err:
+        raise DownloadError(f"Invalid firmware archive {zip_path}: {err}")
+    return firmware_files
+
+
+def __get_total_size(conn, offset):
+    content_range = conn.headers.get("Content-Range")
+    if content_range:
+        match = re.match(r"bytes \d+-\d+/(\d+)", content_range)
+        if match:
+            return int(match.group(1))
+    content_length = conn.headers.get("Content-Length")
+    if content_length is None:
+        return None
+    return offset + int(content_length)
+
+
+def __read_validator(meta_path):
+    try:
+        with open(meta_path) as meta_file:
+            return json.load(meta_file).get("validator")
+    except (OSError, ValueError):
+        return None
+
+
+def __remove(*file_paths):
+    for file_path in file_paths:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
@@ -0,0 +1,189 @@
+import hashlib
+import mmap
+import os
+import threading as th
+from base64 import b64encode
+from io import open
+from os import path
+
+from modi_firmware_updater.util.firmware_cache import (get_firmware_cache,
+                                                       get_version_word)
+
+
+class FirmwareImage:
+    """Read-only, memory-mapped view of a firmware binary
+
+    :param str bin_path: Path of the firmware binary
+    :param int bin_begin: Offset of the first page to be flashed
+    :param int page_size: Size of a flash page, None if it is not paged
+    :param str version_info: Version text of the binary, e.g. "1.2.2"
+    """
+
+    def __init__(
+        self, bin_path: str, bin_begin: int = 0, page_size: int = None,
+        version_info: str = None,
+    ):
+        self.bin_path = path.abspath(bin_path)
+        self.bin_begin = bin_begin
+        self.page_size = page_size
+        self.version_info = version_info
+        self.version = get_version_word(version_info) if version_info else None
+
+        with open(self.bin_path, "rb") as bin_file:
+            stat = os.fstat(bin_file.fileno())
+            self.signature = (stat.st_mtime_ns, stat.st_size)
+            if stat.st_size:
+                self.buffer = mmap.mmap(bin_file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.buffer = b""
+
+        # Real length of the image, not the size of a bytes object holding it
+        self.size = len(self.buffer)
+
+        self.page_table = []
+        self._page_crcs = dict()
+        self.empty_pages = bytearray()
+        self.erased_pages = frozenset()
+        if page_size is None:
+            self.sha256 = hashlib.sha256(self.buffer).hexdigest()
+            self.bin_end = self.size
+            return
+
+        page_plan = get_firmware_cache().get_page_plan(
+            self.bin_path, bin_begin, page_size, version_info, self.buffer
+        )
+        self._set_page_plan(page_plan)
+
+    def _set_page_plan(self, page_plan):
+        self.sha256 = page_plan["sha256"]
+        self.bin_end = page_plan["bin_end"]
+        # Page table holds (page_begin, crc) of every page to be flashed
+        self.page_table = [tuple(page) for page in page_plan["pages"]]
+        self._page_crcs = dict(self.page_table)
+        # Pages of 0xFF only have to be erased
+        self.erased_pages = frozenset(page_plan.get("erased_pages", ()))
+
+        page_count = max(0, (self.bin_end - self.bin_begin) // self.page_size)
+        self.empty_pages = bytearray((page_count + 7) // 8)
+        for page_index in range(page_count):
+            page_begin = self.bin_begin + page_index * self.page_size
+            if page_begin not in self._page_crcs and page_begin not in self.erased_pages:
+                self.empty_pages[page_index >> 3] |= 1 << (page_index & 7)
+
+    def __len__(self):
+        return self.size
+
+    def is_empty_page(self, page_begin: int) -> bool:
+        page_index = (page_begin - self.bin_begin) // self.page_size
+        return bool(self.empty_pages[page_index >> 3] & (1 << (page_index & 7)))
+
+    def is_erased_page(self, page_begin: int) -> bool:
+        return page_begin in self.erased_pages
+
+    def get_plan_summary(self) -> dict:
+        """Count pages of each kind and what skipping them saves
+
+        A data page costs an erase and a CRC round trip and one data frame
+        per 8 bytes, an erased page costs only its erase round trip and an
+        empty page costs nothing.
+        """
+        page_count = max(0, (self.bin_end - self.bin_begin) // self.page_size)
+        erased_count = len(self.erased_pages)
+        empty_count = page_count - len(self.page_table) - erased_count
+        frames_per_page = self.page_size // 8
+        return {
+            "pages": page_count,
+            "data_pages": len(self.page_table),
+            "erased_pages": erased_count,
+            "empty_pages": empty_count,
+            "frames_saved": (erased_count + empty_count) * frames_per_page,
+            "round_trips_saved": erased_count + 2 * empty_count,
+        }
+
+    def get_page_crc(self, page_begin: int) -> int:
+        return self._page_crcs.get(page_begin)
+
+    def page(self, page_begin: int) -> bytes:
+        return self.buffer[page_begin:page_begin + self.page_size]
+
+    def read(self, offset: int, size: int) -> bytes:
+        return self.buffer[offset:offset + size]
+
+    def get_encoded_data(self, offset: int) -> str:
+        """Get base64 text of the 8 bytes at offset as sent in a data frame"""
+        return b64encode(self.buffer[offset:offset + 8]).decode("utf-8")
+
+    def close(self) -> None:
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+
+class ComposedFirmwareImage:
+    """Firmware images laid out at their flash addresses, gaps read as 0xFF
+
+    :param list segments: (address, FirmwareImage) pairs sorted by address
+    """
+
+    def __init__(self, segments, fill: int = 0xFF):
+        self.segments = list(segments)
+        self.fill = fill
+        self.base_address = self.segments[0][0]
+        last_address, last_image = self.segments[-1]
+        self.size = last_address - self.base_address + len(last_image)
+
+    def __len__(self):
+        return self.size
+
+    def read(self, offset: int, size: int) -> bytes:
+        size = max(0, min(size, self.size - offset))
+        data = bytearray([self.fill]) * size
+        for address, image in self.segments:
+            seg_begin = address - self.base_address
+            seg_end = seg_begin + len(image)
+            begin, end = max(offset, seg_begin), min(offset + size, seg_end)
+            if begin < end:
+                data[begin - offset:end - offset] = image.read(begin - seg_begin, end - begin)
+        return bytes(data)
+
+
+_firmware_images = dict()
+_firmware_images_lock = th.Lock()
+
+
+def get_firmware_image(
+    bin_path: str, bin_begin: int = 0, page_size: int = None,
+    version_info: str = None,
+) -> FirmwareImage:
+    """Get the process-wide image of bin_path, loading it only once
+
+    The image is reloaded when the binary on disk has been replaced.
+    """
+    bin_path = path.abspath(bin_path)
+    key = (bin_path, bin_begin, page_size)
+    stat = os.stat(bin_path)
+    with _firmware_images_lock:
+        image = _firmware_images.get(key)
+        if image is None or image.signature != (stat.st_mtime_ns, stat.st_size):
+            image = FirmwareImage(bin_path, bin_begin, page_size, version_info)
+            _firmware_images[key] = image
+        elif version_info and image.version_info != version_info:
+            image.version_info = version_info
+            image.version = get_version_word(version_info)
+        return image
+
+
+def get_composed_firmware_image(segment_paths, fill: int = 0xFF) -> ComposedFirmwareImage:
+    """Get the process-wide composition of (address, bin_path) pairs"""
+    segments = [
+        (address, get_firmware_image(bin_path))
+        for address, bin_path in segment_paths
+    ]
+    key = tuple(
+        (address, image.bin_path, image.signature) for address, image in segments
+    )
+    with _firmware_images_lock:
+        image = _firmware_images.get(key)
+        if image is None:
+            image = ComposedFirmwareImage(segments, fill)
+            _firmware_images[key] = image
+        return image
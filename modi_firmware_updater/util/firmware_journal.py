@@ -0,0 +1,79 @@
+import json
+import os
+import threading as th
+from io import open
+from os import path
+
+from modi_firmware_updater.util.atomic_json import write_json
+from modi_firmware_updater.util.shared_instance import shared_instance
+
+JOURNAL_FORMAT = 1
+
+
+def get_default_journal_dir() -> str:
+    return path.join(path.expanduser("~"), ".modi_firmware_updater", "journal")
+
+
+class FirmwareJournal:
+    """Checkpoints of module updates in progress, keyed by module uuid
+
+    Pages are flashed in order, so the last page confirmed by its ack is
+    enough to tell where an interrupted update of the same image resumes.
+    An entry is removed as soon as the update it belongs to is done.
+    """
+
+    def __init__(self, journal_dir: str = None):
+        self.journal_dir = journal_dir if journal_dir else get_default_journal_dir()
+        self.__lock = th.Lock()
+
+    def get_resume_page(self, module_uuid: int, firmware_image) -> int:
+        """Get the first unconfirmed page of firmware_image on the module
+
+        None is returned when there is no interrupted update of this very
+        image, i.e. the update starts at the first page.
+        """
+        with self.__lock:
+            entry = self.__load_entry(module_uuid)
+        if entry is None or entry["sha256"] != firmware_image.sha256:
+            return None
+        if (entry["bin_begin"], entry["page_size"]) != (firmware_image.bin_begin, firmware_image.page_size):
+            return None
+        return entry["confirmed_page"] + firmware_image.page_size
+
+    def confirm_page(self, module_uuid: int, firmware_image, page_begin: int) -> None:
+        """Record page_begin and every page before it as written"""
+        entry = {
+            "format": JOURNAL_FORMAT,
+            "uuid": module_uuid,
+            "sha256": firmware_image.sha256,
+            "bin_begin": firmware_image.bin_begin,
+            "page_size": firmware_image.page_size,
+            "confirmed_page": page_begin,
+        }
+        with self.__lock:
+            write_json(self.__entry_path(module_uuid), entry)
+
+    def finish(self, module_uuid: int) -> None:
+        with self.__lock:
+            try:
+                os.remove(self.__entry_path(module_uuid))
+            except OSError:
+                pass
+
+    def __entry_path(self, module_uuid):
+        return path.join(self.journal_dir, f"{module_uuid:012x}.json")
+
+    def __load_entry(self, module_uuid):
+        try:
+            with open(self.__entry_path(module_uuid)) as entry_file:
+                entry = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+        if entry.get("format") != JOURNAL_FORMAT:
+            return None
+        return entry
+
+
+@shared_instance
+def get_firmware_journal() -> FirmwareJournal:
+    return FirmwareJournal()
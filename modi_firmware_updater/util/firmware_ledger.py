@@ -0,0 +1,98 @@
+import json
+import os
+import threading as th
+from io import open
+from os import path
+
+from modi_firmware_updater.util.atomic_json import write_json
+from modi_firmware_updater.util.shared_instance import shared_instance
+
+LEDGER_FORMAT = 1
+
+
+def get_default_ledger_dir() -> str:
+    return path.join(path.expanduser("~"), ".modi_firmware_updater", "ledger")
+
+
+class FirmwareLedger:
+    """Pages last written to each module, keyed by module uuid
+
+    An entry holds the version, the CRC of every data page and the erased
+    pages of the last image successfully written to a module. As long as the
+    module still reports that version, only pages that differ in a new image
+    have to be flashed.
+    """
+
+    def __init__(self, ledger_dir: str = None):
+        self.ledger_dir = ledger_dir if ledger_dir else get_default_ledger_dir()
+        self.__lock = th.Lock()
+
+    def get_entry(self, module_uuid: int) -> dict:
+        with self.__lock:
+            return self.__load_entry(module_uuid)
+
+    def get_changed_pages(
+        self, module_uuid: int, module_version: int, firmware_image
+    ) -> set:
+        """Get pages of firmware_image which differ from what the module holds
+
+        None is returned when the module has to be flashed in full, i.e. it
+        is not in the ledger, reports another version or uses another layout.
+        """
+        entry = self.get_entry(module_uuid)
+        if entry is None or entry["version"] != module_version:
+            return None
+        if (entry["bin_begin"], entry["page_size"]) != (firmware_image.bin_begin, firmware_image.page_size):
+            return None
+
+        page_crcs = {page_begin: crc for page_begin, crc in entry["pages"]}
+        erased_pages = set(entry["erased_pages"])
+        changed_pages = set()
+        for page_begin, crc in firmware_image.page_table:
+            if page_crcs.get(page_begin) != crc:
+                changed_pages.add(page_begin)
+        for page_begin in firmware_image.erased_pages:
+            if page_begin not in erased_pages:
+                changed_pages.add(page_begin)
+        return changed_pages
+
+    def record(self, module_uuid: int, firmware_image) -> None:
+        """Record firmware_image as successfully written to the module"""
+        entry = {
+            "format": LEDGER_FORMAT,
+            "uuid": module_uuid,
+            "version": firmware_image.version,
+            "sha256": firmware_image.sha256,
+            "bin_begin": firmware_image.bin_begin,
+            "page_size": firmware_image.page_size,
+            "pages": [list(page) for page in firmware_image.page_table],
+            "erased_pages": sorted(firmware_image.erased_pages),
+        }
+        with self.__lock:
+            write_json(self.__entry_path(module_uuid), entry)
+
+    def forget(self, module_uuid: int) -> None:
+        """Drop the entry of a module whose flash contents are unknown"""
+        with self.__lock:
+            try:
+                os.remove(self.__entry_path(module_uuid))
+            except OSError:
+                pass
+
+    def __entry_path(self, module_uuid):
+        return path.join(self.ledger_dir, f"{module_uuid:012x}.json")
+
+    def __load_entry(self, module_uuid):
+        try:
+            with open(self.__entry_path(module_uuid)) as entry_file:
+                entry = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+        if entry.get("format") != LEDGER_FORMAT:
+            return None
+        return entry
+
+
+@shared_instance
+def get_firmware_ledger() -> FirmwareLedger:
+    return FirmwareLedger()
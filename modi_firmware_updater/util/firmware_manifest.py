@@ -0,0 +1,174 @@
+import hashlib
+from io import open
+from os import path
+
+from modi_firmware_updater.util.firmware_cache import get_version_word
+from modi_firmware_updater.util.firmware_store import get_firmware_store
+from modi_firmware_updater.util.shared_instance import shared_instance
+
+MODULE = "module"
+NETWORK = "network"
+ESP32 = "esp32"
+
+FLASH_MEMORY_ADDR = 0x08000000
+
+MODULE_TYPES = (
+    "button", "dial", "display", "env", "gyro", "ir",
+    "led", "mic", "motor", "speaker", "ultrasonic",
+)
+
+""" Every channel is described by the directory holding its binaries, its
+    version file and the binaries with the flash address they are written to.
+    Paged channels also have the offset of their first page and page size.
+"""
+FIRMWARE_CHANNELS = {
+    MODULE: {
+        "directory": "stm32",
+        "version_file": "version.txt",
+        "bin_begin": 0x9000,
+        "page_size": 0x800,
+        "files": [
+            (f"{module_type}.bin", FLASH_MEMORY_ADDR + 0x9000)
+            for module_type in MODULE_TYPES
+        ],
+    },
+    NETWORK: {
+        "directory": "stm32",
+        "version_file": "base_version.txt",
+        "bin_begin": 0x800,
+        "page_size": 0x800,
+        "files": [("network.bin", FLASH_MEMORY_ADDR + 0x800 + 0x8800)],
+    },
+    ESP32: {
+        "directory": "esp32",
+        "version_file": "esp_version.txt",
+        "files": [
+            ("bootloader.bin", 0x1000),
+            ("partitions.bin", 0x8000),
+            ("ota_data_initial.bin", 0xD000),
+            ("modi_ota_factory.bin", 0x10000),
+            ("esp32.bin", 0xD0000),
+        ],
+    },
+}
+
+
+def get_assets_firmware_path() -> str:
+    return path.join(path.dirname(__file__), "..", "assets", "firmware")
+
+
+def get_latest_firmware_path() -> str:
+    return path.join(get_assets_firmware_path(), "latest")
+
+
+def read_version_info(version_path: str) -> str:
+    with open(version_path) as version_file:
+        return version_file.readline().lstrip("v").rstrip("\n")
+
+
+class FirmwareManifest:
+    """Versions, hashes, sizes and flash offsets of local firmware binaries
+
+    Binaries are read from the active version of the firmware store, then
+    from the latest firmware directory and finally from the ones bundled
+    with the package when no newer firmware has been downloaded.
+    """
+
+    def __init__(self, firmware_path: str = None, firmware_store=None):
+        self.firmware_path = (
+            firmware_path if firmware_path else get_latest_firmware_path()
+        )
+        self.firmware_store = firmware_store
+        self.channels = dict()
+        for channel in FIRMWARE_CHANNELS:
+            self.channels[channel] = self.__load_channel(channel)
+
+    def get_root_path(self, channel: str) -> str:
+        return self.channels[channel]["root_path"]
+
+    def get_version_info(self, channel: str) -> str:
+        return self.channels[channel]["version_info"]
+
+    def get_version(self, channel: str) -> int:
+        return self.channels[channel]["version"]
+
+    def get_file(self, channel: str, file_name: str) -> dict:
+        return self.channels[channel]["files"][file_name]
+
+    def get_bin_path(self, channel: str, file_name: str) -> str:
+        return self.get_file(channel, file_name)["path"]
+
+    def get_files(self, channel: str) -> list:
+        """Get files of channel in the order of their flash offsets"""
+        files = self.channels[channel]["files"].values()
+        return sorted(files, key=lambda file: file["offset"])
+
+    def to_dict(self) -> dict:
+        return {
+            channel: {
+                "version_info": entry["version_info"],
+                "version": entry["version"],
+                "files": {
+                    file_name: {
+                        "sha256": file["sha256"],
+                        "size": file["size"],
+                        "offset": file["offset"],
+                    }
+                    for file_name, file in entry["files"].items()
+                },
+            }
+            for channel, entry in self.channels.items()
+        }
+
+    def __load_channel(self, channel):
+        channel_info = FIRMWARE_CHANNELS[channel]
+        root_paths = [
+            path.join(self.firmware_path, channel_info["directory"]),
+            path.join(get_assets_firmware_path(), channel_info["directory"]),
+        ]
+        if self.firmware_store:
+            active_path = self.firmware_store.get_active_path(channel)
+            if active_path:
+                root_paths.insert(0, active_path)
+        for root_path in root_paths:
+            version_path = path.join(root_path, channel_info["version_file"])
+            if path.exists(version_path):
+                break
+
+        version_info, version = None, None
+        if path.exists(version_path):
+            version_info = read_version_info(version_path)
+            version = get_version_word(version_info)
+
+        files = dict()
+        for file_name, offset in channel_info["files"]:
+            bin_path = path.join(root_path, file_name)
+            sha256, size = None, None
+            if path.exists(bin_path):
+                with open(bin_path, "rb") as bin_file:
+                    bin_buffer = bin_file.read()
+                sha256, size = hashlib.sha256(bin_buffer).hexdigest(), len(bin_buffer)
+            files[file_name] = {
+                "name": file_name,
+                "path": bin_path,
+                "sha256": sha256,
+                "size": size,
+                "offset": offset,
+            }
+
+        return {
+            "root_path": root_path,
+            "version_info": version_info,
+            "version": version,
+            "files": files,
+        }
+
+
+@shared_instance
+def get_firmware_manifest() -> FirmwareManifest:
+    return FirmwareManifest(firmware_store=get_firmware_store())
+
+
+def reload_firmware_manifest() -> FirmwareManifest:
+    """Reload the manifest, e.g. after a new firmware has been activated"""
+    return get_firmware_manifest.set_instance(FirmwareManifest(firmware_store=get_firmware_store()))
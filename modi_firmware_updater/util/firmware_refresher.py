@@ -0,0 +1,137 @@
+import json
+import threading as th
+import time
+import urllib.request as ur
+from concurrent.futures import ThreadPoolExecutor
+from io import open
+from os import path
+from urllib.error import HTTPError, URLError
+
+from modi_firmware_updater.util.atomic_json import write_json
+from modi_firmware_updater.util.firmware_manifest import (
+    get_firmware_manifest, reload_firmware_manifest)
+from modi_firmware_updater.util.firmware_store import get_firmware_store
+
+
+def get_default_state_path() -> str:
+    return path.join(path.expanduser("~"), ".modi_firmware_updater", "refresh.json")
+
+
+class FirmwareRefresher:
+    """Check firmware channels for new versions without blocking the caller
+
+    Every channel is checked concurrently. A version file fetched less than
+    ttl seconds ago is not requested again, older ones are revalidated with
+    ETag / If-Modified-Since so an unchanged version costs a 304 response.
+    A new version is activated from the firmware store when it has been
+    downloaded before, otherwise the channel's download callback is called.
+    """
+
+    UP_TO_DATE = "up-to-date"
+    ACTIVATED = "activated"
+    DOWNLOADED = "downloaded"
+    FAILED = "failed"
+    OFFLINE = "offline"
+
+    def __init__(self, state_path: str = None, ttl: float = 600, timeout: float = 5):
+        self.state_path = state_path if state_path else get_default_state_path()
+        self.ttl = ttl
+        self.timeout = timeout
+        self.channels = dict()
+        self.results = dict()
+        self.thread = None
+        self.__lock = th.Lock()
+
+    def add_channel(self, channel: str, version_url: str, download) -> None:
+        """Register a channel
+
+        :param channel: Channel of the firmware manifest, e.g. "module"
+        :param version_url: URL of the version file of the channel
+        :param download: Callable taking the version text, returns success
+        """
+        self.channels[channel] = (version_url, download)
+
+    def start(self) -> th.Thread:
+        self.thread = th.Thread(target=self.check, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def wait(self, timeout: float = None) -> dict:
+        if self.thread:
+            self.thread.join(timeout)
+        return self.results
+
+    def check(self) -> dict:
+        with ThreadPoolExecutor(max_workers=max(1, len(self.channels))) as executor:
+            futures = {
+                channel: executor.submit(self.__check_channel, channel)
+                for channel in self.channels
+            }
+            self.results = {
+                channel: future.result() for channel, future in futures.items()
+            }
+        return self.results
+
+    def fetch_version(self, version_url: str) -> str:
+        """Get version text at version_url, None if it can not be fetched"""
+        state = self.__load_state()
+        entry = state.get(version_url, dict())
+        if entry.get("body") and time.time() - entry.get("checked_at", 0) < self.ttl:
+            return entry["body"]
+
+        request = ur.Request(version_url)
+        if entry.get("body"):
+            if entry.get("etag"):
+                request.add_header("If-None-Match", entry["etag"])
+            if entry.get("last_modified"):
+                request.add_header("If-Modified-Since", entry["last_modified"])
+
+        try:
+            with ur.urlopen(request, timeout=self.timeout) as conn:
+                entry = {
+                    "body": conn.read().decode("utf8"),
+                    "etag": conn.headers.get("ETag"),
+                    "last_modified": conn.headers.get("Last-Modified"),
+                }
+        except HTTPError as err:
+            if err.code != 304:
+                return None
+        except (URLError, OSError):
+            return None
+
+        entry["checked_at"] = time.time()
+        self.__update_state(version_url, entry)
+        return entry["body"]
+
+    def __check_channel(self, channel):
+        version_url, download = self.channels[channel]
+        version_text = self.fetch_version(version_url)
+        if version_text is None:
+            return self.OFFLINE
+
+        latest_version_info = version_text.lstrip("v").rstrip("\n")
+        local_version_info = get_firmware_manifest().get_version_info(channel)
+        if local_version_info == latest_version_info:
+            return self.UP_TO_DATE
+
+        firmware_store = get_firmware_store()
+        version_key = firmware_store.find_version(channel, latest_version_info)
+        if version_key:
+            firmware_store.activate(channel, version_key)
+            reload_firmware_manifest()
+            return self.ACTIVATED
+
+        return self.DOWNLOADED if download(version_text) else self.FAILED
+
+    def __load_state(self):
+        try:
+            with open(self.state_path) as state_file:
+                return json.load(state_file)
+        except (OSError, ValueError):
+            return dict()
+
+    def __update_state(self, version_url, entry):
+        with self.__lock:
+            state = self.__load_state()
+            state[version_url] = entry
+            write_json(self.state_path, state)
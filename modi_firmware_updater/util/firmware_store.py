@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading as th
+from io import open
+from os import path
+
+from modi_firmware_updater.util.atomic_json import get_tmp_path, write_atomic
+from modi_firmware_updater.util.shared_instance import shared_instance
+
+
+def get_default_store_path() -> str:
+    return path.join(path.expanduser("~"), ".modi_firmware_updater", "firmware")
+
+
+class FirmwareStore:
+    """Versioned, content-addressed store of downloaded firmware
+
+    Binaries are kept once under objects/ by their SHA-256. Every version of
+    a channel is an immutable directory under versions/<channel>/ holding
+    links to those objects and its version file, and active/<channel> names
+    the version updaters read from. Versions are written completely before
+    they become visible and activation replaces the pointer atomically, so a
+    station can prefetch the next release while flashing the current one.
+    Objects added but not recorded in a version yet are kept by prune.
+    """
+
+    RECORD_FILE = "files.json"
+
+    def __init__(self, store_path: str = None):
+        self.store_path = store_path if store_path else get_default_store_path()
+        # Objects added since the last version which records them
+        self.__pending_objects = set()
+        self.__lock = th.RLock()
+
+    def has_object(self, sha256: str) -> bool:
+        return path.exists(self.__object_path(sha256))
+
+    def add_object(self, data: bytes = None, src_path: str = None) -> str:
+        """Add contents of data or of the file at src_path to the store"""
+        if data is None:
+            with open(src_path, "rb") as src_file:
+                data = src_file.read()
+        sha256 = hashlib.sha256(data).hexdigest()
+        object_path = self.__object_path(sha256)
+        with self.__lock:
+            if not path.exists(object_path):
+                write_atomic(object_path, data, "wb")
+            self.__pending_objects.add(sha256)
+        return sha256
+
+    def add_stream(self, stream, chunk_size: int = 64 * 1024) -> str:
+        """Add contents read from the file object stream to the store"""
+        os.makedirs(path.join(self.store_path, "objects"), exist_ok=True)
+        tmp_path = get_tmp_path(path.join(self.store_path, "objects", "stream"))
+        sha256 = hashlib.sha256()
+        with open(tmp_path, "wb") as object_file:
+            for chunk in iter(lambda: stream.read(chunk_size), b""):
+                sha256.update(chunk)
+                object_file.write(chunk)
+        sha256 = sha256.hexdigest()
+
+        object_path = self.__object_path(sha256)
+        with self.__lock:
+            if path.exists(object_path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(path.dirname(object_path), exist_ok=True)
+                os.replace(tmp_path, object_path)
+            self.__pending_objects.add(sha256)
+        return sha256
+
+    def add_version(
+        self, channel: str, version_text: str, files: dict,
+        version_file: str = "version.txt",
+    ) -> str:
+        """Add a version of channel, files maps each file name to its data
+
+        Data can be bytes or the SHA-256 of an object already in the store,
+        ValueError is raised for any other text. version_text is written to
+        version_file next to the binaries. Adding a version which already
+        exists is a no-op.
+        """
+        with self.__lock:
+            version_key, objects = self.__add_version(channel, version_text, files, version_file)
+            self.__pending_objects.difference_update(objects.values())
+            return version_key
+
+    def __add_version(self, channel, version_text, files, version_file):
+        version_info = version_text.lstrip("v").rstrip("\n")
+        objects = dict()
+        for file_name, data in files.items():
+            if not isinstance(data, str):
+                objects[file_name] = self.add_object(data)
+            elif re.fullmatch(r"[0-9a-f]{64}", data) and self.has_object(data):
+                objects[file_name] = data
+            else:
+                raise ValueError(f"{file_name} of {channel} {version_info}: object {data} is not stored")
+
+        digest = hashlib.sha256(
+            json.dumps(objects, sort_keys=True).encode("utf8")
+        ).hexdigest()
+        version_key = f"{self.__sanitize(version_info)}-{digest[:12]}"
+        version_path = self.__version_path(channel, version_key)
+        if path.isdir(version_path):
+            return version_key, objects
+
+        # Build the version aside and move it into place in one step
+        tmp_path = get_tmp_path(version_path)
+        os.makedirs(tmp_path)
+        for file_name, sha256 in objects.items():
+            self.__link(self.__object_path(sha256), path.join(tmp_path, file_name))
+        with open(path.join(tmp_path, version_file), "w") as data_file:
+            data_file.write(version_text)
+        with open(path.join(tmp_path, self.RECORD_FILE), "w") as record_file:
+            json.dump({"version_info": version_info, "files": objects}, record_file)
+        try:
+            os.rename(tmp_path, version_path)
+        except OSError:
+            # Same version has been added concurrently
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return version_key, objects
+
+    def find_version(self, channel: str, version_info: str) -> str:
+        """Get the newest stored version key of channel with version_info"""
+        version_info = version_info.lstrip("v").rstrip("\n")
+        found, found_time = None, None
+        for version_key in self.list_versions(channel):
+            record = self.__read_record(channel, version_key)
+            if not record or record["version_info"] != version_info:
+                continue
+            mtime = path.getmtime(self.__version_path(channel, version_key))
+            if found_time is None or found_time < mtime:
+                found, found_time = version_key, mtime
+        return found
+
+    def list_versions(self, channel: str) -> list:
+        versions_path = path.join(self.store_path, "versions", channel)
+        if not path.isdir(versions_path):
+            return []
+        return sorted(
+            version_key for version_key in os.listdir(versions_path)
+            if not version_key.endswith(".tmp")
+        )
+
+    def activate(self, channel: str, version_key: str) -> None:
+        if not path.isdir(self.__version_path(channel, version_key)):
+            raise ValueError(f"{channel} version {version_key} is not stored")
+        pointer_path = path.join(self.store_path, "active", channel)
+        with self.__lock:
+            write_atomic(pointer_path, version_key)
+
+    def get_active_version(self, channel: str) -> str:
+        pointer_path = path.join(self.store_path, "active", channel)
+        try:
+            with open(pointer_path) as pointer_file:
+                version_key = pointer_file.read().strip()
+        except OSError:
+            return None
+        if not path.isdir(self.__version_path(channel, version_key)):
+            return None
+        return version_key
+
+    def get_active_path(self, channel: str) -> str:
+        """Get directory of the active version of channel, None if unset"""
+        version_key = self.get_active_version(channel)
+        if version_key is None:
+            return None
+        return self.__version_path(channel, version_key)
+
+    def get_version_info(self, channel: str, version_key: str) -> str:
+        record = self.__read_record(channel, version_key)
+        return record["version_info"] if record else None
+
+    def prune(self, keep: int = 3) -> None:
+        """Remove all but the newest keep versions and unreferenced objects
+
+        Active versions and objects not recorded in a version yet are
+        always kept.
+        """
+        with self.__lock:
+            self.__prune(keep)
+
+    def __prune(self, keep):
+        referenced = set(self.__pending_objects)
+        versions_path = path.join(self.store_path, "versions")
+        channels = os.listdir(versions_path) if path.isdir(versions_path) else []
+        for channel in channels:
+            active = self.get_active_version(channel)
+            version_keys = sorted(
+                self.list_versions(channel),
+                key=lambda key: path.getmtime(self.__version_path(channel, key)),
+                reverse=True,
+            )
+            for i, version_key in enumerate(version_keys):
+                if i < keep or version_key == active:
+                    record = self.__read_record(channel, version_key)
+                    if record:
+                        referenced.update(record["files"].values())
+                    continue
+                shutil.rmtree(self.__version_path(channel, version_key), ignore_errors=True)
+
+        objects_path = path.join(self.store_path, "objects")
+        if not path.isdir(objects_path):
+            return
+        for prefix in os.listdir(objects_path):
+            prefix_path = path.join(objects_path, prefix)
+            if not path.isdir(prefix_path):
+                continue
+            for sha256 in os.listdir(prefix_path):
+                if sha256 not in referenced and not sha256.endswith(".tmp"):
+                    os.remove(path.join(prefix_path, sha256))
+            if not os.listdir(prefix_path):
+                os.rmdir(prefix_path)
+
+    def __read_record(self, channel, version_key):
+        record_path = path.join(self.__version_path(channel, version_key), self.RECORD_FILE)
+        try:
+            with open(record_path) as record_file:
+                return json.load(record_file)
+        except (OSError, ValueError):
+            return None
+
+    def __object_path(self, sha256):
+        return path.join(self.store_path, "objects", sha256[:2], sha256)
+
+    def __version_path(self, channel, version_key):
+        return path.join(self.store_path, "versions", channel, version_key)
+
+    @staticmethod
+    def __link(src_path, dest_path):
+        try:
+            os.link(src_path, dest_path)
+        except OSError:
+            shutil.copyfile(src_path, dest_path)
+
+    @staticmethod
+    def __sanitize(version_info):
+        return re.sub(r"[^0-9A-Za-z._]", "_", version_info) or "unknown"
+
+
+@shared_instance
+def get_firmware_store() -> FirmwareStore:
+    return FirmwareStore()
@@ -0,0 +1,159 @@
+import heapq
+import itertools
+import threading as th
+
+
+class ModuleState:
+    """States of a module during an update, a module moves from DISCOVERED
+    to QUEUED and FLASHING and ends as DONE or FAILED, or it is SKIPPED
+    right away if it is already up to date.
+    """
+
+    DISCOVERED = 0
+    QUEUED = 1
+    FLASHING = 2
+    DONE = 3
+    FAILED = 4
+    SKIPPED = 5
+
+    STATES = (DISCOVERED, QUEUED, FLASHING, DONE, FAILED, SKIPPED)
+    FINISHED_STATES = (DONE, FAILED, SKIPPED)
+
+
+class ModuleRecord:
+    __slots__ = ("module_id", "module_type", "state", "work", "attempts", "error_message")
+
+    def __init__(self, module_id: int, module_type: str):
+        self.module_id = module_id
+        self.module_type = module_type
+        self.state = ModuleState.DISCOVERED
+        # Work of flashing the module, e.g. bytes of its image
+        self.work = 0
+        # Failed attempts to flash the module so far
+        self.attempts = 0
+        # Why the last attempt failed, each module in flight has its own
+        self.error_message = ""
+
+
+""" Order in which queued modules are flashed, modules which have failed
+    before always come after the others. Longest image first keeps long
+    modules from being flashed alone at the end while others interleave.
+"""
+SCHEDULING_POLICIES = {
+    "arrival": lambda record: (record.attempts, ),
+    "longest_first": lambda record: (record.attempts, -record.work),
+}
+
+# Attempts to flash a module before it is given up
+MAX_MODULE_ATTEMPTS = 2
+
+
+class ModuleRegistry:
+    """Modules behind one network module by id and the queue of modules to
+    be flashed
+
+    Modules are looked up by id and the queue is a heap ordered by the
+    scheduling policy, so repeated warnings of large kits do not scan the
+    modules seen so far. A failed module is queued again until it has been
+    attempted max_attempts times.
+
+    :param str policy: Name of one of SCHEDULING_POLICIES
+    :param int max_attempts: Attempts to flash a module before it fails
+    """
+
+    def __init__(self, policy: str = "longest_first", max_attempts: int = MAX_MODULE_ATTEMPTS):
+        self.policy = policy
+        self.max_attempts = max_attempts
+        self.__schedule_key = SCHEDULING_POLICIES[policy]
+        self.__records = dict()
+        self.__queue = []
+        # Modules of the same priority are flashed in arrival order
+        self.__sequence = itertools.count()
+        self.__counts = dict.fromkeys(ModuleState.STATES, 0)
+        self.__lock = th.Lock()
+
+    def __len__(self) -> int:
+        return len(self.__records)
+
+    def get(self, module_id: int) -> ModuleRecord:
+        return self.__records.get(module_id)
+
+    def discover(self, module_id: int, module_type: str) -> ModuleRecord:
+        """Record of module_id, a new one if the module has not been seen"""
+        with self.__lock:
+            record = self.__records.get(module_id)
+            if record is None:
+                record = ModuleRecord(module_id, module_type)
+                self.__records[module_id] = record
+                self.__counts[ModuleState.DISCOVERED] += 1
+            return record
+
+    def queue(self, module_id: int, work: int = 0) -> bool:
+        """Queue a discovered module to be flashed, False if it was not new"""
+        with self.__lock:
+            if not self.__set_state(module_id, ModuleState.QUEUED, (ModuleState.DISCOVERED, )):
+                return False
+            self.__records[module_id].work = work
+            self.__push(self.__records[module_id])
+            return True
+
+    def skip(self, module_id: int) -> bool:
+        with self.__lock:
+            return self.__set_state(module_id, ModuleState.SKIPPED, (ModuleState.DISCOVERED, ))
+
+    def pop_queued(self) -> ModuleRecord:
+        """Next queued module, or None if the queue is empty
+
+        The module counts as flashing from here on, so it is only to be
+        popped once it can be started, the modules left queued keep their
+        order.
+        """
+        with self.__lock:
+            if not self.__queue:
+                return None
+            record = heapq.heappop(self.__queue)[-1]
+            self.__set_state(record.module_id, ModuleState.FLASHING)
+            return record
+
+    def finish(self, module_id: int, failed: bool = False) -> bool:
+        """Mark a flashed module done or failed, True if it was queued again"""
+        with self.__lock:
+            record = self.__records.get(module_id)
+            if record is None or record.state != ModuleState.FLASHING:
+                return False
+            if not failed:
+                self.__set_state(module_id, ModuleState.DONE)
+                return False
+            record.attempts += 1
+            if record.attempts >= self.max_attempts:
+                self.__set_state(module_id, ModuleState.FAILED)
+                return False
+            self.__set_state(module_id, ModuleState.QUEUED)
+            self.__push(record)
+            return True
+
+    def count(self, *states) -> int:
+        return sum(self.__counts[state] for state in states)
+
+    def get_records(self, *states) -> list:
+        with self.__lock:
+            return [record for record in self.__records.values() if record.state in states]
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__records.clear()
+            self.__queue.clear()
+            self.__sequence = itertools.count()
+            self.__counts = dict.fromkeys(ModuleState.STATES, 0)
+
+    def __push(self, record: ModuleRecord) -> None:
+        heapq.heappush(self.__queue, (self.__schedule_key(record), next(self.__sequence), record))
+
+    def __set_state(self, module_id: int, state: int, from_states: tuple = None) -> bool:
+        record = self.__records.get(module_id)
+        if record is None or (from_states is not None and record.state not in from_states):
+            return False
+        self.__counts[record.state] -= 1
+        self.__counts[state] += 1
+        record.state = state
+        return True
@@ -1,7 +1,8 @@
 import time
-from os import path
 from typing import Union
 
+from modi_firmware_updater.util.firmware_manifest import (
+    MODULE, get_firmware_manifest)
 from modi_firmware_updater.util.message_util import parse_message
 
 BROADCAST_ID = 0xFFF
@@ -28,6 +29,52 @@ def get_module_type_from_uuid(uuid):
     return "network" if module_type is None else module_type
 
 
+class ModuleFilter:
+    """Modules selected for an update by type, id or UUID, every module if
+    nothing is selected
+
+    Ids of selected UUIDs are their lowest 12 bits, so modules selected by
+    id or UUID are addressed right away. Modules selected by type are only
+    known once they have told their UUID.
+
+    :param module_types: Types of the modules, e.g. ("motor", )
+    :param module_ids: Ids of the modules
+    :param module_uuids: UUIDs of the modules
+    """
+
+    def __init__(self, module_types=(), module_ids=(), module_uuids=()):
+        self.module_types = frozenset(module_type.lower() for module_type in module_types)
+        self.module_ids = frozenset(module_ids)
+        self.module_uuids = frozenset(module_uuids)
+
+    def __repr__(self):
+        return (
+            f"ModuleFilter(types={sorted(self.module_types)}, ids={sorted(self.module_ids)}, "
+            f"uuids={[f'0x{module_uuid:X}' for module_uuid in sorted(self.module_uuids)]})"
+        )
+
+    @property
+    def selects_all(self) -> bool:
+        return not (self.module_types or self.module_ids or self.module_uuids)
+
+    def get_module_ids(self) -> set:
+        """Ids of the modules selected by id or UUID"""
+        return set(self.module_ids) | {module_uuid & BROADCAST_ID for module_uuid in self.module_uuids}
+
+    def matches(self, module_id: int, module_uuid: int = None) -> bool:
+        """Whether the module is selected, its UUID is needed unless it is
+        selected by id
+        """
+        if self.selects_all or module_id in self.module_ids:
+            return True
+        if module_uuid is None:
+            return False
+        return (
+            module_uuid in self.module_uuids
+            or get_module_type_from_uuid(module_uuid) in self.module_types
+        )
+
+
 class Module:
     """
     :param int id_: The id of the module.
@@ -120,18 +167,7 @@ class Module:
 
     @property
     def is_up_to_date(self):
-        root_path = path.join(
-            path.dirname(__file__), "..", "assets", "firmware", "stm32"
-        )
-        version_path = path.join(root_path, "version.txt")
-        with open(version_path) as version_file:
-            version_info = version_file.readline().lstrip("v").rstrip("\n")
-        version_digits = [int(digit) for digit in version_info.split(".")]
-        latest_version = (
-            version_digits[0] << 13
-            | version_digits[1] << 8
-            | version_digits[2]
-        )
+        latest_version = get_firmware_manifest().get_version(MODULE)
         return latest_version <= self.__version
 
     def _get_property(self, property_type: int) -> float:
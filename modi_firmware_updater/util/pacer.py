@@ -0,0 +1,64 @@
+import threading as th
+import time
+
+from modi_firmware_updater.util.shared_instance import shared_instance
+
+
+class Pacer:
+    """Spaces frames of many senders on absolute deadlines without spinning
+
+    Every sender has its own schedule of deadlines on the monotonic
+    high-resolution clock, advanced by the requested interval per frame. A
+    sender only sleeps once it is at least min_sleep ahead of its schedule,
+    so short gaps are merged into one sleep instead of being spun away, and
+    an overslept gap is caught up by the following frames. A sender more
+    than max_lag behind its schedule, e.g. after waiting for an ack, starts
+    a new schedule instead of bursting.
+
+    :param float min_sleep: Shortest sleep worth handing to the scheduler
+    :param float max_lag: How far a sender may fall behind before it restarts
+    """
+
+    def __init__(self, min_sleep: float = 0.0005, max_lag: float = 0.05):
+        self.min_sleep = min_sleep
+        self.max_lag = max_lag
+        self.frames = 0
+        self.idle_time = 0.0
+        self.__deadlines = dict()
+        self.__lock = th.Lock()
+
+    def pace(self, sender, interval: float) -> None:
+        """Wait until the next frame of sender is due, interval after the last"""
+        now = time.perf_counter()
+        with self.__lock:
+            deadline = self.__deadlines.get(sender)
+            if deadline is None or now - deadline > self.max_lag:
+                deadline = now
+            deadline += interval
+            self.__deadlines[sender] = deadline
+            self.frames += 1
+
+        remaining = deadline - now
+        if remaining >= self.min_sleep:
+            time.sleep(remaining)
+            with self.__lock:
+                self.idle_time += remaining
+
+    def resync(self, sender) -> None:
+        """Start the schedule of sender over if it is behind, e.g. after an
+        ack, a schedule ahead of now is kept for the other frames on it"""
+        now = time.perf_counter()
+        with self.__lock:
+            deadline = self.__deadlines.get(sender)
+            if deadline is not None and deadline < now:
+                self.__deadlines[sender] = now
+
+    def reset(self, sender) -> None:
+        """Drop the schedule of sender, its next frame is sent right away"""
+        with self.__lock:
+            self.__deadlines.pop(sender, None)
+
+
+@shared_instance
+def get_pacer() -> Pacer:
+    return Pacer()
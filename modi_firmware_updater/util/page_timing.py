@@ -0,0 +1,125 @@
+import json
+import math
+import threading as th
+import time
+from contextlib import contextmanager
+from io import open
+
+""" Phases of writing one page: waiting for the erase ack, sending its data
+    frames, waiting for the CRC ack and backing off before retries.
+"""
+PHASES = ("erase", "data", "crc", "retry")
+
+_export_lock = th.Lock()
+
+
+def get_percentile(values: list, fraction: float) -> float:
+    """Nearest-rank percentile of values, 0 if there are none"""
+    if not values:
+        return 0
+    values = sorted(values)
+    rank = max(0, min(len(values), math.ceil(fraction * len(values))) - 1)
+    return values[rank]
+
+
+class PageTiming:
+    """Time spent in each phase of one page, retries included"""
+
+    def __init__(self, page_begin: int):
+        self.page_begin = page_begin
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.retries = 0
+
+    @contextmanager
+    def measure(self, phase: str):
+        phase_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[phase] += time.perf_counter() - phase_start
+
+
+class PageTimingLog:
+    """Timing records of the pages written to one module
+
+    :param str module_type: Type of the module, e.g. "led"
+    :param int module_id: Id of the module
+    """
+
+    def __init__(self, module_type: str, module_id: int):
+        self.module_type = module_type
+        self.module_id = module_id
+        self.records = []
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    def add_page(
+        self, page_timing: PageTiming, retries: int = 0, retry_time: float = 0,
+        failed: bool = False,
+    ) -> None:
+        """Record a page once it is written or has failed
+
+        :param bool failed: Whether the page was given up on
+        """
+        page_timing.retries += retries
+        page_timing.durations["retry"] += retry_time
+        record = {"page": page_timing.page_begin}
+        record.update(page_timing.durations)
+        record["retries"] = page_timing.retries
+        record["failed"] = failed
+        self.records.append(record)
+
+    def finish(self) -> None:
+        self.end_time = time.perf_counter()
+
+    def get_summary(self) -> dict:
+        end_time = self.end_time if self.end_time is not None else time.perf_counter()
+        duration = end_time - self.start_time
+        # Only written pages make up the throughput, failed ones the phases
+        num_failed = sum(1 for record in self.records if record.get("failed"))
+        num_written = len(self.records) - num_failed
+        summary = {
+            "module": self.module_type,
+            "module_id": self.module_id,
+            "pages": num_written,
+            "failed_pages": num_failed,
+            "duration": duration,
+            "pages_per_second": num_written / duration if duration else None,
+            "retries": sum(record["retries"] for record in self.records),
+        }
+        for phase in PHASES:
+            durations = [record[phase] for record in self.records]
+            summary[phase] = {
+                "p50": get_percentile(durations, 0.5),
+                "p95": get_percentile(durations, 0.95),
+                "max": max(durations, default=0),
+            }
+        return summary
+
+    def format_summary(self) -> str:
+        summary = self.get_summary()
+        phase_texts = [
+            f"{phase} {summary[phase]['p50'] * 1000:.1f}/"
+            f"{summary[phase]['p95'] * 1000:.1f}/{summary[phase]['max'] * 1000:.1f}ms"
+            for phase in PHASES
+        ]
+        pages_per_second = summary["pages_per_second"] or 0
+        failed_text = f", {summary['failed_pages']} failed pages" if summary["failed_pages"] else ""
+        return (
+            f"{self.module_type} ({self.module_id}) page timings (p50/p95/max): "
+            f"{', '.join(phase_texts)}, {pages_per_second:.1f} pages/s{failed_text}"
+        )
+
+    def export(self, export_path: str) -> None:
+        """Append every page record and the summary to a JSON lines file"""
+        lines = []
+        for record in self.records:
+            line = {"module": self.module_type, "module_id": self.module_id}
+            line.update(record)
+            lines.append(json.dumps(line, separators=(",", ":")))
+        summary = {"summary": True}
+        summary.update(self.get_summary())
+        lines.append(json.dumps(summary, separators=(",", ":")))
+        with _export_lock:
+            with open(export_path, "a") as export_file:
+                export_file.write("\n".join(lines) + "\n")
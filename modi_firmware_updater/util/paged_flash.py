@@ -0,0 +1,210 @@
+import time
+
+from modi_firmware_updater.util.firmware_manifest import (FIRMWARE_CHANNELS,
+                                                          FLASH_MEMORY_ADDR,
+                                                          MODULE, NETWORK)
+from modi_firmware_updater.util.page_timing import PageTiming
+from modi_firmware_updater.util.retry_policy import get_retry_policy
+
+
+class FlashLayout:
+    """Where the pages of a firmware image are written in the flash of the
+    modules of one channel
+
+    :param str channel: Firmware channel of the image, e.g. MODULE
+    :param int page_offset: Offset of the image pages in the flash
+    :param int flash_memory_addr: Address of the flash memory
+    :param int end_flash_addr: Address of the page holding the end-flash data
+    """
+
+    def __init__(
+        self, channel: str, page_offset: int = 0,
+        flash_memory_addr: int = FLASH_MEMORY_ADDR, end_flash_addr: int = 0x0801F800,
+    ):
+        self.channel = channel
+        self.bin_begin = FIRMWARE_CHANNELS[channel]["bin_begin"]
+        self.page_size = FIRMWARE_CHANNELS[channel]["page_size"]
+        self.page_offset = page_offset
+        self.flash_memory_addr = flash_memory_addr
+        self.end_flash_addr = end_flash_addr
+
+    def get_page_addr(self, page_begin: int) -> int:
+        """Flash address of the image page at page_begin"""
+        return self.flash_memory_addr + page_begin + self.page_offset
+
+
+""" Layouts of the paged channels, a new bootloader target only needs its
+    channel and layout to be flashed by PagedFlash.
+"""
+FLASH_LAYOUTS = {
+    MODULE: FlashLayout(MODULE),
+    NETWORK: FlashLayout(NETWORK, page_offset=0x8800),
+}
+
+
+class PagedFlash:
+    """Erase, data and CRC loop writing a paged firmware image through the
+    bootloader of one module
+
+    The updaters only provide the frames of their own connection, so
+    pacing, the page plan, retries and page timing are shared by every
+    target. Empty pages are never sent and erased pages are written by
+    their erase alone. A page is attempted again until its erase or CRC
+    retry policy runs out, which fails the whole image. An erase or CRC
+    request which raises, e.g. on a timed-out ack, is a failed attempt as
+    well, only fatal exceptions of the policy are raised.
+
+    :param FlashLayout layout: Layout of the flash being written
+    :param firmware_image: Paged firmware image to be written
+    :param erase_page: Erases the page at a flash address, False on failure
+    :param send_data: Sends an encoded data frame by its sequence number
+    :param check_crc: Checks the page at a flash address against a CRC, False on failure
+    :param rate_controller: Rate controller of the data frames
+    :param pacer: Pacer shared by every updater
+    :param sender: Pacer schedule the data frames are spaced on
+    :param page_timing_log: Log of the timings of the written pages
+    :param str erase_policy: Retry policy of page erases, the only one
+        applied to them so erase_page must not retry by itself
+    """
+
+    def __init__(
+        self, layout: FlashLayout, firmware_image, erase_page, send_data,
+        check_crc, rate_controller, pacer, sender, page_timing_log,
+        erase_policy: str = "page_erase",
+    ):
+        self.layout = layout
+        self.firmware_image = firmware_image
+        self.erase_page = erase_page
+        self.send_data = send_data
+        self.check_crc = check_crc
+        self.rate_controller = rate_controller
+        self.pacer = pacer
+        self.sender = sender
+        self.page_timing_log = page_timing_log
+
+        self.pages_written = 0
+        self.update_time = 0.0
+        self.error_message = None
+        self.__erase_policy = get_retry_policy(erase_policy)
+        self.__crc_policy = get_retry_policy("page_crc")
+
+    @property
+    def pages_per_second(self) -> float:
+        if not self.update_time:
+            return None
+        return self.pages_written / self.update_time
+
+    def get_pages(self) -> range:
+        return range(self.layout.bin_begin, self.firmware_image.bin_end, self.layout.page_size)
+
+    def write(self, pages=None, on_page=None, on_page_written=None) -> bool:
+        """Write the pages of the image, False once a page has failed
+
+        :param pages: Pages to be written, every page of the image if None
+        :param on_page: Called with every page before it is written or skipped
+        :param on_page_written: Called with every page confirmed by the module
+        """
+        update_start_time = time.perf_counter()
+        try:
+            for page_begin in self.get_pages():
+                if on_page:
+                    on_page(page_begin)
+
+                # Skip current page if empty or if the module already holds it
+                if self.firmware_image.is_empty_page(page_begin):
+                    continue
+                if pages is not None and page_begin not in pages:
+                    continue
+
+                if not self.__write_page(page_begin):
+                    return False
+                if on_page_written:
+                    on_page_written(page_begin)
+            return True
+        finally:
+            self.update_time = time.perf_counter() - update_start_time
+
+    def __write_page(self, page_begin: int) -> bool:
+        page_timing = PageTiming(page_begin)
+        crc_attempts = self.__crc_policy.begin()
+        # Erase retries start over after every erase which succeeds, those
+        # of all erases of the page add up in its timing
+        attempts = [crc_attempts]
+        page_written = False
+        try:
+            page_written = self.__write_page_attempts(page_begin, page_timing, crc_attempts, attempts)
+            return page_written
+        finally:
+            # Failed pages are timed too, they are where the time went
+            self.page_timing_log.add_page(
+                page_timing,
+                sum(page_attempts.count - 1 for page_attempts in attempts),
+                sum(page_attempts.delay_time for page_attempts in attempts),
+                failed=not page_written,
+            )
+
+    def __write_page_attempts(self, page_begin: int, page_timing, crc_attempts, attempts: list) -> bool:
+        firmware_image = self.firmware_image
+        page_addr = self.layout.get_page_addr(page_begin)
+        erase_attempts = None
+        while True:
+            if erase_attempts is None:
+                erase_attempts = self.__erase_policy.begin()
+                attempts.append(erase_attempts)
+            with page_timing.measure("erase"):
+                erase_page_success, erase_error = self.__request(self.erase_page, page_addr)
+
+            if not erase_page_success:
+                self.rate_controller.on_failure()
+                if not erase_attempts.retry(erase_error):
+                    self.__give_up(erase_attempts, "erase flash failed", erase_error)
+                    return False
+                continue
+            erase_attempts = None
+
+            # Erased page is already written by the erase itself
+            if firmware_image.is_erased_page(page_begin):
+                return True
+
+            # Copy current page data to the module's memory, its checksum
+            # has already been derived from the page plan. A schedule left
+            # behind by the erase starts over so frames are not burst to
+            # make up for it, one kept ahead by other modules is followed
+            self.pacer.resync(self.sender)
+            with page_timing.measure("data"):
+                for curr_ptr in range(0, self.layout.page_size, 8):
+                    if page_begin + curr_ptr >= firmware_image.size:
+                        break
+
+                    self.send_data(curr_ptr // 8, firmware_image.get_encoded_data(page_begin + curr_ptr))
+                    self.pacer.pace(self.sender, self.rate_controller.interval)
+
+            # CRC on current page (send CRC request / receive CRC response)
+            with page_timing.measure("crc"):
+                crc_page_success, crc_error = self.__request(
+                    self.check_crc, page_addr, firmware_image.get_page_crc(page_begin)
+                )
+
+            if crc_page_success:
+                self.rate_controller.on_success()
+                self.pages_written += 1
+                return True
+
+            self.rate_controller.on_failure()
+            if not crc_attempts.retry(crc_error):
+                self.__give_up(crc_attempts, "check crc failed", crc_error)
+                return False
+
+    @staticmethod
+    def __request(request, *args) -> tuple:
+        """Success of a bootloader request and the exception it raised"""
+        try:
+            return request(*args), None
+        except Exception as exception:
+            return False, exception
+
+    def __give_up(self, attempts, error_message: str, exception: Exception = None) -> None:
+        # Fatal exceptions, e.g. of a closed port, are not a failed page
+        if exception is not None and not attempts.policy.is_retryable(exception):
+            raise exception
+        self.error_message = f"{error_message}: {exception}" if exception is not None else f"{error_message}."
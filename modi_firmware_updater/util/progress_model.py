@@ -0,0 +1,113 @@
+import threading as th
+import time
+
+""" A round trip (erase or CRC ack) costs about as much link time as sending
+    this many bytes of data frames, e.g. 30ms at 1000 frames of 8 bytes/s.
+"""
+ROUND_TRIP_BYTES = 256
+
+
+def get_image_work(firmware_image, pages=None) -> int:
+    """Work of writing the pages of firmware_image, in bytes
+
+    A data page costs its bytes and its erase and CRC round trips, an erased
+    page costs its erase round trip. The end-flash page adds two round trips.
+
+    :param firmware_image: Paged firmware image
+    :param pages: Pages to be written, every page of the image if None
+    """
+    data_pages = [page_begin for page_begin, _ in firmware_image.page_table]
+    erased_pages = list(firmware_image.erased_pages)
+    if pages is not None:
+        data_pages = [page_begin for page_begin in data_pages if page_begin in pages]
+        erased_pages = [page_begin for page_begin in erased_pages if page_begin in pages]
+    round_trips = 2 * len(data_pages) + len(erased_pages) + 2
+    return len(data_pages) * firmware_image.page_size + round_trips * ROUND_TRIP_BYTES
+
+
+def get_page_work(firmware_image, page_begin: int) -> int:
+    if firmware_image.is_erased_page(page_begin):
+        return ROUND_TRIP_BYTES
+    return firmware_image.page_size + 2 * ROUND_TRIP_BYTES
+
+
+class ProgressModel:
+    """Progress and ETA of the module queue behind one network module
+
+    Work is counted in bytes, round trips included, over every queued
+    module. Throughput is smoothed with an exponential moving average so
+    that a slow page does not make the ETA jump.
+
+    :param float smoothing: Weight of the latest throughput sample
+    :param float min_sample_time: Shortest interval worth a throughput sample
+    """
+
+    def __init__(self, smoothing: float = 0.2, min_sample_time: float = 0.5):
+        self.smoothing = smoothing
+        self.min_sample_time = min_sample_time
+        self.throughput = None
+        self.__total_work = dict()
+        self.__done_work = dict()
+        self.__sample_time = None
+        self.__sample_work = 0
+        self.__lock = th.Lock()
+
+    def add_module(self, module_id: int, work: int) -> None:
+        """Queue the work of a module, replacing what was queued before"""
+        with self.__lock:
+            self.__total_work[module_id] = work
+            self.__done_work[module_id] = 0
+
+    def advance(self, module_id: int, work: int) -> None:
+        """Count work done for a module and update the throughput"""
+        now = time.monotonic()
+        with self.__lock:
+            if module_id not in self.__total_work:
+                return
+            self.__done_work[module_id] = min(
+                self.__total_work[module_id], self.__done_work[module_id] + work
+            )
+            if self.__sample_time is None:
+                self.__sample_time = now
+                return
+            self.__sample_work += work
+            sample_time = now - self.__sample_time
+            if sample_time < self.min_sample_time:
+                return
+            throughput = self.__sample_work / sample_time
+            if self.throughput is None:
+                self.throughput = throughput
+            else:
+                self.throughput += self.smoothing * (throughput - self.throughput)
+            self.__sample_time, self.__sample_work = now, 0
+
+    def complete(self, module_id: int) -> None:
+        """Mark the rest of the work of a module as done, e.g. skipped pages"""
+        with self.__lock:
+            if module_id in self.__total_work:
+                self.__done_work[module_id] = self.__total_work[module_id]
+
+    @property
+    def total_work(self) -> int:
+        with self.__lock:
+            return sum(self.__total_work.values())
+
+    @property
+    def remaining_work(self) -> int:
+        with self.__lock:
+            return sum(self.__total_work.values()) - sum(self.__done_work.values())
+
+    @property
+    def progress(self) -> float:
+        """Done work of the whole queue in percent"""
+        with self.__lock:
+            total_work = sum(self.__total_work.values())
+            done_work = sum(self.__done_work.values())
+        return 100 * done_work / total_work if total_work else 0
+
+    @property
+    def eta(self) -> float:
+        """Seconds left for the whole queue, None until throughput is known"""
+        if not self.throughput:
+            return None
+        return self.remaining_work / self.throughput
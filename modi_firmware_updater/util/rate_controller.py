@@ -0,0 +1,72 @@
+import threading as th
+
+from modi_firmware_updater.util.shared_instance import shared_instance
+
+
+class RateController:
+    """Rate of firmware data frames, adapted to how well pages are written
+
+    The rate grows by a fixed step after every page whose CRC succeeds and
+    is cut by a factor on a CRC error or a timed-out response, so it settles
+    just below the rate a link and module can sustain.
+
+    :param float rate: Initial rate in frames per second
+    :param float min_rate: Lowest rate the controller backs off to
+    :param float max_rate: Highest rate the controller speeds up to
+    :param float increase: Frames per second added after a good page
+    :param float decrease: Factor applied to the rate after a failure
+    """
+
+    def __init__(
+        self, rate: float = 1000, min_rate: float = 250, max_rate: float = 4000,
+        increase: float = 50, decrease: float = 0.5,
+    ):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.successes = 0
+        self.failures = 0
+        self.__rate = min(max(rate, min_rate), max_rate)
+        self.__lock = th.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self.__rate
+
+    @property
+    def interval(self) -> float:
+        """Gap between two data frames in seconds"""
+        return 1 / self.__rate
+
+    def on_success(self) -> None:
+        with self.__lock:
+            self.successes += 1
+            self.__rate = min(self.max_rate, self.__rate + self.increase)
+
+    def on_failure(self) -> None:
+        with self.__lock:
+            self.failures += 1
+            self.__rate = max(self.min_rate, self.__rate * self.decrease)
+
+    def to_dict(self) -> dict:
+        return {
+            "rate": self.__rate,
+            "successes": self.successes,
+            "failures": self.failures,
+        }
+
+
+@shared_instance
+def get_rate_controller(module_type: str, port: str) -> RateController:
+    """Get the process-wide rate controller of a module type on a port
+
+    Rates learned while flashing a module are kept for the next module of
+    the same type on the same port.
+    """
+    return RateController()
+
+
+def get_rate_controllers() -> dict:
+    """Get every rate controller by its (module type, port)"""
+    return get_rate_controller.get_instances()
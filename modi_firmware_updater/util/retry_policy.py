@@ -0,0 +1,196 @@
+import functools
+import random
+import threading as th
+import time
+
+from serial.serialutil import SerialException
+
+from modi_firmware_updater.util.shared_instance import shared_instance
+
+""" Retry policies of the update state machines by operation name. Attempt
+    limits follow the error limits each operation used to have.
+"""
+RETRY_POLICIES = {
+    # Erase and CRC of one page of a module
+    "page_erase": {"max_attempts": 3, "base_delay": 0.01, "max_delay": 0.2, "time_budget": 10},
+    "page_crc": {"max_attempts": 3, "base_delay": 0.01, "max_delay": 0.2, "time_budget": 10},
+    # Erase of one page of the network module
+    "network_erase": {"max_attempts": 7, "base_delay": 0.01, "max_delay": 0.2, "time_budget": 30},
+    # Version written to the end-flash page
+    "end_flash": {"max_attempts": 3, "base_delay": 0.1, "max_delay": 1.0, "time_budget": 30},
+    "network_end_flash": {"max_attempts": 12, "base_delay": 0.01, "max_delay": 0.5, "time_budget": 30},
+    # Command packet of the ESP32 bootloader
+    "esp32_packet": {"max_attempts": 5, "base_delay": 0.1, "max_delay": 2.0, "time_budget": 60},
+}
+
+
+class RetryPolicy:
+    """Bounded retries with exponential backoff and jitter
+
+    An operation is attempted at most max_attempts times and is not retried
+    once its time budget would be exceeded. The n-th retry waits for
+    base_delay * backoff ** (n - 1), at most max_delay, of which a random
+    part up to jitter is left out so that retries do not line up. Fatal
+    exceptions, e.g. a closed port, are never retried.
+
+    :param int max_attempts: Attempts of one operation including the first
+    :param float base_delay: Delay before the first retry in seconds
+    :param float max_delay: Longest delay before a retry
+    :param float backoff: Factor applied to the delay after every retry
+    :param float jitter: Fraction of the delay which is randomized
+    :param float time_budget: Seconds one operation may take, None if unbounded
+    :param tuple retryable: Exceptions worth another attempt
+    :param tuple fatal: Exceptions raised right away
+    """
+
+    def __init__(
+        self, max_attempts: int = 3, base_delay: float = 0.01,
+        max_delay: float = 1.0, backoff: float = 2.0, jitter: float = 0.5,
+        time_budget: float = None, retryable: tuple = (Exception, ),
+        fatal: tuple = (SerialException, ),
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.jitter = jitter
+        self.time_budget = time_budget
+        self.retryable = retryable
+        self.fatal = fatal
+
+        self.operations = 0
+        self.retries = 0
+        self.failures = 0
+        # Time spent in failed attempts and waiting before their retries
+        self.retry_time = 0.0
+        self.__lock = th.Lock()
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+
+        return wrapper
+
+    def call(self, func, *args, **kwargs):
+        """Call func until it returns, re-raising its last exception"""
+        attempts = self.begin()
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as exception:
+                if not attempts.retry(exception):
+                    raise
+
+    def begin(self) -> "RetryAttempts":
+        """Start an operation whose failures are reported to retry()"""
+        with self.__lock:
+            self.operations += 1
+        return RetryAttempts(self)
+
+    def get_delay(self, retry_count: int) -> float:
+        delay = min(self.max_delay, self.base_delay * self.backoff ** (retry_count - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def is_retryable(self, exception: Exception) -> bool:
+        if isinstance(exception, self.fatal):
+            return False
+        return isinstance(exception, self.retryable)
+
+    def _add_retry(self, retry_time: float) -> None:
+        with self.__lock:
+            self.retries += 1
+            self.retry_time += retry_time
+
+    def _add_failure(self, retry_time: float) -> None:
+        with self.__lock:
+            self.failures += 1
+            self.retry_time += retry_time
+
+    def to_dict(self) -> dict:
+        return {
+            "operations": self.operations,
+            "retries": self.retries,
+            "failures": self.failures,
+            "retry_time": self.retry_time,
+        }
+
+
+class RetryAttempts:
+    """Attempts of one operation under a retry policy"""
+
+    def __init__(self, policy: RetryPolicy):
+        self.policy = policy
+        self.count = 1
+        # Time spent backing off before retries of this operation
+        self.delay_time = 0.0
+        self.start_time = time.monotonic()
+        self.__attempt_time = self.start_time
+
+    def retry(self, exception: Exception = None) -> bool:
+        """Report a failed attempt, wait and tell whether to attempt again
+
+        :param exception: Exception of the attempt, None if it returned a failure
+        """
+        now = time.monotonic()
+        attempt_time = now - self.__attempt_time
+        if exception is not None and not self.policy.is_retryable(exception):
+            self.policy._add_failure(attempt_time)
+            return False
+
+        delay = self.policy.get_delay(self.count)
+        time_budget = self.policy.time_budget
+        if (
+            self.count >= self.policy.max_attempts
+            or time_budget is not None and now + delay - self.start_time > time_budget
+        ):
+            self.policy._add_failure(attempt_time)
+            return False
+
+        time.sleep(delay)
+        self.count += 1
+        self.delay_time += delay
+        self.__attempt_time = time.monotonic()
+        self.policy._add_retry(attempt_time + delay)
+        return True
+
+
+@shared_instance
+def get_retry_policy(name: str) -> RetryPolicy:
+    """Get the process-wide retry policy of an operation
+
+    Operations missing from RETRY_POLICIES get the default policy.
+    """
+    return RetryPolicy(**RETRY_POLICIES.get(name, dict()))
+
+
+def get_retry_policies() -> dict:
+    """Get every retry policy in use by its operation name"""
+    return {name: retry_policy for (name, ), retry_policy in get_retry_policy.get_instances().items()}
+
+
+def get_retry_counts() -> dict:
+    """Get the counters of every retry policy in use by its operation name,
+    the start of a run to be summarized by format_retry_summary
+    """
+    return {name: retry_policy.to_dict() for name, retry_policy in get_retry_policies().items()}
+
+
+def format_retry_summary(retry_counts: dict) -> str:
+    """Summarize the retries of every policy since retry_counts were taken,
+    empty if there were none
+
+    The policies are shared by the whole process, so earlier runs are left
+    out by their counts at the start of this one.
+
+    :param dict retry_counts: Counters from get_retry_counts
+    """
+    lines = []
+    for name, counts in get_retry_counts().items():
+        start_counts = retry_counts.get(name, dict())
+        retries = counts["retries"] - start_counts.get("retries", 0)
+        failures = counts["failures"] - start_counts.get("failures", 0)
+        retry_time = counts["retry_time"] - start_counts.get("retry_time", 0.0)
+        if retries or failures:
+            lines.append(f"Retries of {name}: {retries}, {failures} given up, {retry_time:.2f}s")
+    return "\n".join(lines)
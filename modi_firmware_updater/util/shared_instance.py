@@ -0,0 +1,37 @@
+import functools
+import threading as th
+
+
+def shared_instance(factory):
+    """Turn factory into the getter of process-wide instances, one per
+    distinct set of arguments, each one made on its first use
+
+    The instances are kept in the getter's instances dict by their argument
+    tuple, so they can be listed, replaced or dropped, e.g. by tests.
+
+    :param factory: Makes the instance of its arguments
+    """
+    lock = th.Lock()
+
+    @functools.wraps(factory)
+    def get(*args):
+        with lock:
+            instance = get.instances.get(args)
+            if instance is None:
+                instance = factory(*args)
+                get.instances[args] = instance
+            return instance
+
+    def set_instance(instance, *args):
+        with lock:
+            get.instances[args] = instance
+        return instance
+
+    def get_instances() -> dict:
+        with lock:
+            return dict(get.instances)
+
+    get.instances = dict()
+    get.set_instance = set_instance
+    get.get_instances = get_instances
+    return get
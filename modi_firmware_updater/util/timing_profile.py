@@ -0,0 +1,108 @@
+import json
+import threading as th
+import time
+from io import open
+from os import path
+
+from modi_firmware_updater.util.shared_instance import shared_instance
+
+""" Delays the modules truly need, in seconds. Everything else in the update
+    state machines waits for a response or an event instead of sleeping.
+"""
+DEFAULT_TIMINGS = {
+    # Gap between repeated broadcast requests, e.g. putting modules in update mode
+    "request_gap": 0.01,
+    # Modules rebooting after the reboot broadcast before the port is closed
+    "reboot_settle": 1.0,
+    # Network module before its port is closed at the end of an update
+    "close_settle": 1.0,
+    # Network module jumping to its bootloader before the port is closed
+    "bootloader_settle": 0.7,
+    # ESP32 booting its application before its version is written
+    "esp32_boot": 1.0,
+    # ESP32 writing its version before the port is closed
+    "esp32_close": 1.5,
+    # ESP32 resetting its interpreter
+    "interpreter_reset": 1.0,
+    # Time to wait for an update to be started after which the updater gives up
+    "module_wait_timeout": 10.0,
+    # Time without a newly discovered module after which discovery is done
+    "discovery_settle": 1.5,
+}
+
+
+def get_default_timing_profile_path() -> str:
+    return path.join(path.expanduser("~"), ".modi_firmware_updater", "timing_profile.json")
+
+
+class TimingProfile:
+    """Named, tunable delays and the idle time they have cost
+
+    :param dict timings: Delays overriding DEFAULT_TIMINGS by name
+    """
+
+    def __init__(self, timings: dict = None):
+        self.timings = dict(DEFAULT_TIMINGS)
+        if timings:
+            unknown = set(timings) - set(DEFAULT_TIMINGS)
+            if unknown:
+                raise ValueError(f"Unknown timings: {', '.join(sorted(unknown))}")
+            invalid = [
+                name for name, delay in timings.items()
+                if isinstance(delay, bool) or not isinstance(delay, (int, float)) or delay < 0
+            ]
+            if invalid:
+                raise ValueError(f"Timings must be non-negative seconds: {', '.join(sorted(invalid))}")
+            self.timings.update(timings)
+        self.__idle_times = dict()
+        self.__lock = th.Lock()
+
+    @classmethod
+    def load(cls, profile_path: str) -> "TimingProfile":
+        with open(profile_path) as profile_file:
+            timings = json.load(profile_file)
+        if not isinstance(timings, dict):
+            raise ValueError("Timing profile must map timing names to seconds")
+        return cls(timings)
+
+    def get(self, name: str) -> float:
+        return self.timings[name]
+
+    def wait(self, name: str) -> None:
+        """Sleep for the delay called name and count it as idle time"""
+        delay = self.timings[name]
+        if delay <= 0:
+            return
+        time.sleep(delay)
+        with self.__lock:
+            self.__idle_times[name] = self.__idle_times.get(name, 0) + delay
+
+    @property
+    def idle_time(self) -> float:
+        with self.__lock:
+            return sum(self.__idle_times.values())
+
+    def get_idle_times(self) -> dict:
+        with self.__lock:
+            return dict(self.__idle_times)
+
+    def reset_idle_time(self) -> None:
+        with self.__lock:
+            self.__idle_times = dict()
+
+
+@shared_instance
+def get_timing_profile() -> TimingProfile:
+    """Get the process-wide timing profile
+
+    Delays are read from ~/.modi_firmware_updater/timing_profile.json when
+    it exists, missing ones keep their default. A profile which can not be
+    read is ignored so that the updaters still work with DEFAULT_TIMINGS.
+    """
+    profile_path = get_default_timing_profile_path()
+    if path.exists(profile_path):
+        try:
+            return TimingProfile.load(profile_path)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring timing profile {profile_path}, using default timings: {e}")
+    return TimingProfile()
@@ -0,0 +1,123 @@
+import threading as th
+import time
+
+""" Events of one module being flashed, the module updaters emit them from
+    their worker threads.
+"""
+MODULE_STARTED = "module_started"
+PAGE_DONE = "page_done"
+MODULE_DONE = "module_done"
+ERROR = "error"
+
+""" Events of a whole update over every connected network module, the multi
+    updaters emit them.
+"""
+UPDATE_STARTED = "update_started"
+UPDATE_PROGRESS = "update_progress"
+UPDATE_DONE = "update_done"
+
+EVENT_TYPES = (
+    MODULE_STARTED, PAGE_DONE, MODULE_DONE, ERROR, UPDATE_STARTED,
+    UPDATE_PROGRESS, UPDATE_DONE,
+)
+
+# Progress events are throttled, the others are always delivered
+THROTTLED_EVENT_TYPES = (PAGE_DONE, UPDATE_PROGRESS)
+
+""" Kinds of update an event belongs to """
+STM32_MODULES = "stm32_modules"
+NETWORK_STM32 = "network_stm32"
+NETWORK_BOOTLOADER = "network_bootloader"
+NETWORK_ESP32 = "network_esp32"
+NETWORK_ESP32_INTERPRETER = "network_esp32_interpreter"
+
+
+class UpdateEvent:
+    """Something which happened during an update
+
+    :param str event_type: One of EVENT_TYPES
+    :param str update: Kind of update, e.g. STM32_MODULES
+    :param str module_type: Type of the module, e.g. "led", None for updates
+    :param int module_id: Id of the module, None for updates
+    :param float progress: Progress in percent, None if it does not apply
+    :param str message: Error message or other details
+    """
+
+    def __init__(
+        self, event_type: str, update: str, module_type: str = None,
+        module_id: int = None, progress: float = None, message: str = None,
+    ):
+        self.event_type = event_type
+        self.update = update
+        self.module_type = module_type
+        self.module_id = module_id
+        self.progress = progress
+        self.message = message
+
+    def __repr__(self):
+        return (
+            f"UpdateEvent({self.event_type}, {self.update}, {self.module_type}, "
+            f"{self.module_id}, {self.progress}, {self.message})"
+        )
+
+
+class UpdateEvents:
+    """Callbacks subscribed to the events of an updater
+
+    Callbacks are called on the thread which emits the event, a GUI has to
+    hand the event over to its own thread. Progress events of a module are
+    delivered at most once per min_interval, the last one (100%) always is.
+    Nothing is built while no callback listens to an event type.
+
+    :param float min_interval: Shortest time between two progress events
+    """
+
+    def __init__(self, min_interval: float = 0.1):
+        self.min_interval = min_interval
+        self.__callbacks = []
+        self.__last_emit_time = dict()
+        self.__lock = th.Lock()
+
+    def subscribe(self, callback, event_types=None):
+        """Call callback with every event of event_types, of any type if None"""
+        event_types = frozenset(event_types) if event_types is not None else None
+        with self.__lock:
+            self.__callbacks = self.__callbacks + [(callback, event_types)]
+        return callback
+
+    def unsubscribe(self, callback) -> None:
+        with self.__lock:
+            self.__callbacks = [
+                (subscribed, event_types) for subscribed, event_types in self.__callbacks
+                if subscribed != callback
+            ]
+
+    def emit(
+        self, event_type: str, update: str, module_type: str = None,
+        module_id: int = None, progress: float = None, message: str = None,
+    ) -> bool:
+        """Deliver an event to its callbacks, False if nobody got it"""
+        callbacks = [
+            callback for callback, event_types in self.__callbacks
+            if event_types is None or event_type in event_types
+        ]
+        if not callbacks:
+            return False
+
+        if event_type in THROTTLED_EVENT_TYPES and (progress is None or progress < 100):
+            now = time.monotonic()
+            throttle_key = (event_type, update, module_id)
+            with self.__lock:
+                last_emit_time = self.__last_emit_time.get(throttle_key)
+                if last_emit_time is not None and now - last_emit_time < self.min_interval:
+                    return False
+                self.__last_emit_time[throttle_key] = now
+
+        update_event = UpdateEvent(event_type, update, module_type, module_id, progress, message)
+        for callback in callbacks:
+            try:
+                callback(update_event)
+            except Exception as e:
+                # A broken subscriber must not abort the update
+                print(f"Update event callback failed: {e}")
+        return True
@@ -0,0 +1,108 @@
+import pytest
+
+from modi_firmware_updater.core.esp32_updater import ESP32FirmwareUpdater
+from modi_firmware_updater.util import retry_policy
+from modi_firmware_updater.util.modi_winusb.modi_serialport import \
+    ModiSerialPort
+from modi_firmware_updater.util.retry_policy import RetryPolicy
+from modi_firmware_updater.util.update_events import ERROR
+
+
+class FakeSerial:
+    """Serial port of an ESP32 bootloader answering with queued packets"""
+
+    def __init__(self):
+        self.packets = []
+        self.incoming = bytearray()
+
+    def write(self, data):
+        self.packets.append(bytes(data))
+
+    def read(self, size=1):
+        data = bytes(self.incoming[:size])
+        del self.incoming[:size]
+        return data
+
+    def respond(self, cmd, success=True):
+        self.incoming += bytes([0xC0, 0x01 if success else 0x00, cmd, 0, 0, 0, 0, 0, 0xC0])
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_serial(monkeypatch):
+    fake_serial = FakeSerial()
+
+    def open_fake_port(serial_port, port):
+        serial_port._port = port
+        serial_port.serial_port = fake_serial
+        serial_port.is_open = True
+
+    monkeypatch.setattr(ModiSerialPort, "open", open_fake_port)
+    monkeypatch.setattr(
+        retry_policy.get_retry_policy, "instances",
+        {("esp32_packet", ): RetryPolicy(max_attempts=3, base_delay=0)},
+    )
+    return fake_serial
+
+
+def get_updater():
+    updater = ESP32FirmwareUpdater(device="fake")
+    updater.set_print(False)
+    updater.set_raise_error(False)
+    errors = []
+    updater.events.subscribe(errors.append, (ERROR, ))
+    return updater, errors
+
+
+def test_packet_error_is_reported_once_its_retries_run_out(fake_serial):
+    updater, errors = get_updater()
+    send_pkt = updater._ESP32FirmwareUpdater__send_pkt
+    pkt = bytes([0xC0, 0x00, updater.SPI_ATTACH_REQ, 0x08, 0xC0])
+
+    # Failed attempts which are retried are not reported
+    fake_serial.respond(updater.SPI_ATTACH_REQ, success=False)
+    fake_serial.respond(updater.SPI_ATTACH_REQ)
+    assert send_pkt(pkt, timeout=1)
+    assert len(fake_serial.packets) == 2
+    assert not errors and updater.update_error == 0
+
+    for _ in range(3):
+        fake_serial.respond(updater.SPI_ATTACH_REQ, success=False)
+    send_pkt(pkt, timeout=1)
+    assert len(fake_serial.packets) == 5
+    assert [error.message for error in errors] == ["Packet error"]
+    assert updater.update_error == -1
+
+
+class FakeComposedImage:
+    """Composed image starting at base_address"""
+
+    def __init__(self, base_address, size):
+        self.base_address = base_address
+        self.data = bytes(range(256)) * (size // 256)
+
+    def __len__(self):
+        return len(self.data)
+
+    def read(self, offset, size):
+        return self.data[offset:offset + size]
+
+
+def test_chunks_are_erased_from_the_base_address_of_the_image(fake_serial, monkeypatch):
+    erased = []
+    monkeypatch.setattr(
+        ESP32FirmwareUpdater, "_ESP32FirmwareUpdater__erase_chunk",
+        lambda updater, size, offset: erased.append((offset, size)),
+    )
+    monkeypatch.setattr(
+        ESP32FirmwareUpdater, "_ESP32FirmwareUpdater__write_chunk",
+        lambda updater, chunk, curr_seq, total_seq, manager: len(chunk) // updater.ESP_FLASH_BLOCK,
+    )
+    updater, errors = get_updater()
+    chunk_size = updater.ESP_FLASH_CHUNK
+    updater._ESP32FirmwareUpdater__write_binary_firmware(FakeComposedImage(0x8000, chunk_size * 2), None)
+
+    assert erased == [(0x8000, chunk_size), (0x8000 + chunk_size, chunk_size)]
+    assert [record["page"] for record in updater.page_timing_log.records] == [0x8000, 0x8000 + chunk_size]
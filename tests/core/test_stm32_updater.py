@@ -0,0 +1,457 @@
+import json
+import os
+import threading as th
+import time
+from base64 import b64decode
+
+import pytest
+
+from modi_firmware_updater.core.stm32_updater import (
+    STM32FirmwareMultiUpdater, STM32FirmwareUpdater)
+from modi_firmware_updater.util import (firmware_cache, firmware_journal,
+                                        firmware_ledger, rate_controller,
+                                        retry_policy, timing_profile)
+from modi_firmware_updater.util.firmware_image import FirmwareImage
+from modi_firmware_updater.util.message_util import parse_message
+from modi_firmware_updater.util.modi_winusb.modi_serialport import \
+    ModiSerialPort
+from modi_firmware_updater.util.module_registry import ModuleState
+from modi_firmware_updater.util.module_util import BROADCAST_ID, Module
+from modi_firmware_updater.util.rate_controller import RateController
+from modi_firmware_updater.util.retry_policy import RetryPolicy
+from modi_firmware_updater.util.timing_profile import TimingProfile
+from modi_firmware_updater.util.update_events import (ERROR, MODULE_DONE,
+                                                      PAGE_DONE, UPDATE_DONE,
+                                                      UPDATE_STARTED)
+
+
+class FakeSerial:
+    """Serial port of a network module, frames fed to it are read back"""
+
+    def __init__(self):
+        self.frames = []
+        self.incoming = bytearray()
+        self.lock = th.Lock()
+
+    def write(self, data):
+        with self.lock:
+            self.frames.append(json.loads(data))
+
+    def read(self, size=1):
+        with self.lock:
+            data = bytes(self.incoming[:size])
+            del self.incoming[:size]
+        if not data:
+            time.sleep(0.001)
+        return data
+
+    def feed(self, message):
+        with self.lock:
+            self.incoming += message.encode("utf8")
+
+    def get_frames(self, command):
+        with self.lock:
+            return [frame for frame in self.frames if frame["c"] == command]
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class Bootloader(FakeSerial):
+    """Network module whose modules ack every erase and CRC of their pages,
+    erases of modules in erase_errors and CRCs of modules in crc_errors or
+    of pages in crc_error_pages fail
+    """
+
+    END_FLASH_ADDR = 0x0801F800
+
+    def __init__(self):
+        super().__init__()
+        self.erase_errors = set()
+        self.crc_errors = set()
+        self.crc_error_pages = set()
+
+    def write(self, data):
+        super().write(data)
+        frame = json.loads(data)
+        if frame["c"] != 0x0D:
+            return
+        module_id = frame["d"]
+        page_addr = get_page_addr(frame)
+        if frame["s"] >> 8 == 2:
+            failed = module_id in self.erase_errors and page_addr != self.END_FLASH_ADDR
+            state = STM32FirmwareUpdater.ERASE_ERROR if failed else STM32FirmwareUpdater.ERASE_COMPLETE
+        else:
+            failed = (
+                module_id in self.crc_errors and page_addr != self.END_FLASH_ADDR
+                or page_addr in self.crc_error_pages
+            )
+            state = STM32FirmwareUpdater.CRC_ERROR if failed else STM32FirmwareUpdater.CRC_COMPLETE
+        self.feed(parse_message(0x0C, module_id, 0, (0, 0, 0, 0, state)))
+
+    def get_erased_pages(self, module_id):
+        return [
+            get_page_addr(frame) for frame in self.get_frames(0x0D)
+            if frame["d"] == module_id and frame["s"] >> 8 == 2
+            and get_page_addr(frame) != self.END_FLASH_ADDR
+        ]
+
+
+def get_page_addr(frame):
+    return int.from_bytes(b64decode(frame["b"])[4:8], "little")
+
+
+class FakeBundle:
+    """Offline bundle holding one module image"""
+
+    def __init__(self, firmware_image):
+        self.firmware_image = firmware_image
+
+    def get_version_info(self, channel):
+        return self.firmware_image.version_info
+
+    def get_version(self, channel):
+        return self.firmware_image.version
+
+    def get_image(self, channel, file_name):
+        return self.firmware_image
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def open_fake_serial(monkeypatch, fake_serial):
+    def open_fake_port(serial_port, port):
+        serial_port._port = port
+        serial_port.serial_port = fake_serial
+        serial_port.is_open = True
+
+    monkeypatch.setattr(ModiSerialPort, "open", open_fake_port)
+    monkeypatch.setattr(timing_profile.get_timing_profile, "instances", {(): TimingProfile({
+        "request_gap": 0, "reboot_settle": 0, "module_wait_timeout": 5, "discovery_settle": 0.2,
+    })})
+    return fake_serial
+
+
+@pytest.fixture
+def fake_serial(monkeypatch):
+    return open_fake_serial(monkeypatch, FakeSerial())
+
+
+@pytest.fixture
+def bootloader(tmp_path, monkeypatch):
+    bootloader = open_fake_serial(monkeypatch, Bootloader())
+    monkeypatch.setattr(firmware_cache.get_firmware_cache, "instances", {
+        (): firmware_cache.FirmwareCache(str(tmp_path / "cache")),
+    })
+    monkeypatch.setattr(firmware_ledger.get_firmware_ledger, "instances", {
+        (): firmware_ledger.FirmwareLedger(str(tmp_path / "ledger")),
+    })
+    monkeypatch.setattr(firmware_journal.get_firmware_journal, "instances", {
+        (): firmware_journal.FirmwareJournal(str(tmp_path / "journal")),
+    })
+    monkeypatch.setattr(retry_policy.get_retry_policy, "instances", {
+        (name, ): RetryPolicy(max_attempts=3, base_delay=0) for name in ("page_erase", "page_crc")
+    })
+    monkeypatch.setattr(rate_controller.get_rate_controller, "instances", {
+        ("led", "fake"): RateController(rate=1e6, min_rate=1e6, max_rate=1e6),
+    })
+    return bootloader
+
+
+def get_firmware_bundle(tmp_path, version_info="1.0.0", num_pages=3):
+    # Pages before bin_begin are not flashed
+    bin_path = str(tmp_path / "led.bin")
+    with open(bin_path, "wb") as bin_file:
+        bin_file.write(bytes(0x9000) + os.urandom(0x800 * num_pages))
+    return FakeBundle(FirmwareImage(bin_path, 0x9000, 0x800, version_info))
+
+
+def assign_module(updater, bootloader, module_id, module_uuid, version):
+    # Id and version are told by the module in its assign id message
+    byte_data = tuple(module_uuid.to_bytes(6, "little") + version.to_bytes(2, "little"))
+    bootloader.feed(parse_message(0x05, module_id, 0, byte_data))
+    wait_for(lambda: module_id in updater.module_versions)
+
+
+def flash_module(updater, module_id):
+    events = []
+    updater.events.subscribe(events.append, (ERROR, MODULE_DONE))
+    updater.add_to_module_list(module_id, "led")
+    updater.manager_thread.join(5)
+    assert not updater.manager_thread.is_alive()
+    return [(event.event_type, event.message) for event in events]
+
+
+def get_reboot_targets(bootloader):
+    return [
+        frame["d"] for frame in bootloader.get_frames(0x09)
+        if b64decode(frame["b"])[0] == Module.REBOOT
+    ]
+
+
+def get_updater(**kwargs):
+    updater = STM32FirmwareUpdater(device="fake", **kwargs)
+    updater.set_print(False)
+    updater.set_raise_error(False)
+    return updater
+
+
+def test_ack_of_another_module_leaves_the_request_pending(fake_serial):
+    updater = get_updater()
+    results = []
+    request = th.Thread(
+        target=lambda: results.append(updater.send_firmware_command("crc", 12, 0, dest_addr=0x08009000))
+    )
+    request.start()
+    wait_for(lambda: fake_serial.get_frames(0x0D))
+
+    fake_serial.feed(parse_message(0x0C, 34, 0, (0, 0, 0, 0, updater.CRC_ERROR)))
+    time.sleep(0.05)
+    assert not results
+
+    fake_serial.feed(parse_message(0x0C, 12, 0, (0, 0, 0, 0, updater.CRC_COMPLETE)))
+    request.join()
+    assert results == [True]
+    updater.close_recv_thread()
+
+
+def test_queued_modules_are_popped_into_free_slots_only(fake_serial, monkeypatch):
+    # Image work of every module, 13 fails its first attempt
+    works = {10: 1, 11: 1, 12: 1000, 13: 5000, 14: 3000, 15: 2000}
+    gates = {10: th.Event(), 11: th.Event()}
+    started, flashing_counts, failed = [], [], set()
+
+    def update_firmware(updater, module_id, module_type):
+        started.append(module_id)
+        flashing_counts.append(updater.module_registry.count(ModuleState.FLASHING))
+        if module_id in gates:
+            assert gates[module_id].wait(2)
+        update_failed = module_id == 13 and module_id not in failed
+        failed.add(module_id)
+        updater.module_registry.finish(module_id, update_failed)
+
+    monkeypatch.setattr(STM32FirmwareUpdater, "_STM32FirmwareUpdater__update_firmware", update_firmware)
+    monkeypatch.setattr(
+        STM32FirmwareUpdater, "_STM32FirmwareUpdater__queue_work",
+        lambda updater, module_id, module_type: works[module_id],
+    )
+    updater = get_updater(max_in_flight=2, force=True)
+    updater.update_module_firmware()
+
+    # Both slots are busy while the other modules are queued
+    updater.add_to_module_list(10, "led")
+    updater.add_to_module_list(11, "led")
+    wait_for(lambda: started == [10, 11])
+    for module_id in (12, 13, 14, 15):
+        updater.add_to_module_list(module_id, "led")
+    time.sleep(0.05)
+    assert started == [10, 11]
+
+    # One slot at a time, the longest image first and the retry last
+    gates[10].set()
+    wait_for(lambda: len(started) == 7)
+    gates[11].set()
+    assert started == [10, 11, 13, 14, 15, 12, 13]
+    assert max(flashing_counts) <= 2
+
+    updater.manager_thread.join(2)
+    assert not updater.manager_thread.is_alive()
+    assert updater.update_error == 1
+    assert updater.module_registry.count(ModuleState.DONE) == 6
+
+
+def test_network_module_without_update_gives_up_after_module_wait_timeout(fake_serial, monkeypatch):
+    monkeypatch.setattr(timing_profile.get_timing_profile, "instances", {(): TimingProfile({
+        "request_gap": 0, "reboot_settle": 0, "module_wait_timeout": 0.3, "discovery_settle": 0,
+    })})
+    # Update is never started on the network module
+    monkeypatch.setattr(STM32FirmwareUpdater, "update_module_firmware", lambda updater: None)
+    multi_updater = STM32FirmwareMultiUpdater()
+    update_events = []
+    multi_updater.events.subscribe(update_events.append, (UPDATE_STARTED, UPDATE_DONE))
+
+    start_time = time.monotonic()
+    multi_updater.update_module_firmware(["fake"])
+    assert time.monotonic() - start_time < 2
+    module_updater, = multi_updater.module_updaters
+    assert module_updater.update_error_message == "No modules"
+    # The GUI keeps its update list from being closed in between
+    assert [update_event.event_type for update_event in update_events] == [UPDATE_STARTED, UPDATE_DONE]
+
+
+def test_modules_in_flight_report_their_own_errors(bootloader, tmp_path):
+    updater = get_updater(max_in_flight=2, force=True, firmware_bundle=get_firmware_bundle(tmp_path))
+    updater.set_raise_error(True)
+    events = []
+    updater.events.subscribe(events.append, (ERROR, MODULE_DONE))
+    bootloader.crc_errors.add(10)
+    bootloader.erase_errors.add(11)
+
+    updater.update_module_firmware()
+    for module_id in (10, 11, 12):
+        updater.add_to_module_list(module_id, "led")
+    updater.manager_thread.join(5)
+    assert not updater.manager_thread.is_alive()
+
+    messages = {event.module_id: (event.event_type, event.message) for event in events}
+    assert messages == {
+        10: (ERROR, "led (10) check crc failed: Response Errored"),
+        11: (ERROR, "led (11) erase flash failed: Response Errored"),
+        12: (MODULE_DONE, "v1.0.0"),
+    }
+    assert updater.module_registry.get(10).error_message == messages[10][1]
+    assert updater.update_error == -1
+
+
+@pytest.mark.parametrize("version, force, skipped", [
+    ((1 << 13) | (1 << 8), False, True),
+    ((1 << 13) | (0 << 8), False, True),
+    ((1 << 13) | (1 << 8), True, False),
+    (None, False, False),
+])
+def test_modules_are_skipped_only_at_the_latest_version(bootloader, tmp_path, version, force, skipped):
+    firmware_bundle = get_firmware_bundle(tmp_path)
+    updater = get_updater(force=force, firmware_bundle=firmware_bundle)
+    updater.update_module_firmware()
+    if version is not None:
+        assign_module(updater, bootloader, 10, 0x402000000010, version)
+
+    events = flash_module(updater, 10)
+    if skipped:
+        assert events == [(MODULE_DONE, "up to date")]
+        assert updater.module_registry.get(10).state == ModuleState.SKIPPED
+        assert not [frame for frame in bootloader.get_frames(0x0D) if frame["d"] == 10]
+    else:
+        assert events == [(MODULE_DONE, "v1.0.0")]
+        assert updater.module_registry.get(10).state == ModuleState.DONE
+        assert bootloader.get_erased_pages(10) == [0x08009000, 0x08009800, 0x0800A000]
+    # Skipped modules are rebooted out of update mode as well
+    assert get_reboot_targets(bootloader) == [BROADCAST_ID]
+
+
+def write_old_image(firmware_image, tmp_path, changed_pages, version_info="0.9.0"):
+    # Image the module was flashed with before, pages at changed_pages differ
+    data = bytearray(firmware_image.read(0, firmware_image.size))
+    for page_begin in changed_pages:
+        data[page_begin] ^= 0xFF
+    bin_path = str(tmp_path / "old.bin")
+    with open(bin_path, "wb") as bin_file:
+        bin_file.write(data)
+    return FirmwareImage(bin_path, 0x9000, 0x800, version_info)
+
+
+def test_module_in_the_ledger_gets_only_its_changed_pages(bootloader, tmp_path):
+    firmware_bundle = get_firmware_bundle(tmp_path)
+    firmware_image = firmware_bundle.firmware_image
+    module_uuid = 0x402000000010
+    ledger = firmware_ledger.get_firmware_ledger()
+    old_image = write_old_image(firmware_image, tmp_path, (0x9800, ))
+    ledger.record(module_uuid, old_image)
+
+    updater = get_updater(firmware_bundle=firmware_bundle)
+    updater.update_module_firmware()
+    assign_module(updater, bootloader, 10, module_uuid, old_image.version)
+    assert flash_module(updater, 10) == [(MODULE_DONE, "v1.0.0")]
+
+    assert bootloader.get_erased_pages(10) == [0x08009800]
+    assert ledger.get_entry(module_uuid)["sha256"] == firmware_image.sha256
+
+
+def test_ledger_entry_is_forgotten_before_a_full_flash(bootloader, tmp_path):
+    firmware_bundle = get_firmware_bundle(tmp_path)
+    module_uuid = 0x402000000010
+    ledger = firmware_ledger.get_firmware_ledger()
+    old_image = write_old_image(firmware_bundle.firmware_image, tmp_path, (0x9800, ))
+    ledger.record(module_uuid, old_image)
+
+    # Module holds another version than the ledger entry
+    updater = get_updater(firmware_bundle=firmware_bundle)
+    entries = []
+    updater.events.subscribe(lambda event: entries.append(ledger.get_entry(module_uuid)), (PAGE_DONE, ))
+    updater.update_module_firmware()
+    assign_module(updater, bootloader, 10, module_uuid, old_image.version + 1)
+    assert flash_module(updater, 10) == [(MODULE_DONE, "v1.0.0")]
+
+    assert bootloader.get_erased_pages(10) == [0x08009000, 0x08009800, 0x0800A000]
+    assert entries and not any(entries)
+
+
+def test_resumed_module_gets_changed_pages_after_its_resume_page(bootloader, tmp_path):
+    firmware_bundle = get_firmware_bundle(tmp_path)
+    firmware_image = firmware_bundle.firmware_image
+    module_uuid = 0x402000000010
+    old_image = write_old_image(firmware_image, tmp_path, (0x9000, 0xA000))
+    firmware_ledger.get_firmware_ledger().record(module_uuid, old_image)
+    journal = firmware_journal.get_firmware_journal()
+    journal.confirm_page(module_uuid, firmware_image, 0x9000)
+
+    updater = get_updater(firmware_bundle=firmware_bundle)
+    updater.update_module_firmware()
+    assign_module(updater, bootloader, 10, module_uuid, old_image.version)
+    assert flash_module(updater, 10) == [(MODULE_DONE, "v1.0.0")]
+
+    assert bootloader.get_erased_pages(10) == [0x0800A000]
+    assert journal.get_resume_page(module_uuid, firmware_image) is None
+
+
+def test_journal_is_kept_after_a_failed_update(bootloader, tmp_path):
+    firmware_bundle = get_firmware_bundle(tmp_path)
+    firmware_image = firmware_bundle.firmware_image
+    module_uuid = 0x402000000010
+    bootloader.crc_error_pages.add(0x08009800)
+
+    updater = get_updater(firmware_bundle=firmware_bundle)
+    updater.update_module_firmware()
+    assign_module(updater, bootloader, 10, module_uuid, 1)
+    assert flash_module(updater, 10) == [(ERROR, "led (10) check crc failed.")]
+
+    # Retry of the module resumed after the first page, the next update does
+    assert bootloader.get_erased_pages(10).count(0x08009000) == 1
+    assert firmware_journal.get_firmware_journal().get_resume_page(module_uuid, firmware_image) == 0x9800
+    assert firmware_ledger.get_firmware_ledger().get_entry(module_uuid) is None
+
+
+def send_warning(bootloader, module_id, module_uuid, warning_type):
+    byte_data = tuple(module_uuid.to_bytes(6, "little")) + (warning_type, )
+    bootloader.feed(parse_message(0x0A, module_id, 0, byte_data))
+
+
+def test_discovery_waits_for_modules_getting_ready(bootloader, tmp_path):
+    updater = get_updater(firmware_bundle=get_firmware_bundle(tmp_path))
+    events = []
+    updater.events.subscribe(events.append, (ERROR, MODULE_DONE))
+    updater.update_module_firmware()
+
+    # Type 2 warning comes long after discovery_settle
+    time.sleep(0.3)
+    send_warning(bootloader, 10, 0x402000000010, 1)
+    time.sleep(0.5)
+    assert updater.manager_thread.is_alive()
+    send_warning(bootloader, 10, 0x402000000010, 2)
+
+    updater.manager_thread.join(5)
+    assert not updater.manager_thread.is_alive()
+    assert [(event.event_type, event.message) for event in events] == [(MODULE_DONE, "v1.0.0")]
+    assert updater.update_error == 1
+
+
+def test_kit_without_modules_ends_after_module_wait_timeout(bootloader, monkeypatch):
+    monkeypatch.setattr(timing_profile.get_timing_profile, "instances", {(): TimingProfile({
+        "request_gap": 0, "reboot_settle": 0, "module_wait_timeout": 0.5, "discovery_settle": 0.1,
+    })})
+    updater = get_updater()
+    start_time = time.monotonic()
+    updater.update_module_firmware()
+
+    updater.manager_thread.join(5)
+    assert time.monotonic() - start_time >= 0.5
+    assert updater.update_error == -1
+    assert updater.update_error_message == "No modules"
@@ -0,0 +1,17 @@
+from modi_firmware_updater import __main__ as main
+
+
+def test_module_filter_is_read_from_the_options(monkeypatch):
+    monkeypatch.setattr(main, "opts", [
+        ("-m", ""), ("--types", "motor, Led"), ("--ids", "0x200,12"), ("--uuids", "0x40100000ABC"),
+    ], raising=False)
+    module_filter = main.get_module_filter()
+    assert not module_filter.selects_all
+    assert module_filter.matches(0x200)
+    assert module_filter.matches(12)
+    assert module_filter.matches(0xABC, 0x40100000ABC)
+    assert module_filter.matches(0xB34, 0x40200000B34)
+    assert not module_filter.matches(0xC56, 0x40300000C56)
+
+    monkeypatch.setattr(main, "opts", [("-m", "")], raising=False)
+    assert main.get_module_filter().selects_all
@@ -0,0 +1,17 @@
+import json
+
+from modi_firmware_updater.util.atomic_json import write_json
+
+
+def test_json_is_replaced_in_one_step(tmp_path):
+    json_path = tmp_path / "state" / "refresh.json"
+    assert write_json(str(json_path), {"version": 1})
+    assert write_json(str(json_path), {"version": 2})
+    assert json.loads(json_path.read_text()) == {"version": 2}
+    assert [entry.name for entry in json_path.parent.iterdir()] == ["refresh.json"]
+
+
+def test_failed_write_is_not_raised(tmp_path):
+    blocking_file = tmp_path / "blocking"
+    blocking_file.write_text("")
+    assert not write_json(str(blocking_file / "refresh.json"), {})
@@ -0,0 +1,53 @@
+import pytest
+
+from modi_firmware_updater.util import firmware_cache
+from modi_firmware_updater.util.firmware_bundle import (FirmwareBundle,
+                                                        build_firmware_bundle)
+from modi_firmware_updater.util.firmware_image import (
+    get_composed_firmware_image, get_firmware_image)
+from modi_firmware_updater.util.firmware_manifest import (ESP32, MODULE,
+                                                          NETWORK,
+                                                          FirmwareManifest)
+
+
+def test_bundle_matches_local_firmware(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        firmware_cache.get_firmware_cache, "instances",
+        {(): firmware_cache.FirmwareCache(str(tmp_path / "cache"))},
+    )
+    manifest = FirmwareManifest(str(tmp_path / "latest"))
+    bundle_path = str(tmp_path / "firmware.bundle")
+    build_firmware_bundle(bundle_path, manifest)
+
+    bundle = FirmwareBundle(bundle_path)
+    assert bundle.get_version_info(MODULE) == manifest.get_version_info(MODULE)
+    assert bundle.get_version(NETWORK) == manifest.get_version(NETWORK)
+
+    image = get_firmware_image(
+        manifest.get_bin_path(MODULE, "led.bin"), 0x9000, 0x800, manifest.get_version_info(MODULE)
+    )
+    bundled_image = bundle.get_image(MODULE, "led.bin")
+    assert bundle.get_image(MODULE, "led.bin") is bundled_image
+    assert bundled_image.size == image.size
+    assert bundled_image.bin_end == image.bin_end
+    assert bundled_image.version == image.version
+    assert bundled_image.page_table == image.page_table
+    assert bundled_image.empty_pages == image.empty_pages
+    for page_begin, crc in image.page_table:
+        assert bundled_image.page(page_begin) == image.page(page_begin)
+        for offset in (page_begin, page_begin + 8, page_begin + 0x7F8):
+            assert bundled_image.get_encoded_data(offset) == image.get_encoded_data(offset)
+
+    composed_image = get_composed_firmware_image(
+        [(file["offset"], file["path"]) for file in manifest.get_files(ESP32)]
+    )
+    bundled_composed_image = bundle.get_composed_image()
+    assert len(bundled_composed_image) == len(composed_image)
+    assert bundled_composed_image.read(0x7000, 0x4000) == composed_image.read(0x7000, 0x4000)
+
+
+def test_invalid_bundle_is_rejected(tmp_path):
+    bundle_path = tmp_path / "firmware.bundle"
+    bundle_path.write_bytes(b"\x00" * 64)
+    with pytest.raises(ValueError):
+        FirmwareBundle(str(bundle_path))
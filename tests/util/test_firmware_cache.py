@@ -0,0 +1,59 @@
+import os
+import random
+
+from modi_firmware_updater.util.crc_util import calc_crc32, calc_page_crc
+from modi_firmware_updater.util.firmware_cache import (FirmwareCache,
+                                                       get_version_word)
+
+
+def bitwise_crc32(data, crc):
+    crc ^= int.from_bytes(data, byteorder="little", signed=False)
+    for _ in range(32):
+        if crc & (1 << 31) != 0:
+            crc = (crc << 1) ^ 0x4C11DB7
+        else:
+            crc <<= 1
+        crc &= 0xFFFFFFFF
+    return crc
+
+
+def test_calc_crc32_matches_bitwise():
+    rand = random.Random(0)
+    crc = 0
+    for _ in range(256):
+        word = bytes(rand.randrange(256) for _ in range(4))
+        assert calc_crc32(word, crc) == bitwise_crc32(word, crc)
+        crc = bitwise_crc32(word, crc)
+
+
+def test_get_version_word():
+    assert get_version_word("2.2.4") == 0x4204
+    assert get_version_word("v1.2.2") == (1 << 13) | (2 << 8) | 2
+
+
+def test_page_plan_is_cached_and_invalidated(tmp_path):
+    page_size = 0x800
+    bin_path = str(tmp_path / "motor.bin")
+    data = bytearray(page_size * 4 + 12)
+    data[page_size:page_size * 2] = os.urandom(page_size)
+    with open(bin_path, "wb") as bin_file:
+        bin_file.write(data)
+
+    cache_dir = str(tmp_path / "cache")
+    plan = FirmwareCache(cache_dir).get_page_plan(bin_path, page_size, page_size, "1.2.3")
+    assert plan["bin_end"] == page_size * 4
+    assert plan["pages"] == [[page_size, calc_page_crc(bytes(data[page_size:page_size * 2]))]]
+    assert plan["version"] == get_version_word("1.2.3")
+
+    # A fresh process reads the derived plan back from disk
+    cached = FirmwareCache(cache_dir).get_page_plan(bin_path, page_size, page_size, "1.2.3")
+    assert cached == plan
+    first_entries = set(os.listdir(cache_dir))
+
+    data[page_size * 2] = 1
+    with open(bin_path, "wb") as bin_file:
+        bin_file.write(data)
+    changed = FirmwareCache(cache_dir).get_page_plan(bin_path, page_size, page_size, "1.2.3")
+    assert [page for page, _ in changed["pages"]] == [page_size, page_size * 2]
+    assert changed["sha256"] != plan["sha256"]
+    assert not (first_entries - {"index.json"}) & set(os.listdir(cache_dir))
@@ -0,0 +1,106 @@
+import hashlib
+import io
+import re
+import threading as th
+import zipfile
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from modi_firmware_updater.util.firmware_download import (DownloadError,
+                                                          download_file,
+                                                          extract_firmware,
+                                                          fetch_sha256)
+from modi_firmware_updater.util.firmware_store import FirmwareStore
+
+
+def make_archive():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_content:
+        zip_content.writestr("led/Base_module.bin", bytes(range(256)) * 512)
+        zip_content.writestr("network.bin", b"\x5a" * 4096)
+    return buffer.getvalue()
+
+
+class ArchiveHandler(BaseHTTPRequestHandler):
+    archive = make_archive()
+    ranges = []
+    # Text published as the SHA-256 of the archive, none if None
+    sha256_text = None
+
+    def do_GET(self):
+        if self.path.endswith(".sha256"):
+            if self.sha256_text is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(self.sha256_text.encode("utf8"))
+            return
+
+        match = re.match(r"bytes=(\d+)-", self.headers.get("Range") or "")
+        offset = int(match.group(1)) if match else 0
+        self.ranges.append(offset)
+        self.send_response(206 if offset else 200)
+        self.send_header("ETag", '"archive"')
+        self.send_header("Content-Length", str(len(self.archive) - offset))
+        if offset:
+            self.send_header(
+                "Content-Range", f"bytes {offset}-{len(self.archive) - 1}/{len(self.archive)}"
+            )
+        self.end_headers()
+        if len(self.ranges) == 1:
+            # Drop the first connection half way through
+            self.wfile.write(self.archive[:len(self.archive) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(self.archive[offset:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def archive_url():
+    ArchiveHandler.ranges = []
+    ArchiveHandler.sha256_text = None
+    server = HTTPServer(("127.0.0.1", 0), ArchiveHandler)
+    th.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/skeleton.zip"
+    server.shutdown()
+    server.server_close()
+
+
+def test_dropped_download_is_resumed(tmp_path, archive_url):
+    archive = ArchiveHandler.archive
+    zip_path = str(tmp_path / "skeleton.zip")
+    sha256 = download_file(archive_url, zip_path, hashlib.sha256(archive).hexdigest())
+
+    assert ArchiveHandler.ranges == [0, len(archive) // 2]
+    assert sha256 == hashlib.sha256(archive).hexdigest()
+    assert (tmp_path / "skeleton.zip").read_bytes() == archive
+    assert not (tmp_path / "skeleton.zip.part").exists()
+
+    store = FirmwareStore(str(tmp_path / "store"))
+    files = extract_firmware(zip_path, {"led/Base_module.bin": "led.bin"}, store)
+    assert files == {"led.bin": hashlib.sha256(bytes(range(256)) * 512).hexdigest()}
+    assert store.has_object(files["led.bin"])
+
+
+def test_download_with_wrong_hash_is_rejected(tmp_path, archive_url):
+    with pytest.raises(DownloadError):
+        download_file(archive_url, str(tmp_path / "skeleton.zip"), "0" * 64)
+    assert not (tmp_path / "skeleton.zip").exists()
+    assert not (tmp_path / "skeleton.zip.part").exists()
+
+
+def test_published_sha256_is_fetched(archive_url):
+    assert fetch_sha256(archive_url) is None
+
+    sha256 = hashlib.sha256(ArchiveHandler.archive).hexdigest()
+    ArchiveHandler.sha256_text = f"{sha256.upper()}  skeleton.zip\n"
+    assert fetch_sha256(archive_url) == sha256
+
+    ArchiveHandler.sha256_text = "<html>Not a digest</html>"
+    with pytest.raises(DownloadError):
+        fetch_sha256(archive_url)
@@ -0,0 +1,68 @@
+import os
+
+from modi_firmware_updater.util import firmware_cache
+from modi_firmware_updater.util.firmware_image import (
+    get_composed_firmware_image, get_firmware_image)
+
+
+def test_firmware_image_is_shared(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        firmware_cache.get_firmware_cache, "instances",
+        {(): firmware_cache.FirmwareCache(str(tmp_path / "cache"))},
+    )
+    page_size = 0x800
+    bin_path = str(tmp_path / "led.bin")
+    data = bytearray(page_size * 3 + 12)
+    data[page_size * 2:page_size * 3] = os.urandom(page_size)
+    with open(bin_path, "wb") as bin_file:
+        bin_file.write(data)
+
+    image = get_firmware_image(bin_path, page_size, page_size, "1.0.0")
+    assert get_firmware_image(bin_path, page_size, page_size, "1.0.0") is image
+    assert len(image) == len(data)
+    assert image.bin_end == page_size * 3
+    assert image.is_empty_page(page_size)
+    assert not image.is_empty_page(page_size * 2)
+    assert image.page(page_size * 2) == bytes(data[page_size * 2:page_size * 3])
+    assert image.version == 1 << 13
+
+
+def test_composed_firmware_image_pads_gaps(tmp_path):
+    first_path, second_path = str(tmp_path / "first.bin"), str(tmp_path / "second.bin")
+    with open(first_path, "wb") as bin_file:
+        bin_file.write(b"\x01\x02")
+    with open(second_path, "wb") as bin_file:
+        bin_file.write(b"\x03")
+
+    image = get_composed_firmware_image([(0x10, first_path), (0x14, second_path)])
+    assert len(image) == 5
+    assert image.read(0, 0x10) == b"\x01\x02\xff\xff\x03"
+    assert image.read(1, 3) == b"\x02\xff\xff"
+
+
+def test_erased_pages_are_planned_erase_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        firmware_cache.get_firmware_cache, "instances",
+        {(): firmware_cache.FirmwareCache(str(tmp_path / "cache"))},
+    )
+    page_size = 0x800
+    bin_path = str(tmp_path / "motor.bin")
+    data = bytearray(page_size * 4 + 12)
+    data[page_size:page_size * 2] = b"\xFF" * page_size
+    data[page_size * 2:page_size * 3] = os.urandom(page_size)
+    data[page_size * 3:page_size * 4] = b"\xFF" * page_size
+    with open(bin_path, "wb") as bin_file:
+        bin_file.write(data)
+
+    image = get_firmware_image(bin_path, 0, page_size)
+    assert image.is_empty_page(0)
+    assert image.is_erased_page(page_size) and not image.is_empty_page(page_size)
+    assert [page_begin for page_begin, _ in image.page_table] == [page_size * 2]
+    assert image.get_plan_summary() == {
+        "pages": 4,
+        "data_pages": 1,
+        "erased_pages": 2,
+        "empty_pages": 1,
+        "frames_saved": 3 * page_size // 8,
+        "round_trips_saved": 2 + 2,
+    }
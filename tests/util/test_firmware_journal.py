@@ -0,0 +1,31 @@
+import os
+
+from modi_firmware_updater.util import firmware_cache
+from modi_firmware_updater.util.firmware_image import FirmwareImage
+from modi_firmware_updater.util.firmware_journal import FirmwareJournal
+
+
+def test_update_resumes_after_confirmed_page(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        firmware_cache.get_firmware_cache, "instances",
+        {(): firmware_cache.FirmwareCache(str(tmp_path / "cache"))},
+    )
+    page_size = 0x800
+    bin_path, other_path = str(tmp_path / "led.bin"), str(tmp_path / "motor.bin")
+    for image_path in (bin_path, other_path):
+        with open(image_path, "wb") as bin_file:
+            bin_file.write(os.urandom(page_size * 4))
+
+    journal = FirmwareJournal(str(tmp_path / "journal"))
+    module_uuid = 0x402012345678
+    image = FirmwareImage(bin_path, 0, page_size, "1.0.0")
+    assert journal.get_resume_page(module_uuid, image) is None
+
+    journal.confirm_page(module_uuid, image, page_size)
+    journal.confirm_page(module_uuid, image, page_size * 2)
+    assert journal.get_resume_page(module_uuid, image) == page_size * 3
+    # Checkpoint of another image is of no use
+    assert journal.get_resume_page(module_uuid, FirmwareImage(other_path, 0, page_size, "1.0.0")) is None
+
+    journal.finish(module_uuid)
+    assert journal.get_resume_page(module_uuid, image) is None
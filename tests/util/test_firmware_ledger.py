@@ -0,0 +1,35 @@
+import os
+
+from modi_firmware_updater.util import firmware_cache
+from modi_firmware_updater.util.firmware_image import FirmwareImage
+from modi_firmware_updater.util.firmware_ledger import FirmwareLedger
+
+
+def test_only_changed_pages_are_flashed(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        firmware_cache.get_firmware_cache, "instances",
+        {(): firmware_cache.FirmwareCache(str(tmp_path / "cache"))},
+    )
+    page_size = 0x800
+    data = bytearray(os.urandom(page_size * 4))
+    data[page_size * 3:] = b"\xFF" * page_size
+    old_path, new_path = str(tmp_path / "old.bin"), str(tmp_path / "new.bin")
+    with open(old_path, "wb") as bin_file:
+        bin_file.write(data)
+    data[page_size + 5] ^= 0xFF
+    data[page_size * 3:] = os.urandom(page_size)
+    with open(new_path, "wb") as bin_file:
+        bin_file.write(data)
+
+    ledger = FirmwareLedger(str(tmp_path / "ledger"))
+    module_uuid = 0x402012345678
+    new_image = FirmwareImage(new_path, 0, page_size, "1.1.0")
+    assert ledger.get_changed_pages(module_uuid, 1 << 13, new_image) is None
+
+    ledger.record(module_uuid, FirmwareImage(old_path, 0, page_size, "1.0.0"))
+    assert ledger.get_changed_pages(module_uuid, 1 << 13, new_image) == {page_size, page_size * 3}
+    # Module reporting another version holds something else
+    assert ledger.get_changed_pages(module_uuid, 2 << 13, new_image) is None
+
+    ledger.forget(module_uuid)
+    assert ledger.get_entry(module_uuid) is None
@@ -0,0 +1,28 @@
+from modi_firmware_updater.util.firmware_cache import get_version_word
+from modi_firmware_updater.util.firmware_manifest import (ESP32, MODULE,
+                                                          NETWORK,
+                                                          FirmwareManifest)
+
+
+def test_manifest_falls_back_to_bundled_firmware(tmp_path):
+    manifest = FirmwareManifest(str(tmp_path))
+
+    version_info = manifest.get_version_info(MODULE)
+    assert manifest.get_version(MODULE) == get_version_word(version_info)
+    assert manifest.get_file(MODULE, "motor.bin")["size"] > 0
+    assert manifest.get_file(NETWORK, "network.bin")["offset"] == 0x08009000
+    assert [file["offset"] for file in manifest.get_files(ESP32)] == [
+        0x1000, 0x8000, 0xD000, 0x10000, 0xD0000
+    ]
+
+
+def test_manifest_prefers_latest_firmware(tmp_path):
+    (tmp_path / "stm32").mkdir()
+    (tmp_path / "stm32" / "version.txt").write_text("v9.1.2\n")
+    (tmp_path / "stm32" / "led.bin").write_bytes(b"\x01" * 16)
+
+    manifest = FirmwareManifest(str(tmp_path))
+    assert manifest.get_version_info(MODULE) == "9.1.2"
+    assert manifest.get_version(MODULE) == (9 << 13) | (1 << 8) | 2
+    assert manifest.get_file(MODULE, "led.bin")["size"] == 16
+    assert manifest.get_file(MODULE, "motor.bin")["sha256"] is None
@@ -0,0 +1,92 @@
+import threading as th
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from modi_firmware_updater.util import firmware_manifest, firmware_store
+from modi_firmware_updater.util.firmware_manifest import NETWORK
+from modi_firmware_updater.util.firmware_refresher import FirmwareRefresher
+from modi_firmware_updater.util.firmware_store import FirmwareStore
+
+
+class VersionHandler(BaseHTTPRequestHandler):
+    version = b"v1.0.1\n"
+    etag = '"1.0.1"'
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(self.version)))
+        self.end_headers()
+        self.wfile.write(self.version)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def version_url():
+    VersionHandler.requests = []
+    server = HTTPServer(("127.0.0.1", 0), VersionHandler)
+    th.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/version.txt"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = FirmwareStore(str(tmp_path / "store"))
+    monkeypatch.setattr(firmware_store.get_firmware_store, "instances", {(): store})
+    monkeypatch.setattr(firmware_manifest.get_firmware_manifest, "instances", dict())
+    return store
+
+
+def test_version_is_revalidated_with_etag(tmp_path, version_url):
+    refresher = FirmwareRefresher(str(tmp_path / "refresh.json"), ttl=0)
+    assert refresher.fetch_version(version_url) == "v1.0.1\n"
+    assert refresher.fetch_version(version_url) == "v1.0.1\n"
+    assert VersionHandler.requests == [None, '"1.0.1"']
+
+    # Within the TTL the version is not requested at all
+    refresher.ttl = 60
+    assert refresher.fetch_version(version_url) == "v1.0.1\n"
+    assert len(VersionHandler.requests) == 2
+
+
+def test_new_version_is_downloaded_in_background(tmp_path, version_url, store):
+    downloads = []
+
+    def download(version_text):
+        downloads.append(version_text)
+        version_key = store.add_version(
+            NETWORK, version_text, {"network.bin": b"\x01" * 8}, "base_version.txt"
+        )
+        store.activate(NETWORK, version_key)
+        return True
+
+    refresher = FirmwareRefresher(str(tmp_path / "refresh.json"), ttl=0)
+    refresher.add_channel(NETWORK, version_url, download)
+    refresher.start()
+    assert refresher.wait(10) == {NETWORK: FirmwareRefresher.DOWNLOADED}
+    assert downloads == ["v1.0.1\n"]
+
+    # A stored version is activated again instead of being downloaded
+    previous = store.add_version(NETWORK, "v1.0.0\n", {"network.bin": b"\x00" * 8}, "base_version.txt")
+    store.activate(NETWORK, previous)
+    firmware_manifest.reload_firmware_manifest()
+    assert refresher.check() == {NETWORK: FirmwareRefresher.ACTIVATED}
+    assert firmware_manifest.get_firmware_manifest().get_version_info(NETWORK) == "1.0.1"
+    assert len(downloads) == 1
+
+
+def test_unreachable_server_is_offline(tmp_path):
+    refresher = FirmwareRefresher(str(tmp_path / "refresh.json"), timeout=1)
+    refresher.add_channel(NETWORK, "http://127.0.0.1:9/version.txt", None)
+    assert refresher.check() == {NETWORK: FirmwareRefresher.OFFLINE}
@@ -0,0 +1,70 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from modi_firmware_updater.util.firmware_manifest import (NETWORK,
+                                                          FirmwareManifest)
+from modi_firmware_updater.util.firmware_store import FirmwareStore
+
+
+def test_versions_live_side_by_side(tmp_path):
+    store = FirmwareStore(str(tmp_path / "store"))
+    current = store.add_version(NETWORK, "v1.0.0\n", {"network.bin": b"\x01" * 32}, "base_version.txt")
+    assert store.add_version(NETWORK, "v1.0.0\n", {"network.bin": b"\x01" * 32}, "base_version.txt") == current
+    following = store.add_version(NETWORK, "v1.0.1\n", {"network.bin": b"\x02" * 32}, "base_version.txt")
+
+    assert store.get_active_path(NETWORK) is None
+    store.activate(NETWORK, current)
+    manifest = FirmwareManifest(str(tmp_path / "latest"), store)
+    assert manifest.get_version_info(NETWORK) == "1.0.0"
+    assert manifest.get_file(NETWORK, "network.bin")["size"] == 32
+
+    # Prefetched version only becomes visible once it is activated
+    assert store.find_version(NETWORK, "v1.0.1") == following
+    store.activate(NETWORK, following)
+    assert FirmwareManifest(str(tmp_path / "latest"), store).get_version_info(NETWORK) == "1.0.1"
+    assert os.path.exists(manifest.get_bin_path(NETWORK, "network.bin"))
+
+
+def test_prune_keeps_active_version(tmp_path):
+    store = FirmwareStore(str(tmp_path / "store"))
+    versions = [
+        store.add_version(NETWORK, f"v1.0.{i}", {"network.bin": bytes([i]) * 8})
+        for i in range(3)
+    ]
+    store.activate(NETWORK, versions[0])
+    store.prune(keep=0)
+
+    assert store.list_versions(NETWORK) == [versions[0]]
+    assert len(os.listdir(tmp_path / "store" / "objects")) == 1
+
+
+def test_prune_keeps_objects_not_recorded_yet(tmp_path):
+    store = FirmwareStore(str(tmp_path / "store"))
+    current = store.add_version(NETWORK, "v1.0.0", {"network.bin": b"\x01" * 8})
+    store.activate(NETWORK, current)
+
+    # Next version is still being downloaded while the store is pruned
+    sha256 = store.add_stream(io.BytesIO(b"\x02" * 8))
+    store.prune(keep=0)
+    assert store.has_object(sha256)
+
+    following = store.add_version(NETWORK, "v1.0.1", {"network.bin": sha256})
+    store.activate(NETWORK, following)
+    store.prune(keep=0)
+    assert store.list_versions(NETWORK) == [following]
+    assert not store.has_object(hashlib.sha256(b"\x01" * 8).hexdigest())
+
+
+def test_version_of_objects_not_stored_is_rejected(tmp_path):
+    store = FirmwareStore(str(tmp_path / "store"))
+    sha256 = store.add_object(b"\x01" * 32)
+    version_key = store.add_version(NETWORK, "v1.0.0", {"network.bin": sha256})
+    assert store.find_version(NETWORK, "1.0.0") == version_key
+
+    for data in ("network.bin", "0" * 64):
+        with pytest.raises(ValueError):
+            store.add_version(NETWORK, "v1.0.1", {"network.bin": data})
+    assert store.find_version(NETWORK, "1.0.1") is None
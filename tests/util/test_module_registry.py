@@ -0,0 +1,54 @@
+from modi_firmware_updater.util.module_registry import (ModuleRegistry,
+                                                        ModuleState)
+
+
+def test_modules_are_queued_once_in_order():
+    module_registry = ModuleRegistry()
+    for module_id in (12, 13, 12, 14, 13):
+        module_record = module_registry.discover(module_id, "led")
+        if module_record.state == ModuleState.DISCOVERED:
+            module_registry.queue(module_id)
+    assert not module_registry.queue(12)
+
+    assert len(module_registry) == 3
+    assert module_registry.count(ModuleState.QUEUED) == 3
+    assert [module_registry.pop_queued().module_id for _ in range(3)] == [12, 13, 14]
+    assert module_registry.pop_queued() is None
+    assert module_registry.count(ModuleState.FLASHING) == 3
+
+
+def test_finished_states_are_counted():
+    module_registry = ModuleRegistry(max_attempts=1)
+    for module_id in (12, 13, 14):
+        module_registry.discover(module_id, "motor")
+    module_registry.skip(12)
+    module_registry.queue(13)
+    module_registry.queue(14)
+    module_registry.pop_queued()
+    module_registry.pop_queued()
+    module_registry.finish(13)
+    module_registry.finish(14, failed=True)
+
+    assert module_registry.count(*ModuleState.FINISHED_STATES) == 3
+    assert module_registry.count(ModuleState.DONE, ModuleState.FAILED) == 2
+    assert [record.module_id for record in module_registry.get_records(ModuleState.SKIPPED)] == [12]
+
+    module_registry.reset()
+    assert len(module_registry) == 0
+    assert module_registry.count(*ModuleState.STATES) == 0
+
+
+def test_longest_image_first_and_failures_last():
+    module_registry = ModuleRegistry("longest_first", max_attempts=2)
+    for module_id, work in ((12, 1000), (13, 5000), (14, 3000)):
+        module_registry.discover(module_id, "led")
+        module_registry.queue(module_id, work)
+
+    assert module_registry.pop_queued().module_id == 13
+    assert module_registry.finish(13, failed=True)
+    assert [module_registry.pop_queued().module_id for _ in range(3)] == [14, 12, 13]
+
+    # Retries are bounded
+    assert not module_registry.finish(13, failed=True)
+    assert module_registry.get(13).state == ModuleState.FAILED
+    assert module_registry.pop_queued() is None
@@ -0,0 +1,25 @@
+from modi_firmware_updater.util.module_util import (ModuleFilter,
+                                                    get_module_type_from_uuid)
+
+MOTOR_UUID = 0x40100000A12
+LED_UUID = 0x40200000B34
+
+
+def test_module_type_is_read_from_uuid():
+    assert get_module_type_from_uuid(MOTOR_UUID) == "motor"
+    assert get_module_type_from_uuid(0x123) == "network"
+
+
+def test_module_filter_selects_by_type_id_or_uuid():
+    assert ModuleFilter().selects_all
+    assert ModuleFilter().matches(0xA12)
+
+    module_filter = ModuleFilter(module_types=["Motor"], module_ids=[0x200], module_uuids=[LED_UUID])
+    assert not module_filter.selects_all
+    assert module_filter.get_module_ids() == {0x200, 0xB34}
+    assert module_filter.matches(0xA12, MOTOR_UUID)
+    assert module_filter.matches(0xB34, LED_UUID)
+    assert module_filter.matches(0x200)
+    # Modules selected by type or UUID are only known by their UUID
+    assert not module_filter.matches(0xB34)
+    assert not module_filter.matches(0xC56, 0x40200000C56)
@@ -0,0 +1,56 @@
+import threading as th
+import time
+
+from modi_firmware_updater.util.pacer import Pacer
+
+
+def test_pacer_keeps_rate_without_spinning():
+    pacer = Pacer()
+    interval = 0.0004
+    frames = 500
+
+    def send(sender):
+        for _ in range(frames):
+            pacer.pace(sender, interval)
+
+    init_time, init_cpu_time = time.perf_counter(), time.process_time()
+    senders = [th.Thread(target=send, args=(index, )) for index in range(4)]
+    for sender in senders:
+        sender.start()
+    for sender in senders:
+        sender.join()
+    elapsed, cpu_time = time.perf_counter() - init_time, time.process_time() - init_cpu_time
+
+    assert pacer.frames == 4 * frames
+    assert frames * interval * 0.9 < elapsed < frames * interval * 3
+    # Four senders spinning would take about four times the elapsed time
+    assert cpu_time < elapsed
+
+
+def test_reset_sender_starts_new_schedule():
+    pacer = Pacer(min_sleep=0.0005)
+    pacer.pace("led", 0.0001)
+    pacer.pace("led", 0.0001)
+    pacer.reset("led")
+    init_time = time.perf_counter()
+    pacer.pace("led", 0.0001)
+    assert time.perf_counter() - init_time < 0.0005
+
+
+def test_resync_keeps_schedule_ahead_of_now():
+    pacer = Pacer(min_sleep=0.0005)
+    pacer.pace("link", 0.01)
+    pacer.pace("link", 0.01)
+    # Another module's frames are scheduled ahead, they are not burst
+    pacer.resync("link")
+    init_time = time.perf_counter()
+    pacer.pace("link", 0.01)
+    assert time.perf_counter() - init_time > 0.005
+
+    # A schedule left behind starts from now
+    time.sleep(0.03)
+    pacer.resync("link")
+    init_time = time.perf_counter()
+    pacer.pace("link", 0.001)
+    pacer.pace("link", 0.001)
+    assert time.perf_counter() - init_time > 0.0015
@@ -0,0 +1,53 @@
+import json
+
+from modi_firmware_updater.util.page_timing import (PageTiming, PageTimingLog,
+                                                    get_percentile)
+
+
+def test_percentiles_use_nearest_rank():
+    values = list(range(1, 21))
+    assert get_percentile(values, 0.5) == 10
+    assert get_percentile(values, 0.95) == 19
+    assert get_percentile([], 0.5) == 0
+
+
+def test_page_records_are_summarized_and_exported(tmp_path):
+    page_timing_log = PageTimingLog("led", 12)
+    for page_index in range(4):
+        page_timing = PageTiming(0x9000 + page_index * 0x800)
+        page_timing.durations["erase"] = 0.01 * (page_index + 1)
+        with page_timing.measure("data"):
+            pass
+        page_timing_log.add_page(page_timing, retries=page_index % 2, retry_time=0.002)
+    page_timing_log.finish()
+
+    summary = page_timing_log.get_summary()
+    assert summary["pages"] == 4
+    assert summary["failed_pages"] == 0
+    assert summary["retries"] == 2
+    assert summary["erase"]["p50"] == 0.02
+    assert summary["erase"]["max"] == 0.04
+    assert summary["retry"]["p95"] == 0.002
+
+    export_path = str(tmp_path / "timings.jsonl")
+    page_timing_log.export(export_path)
+    with open(export_path) as export_file:
+        lines = [json.loads(line) for line in export_file]
+    assert [line["page"] for line in lines[:4]] == [0x9000, 0x9800, 0xA000, 0xA800]
+    assert lines[4]["summary"] and lines[4]["module_id"] == 12
+
+
+def test_failed_pages_are_timed_but_not_counted_as_written():
+    page_timing_log = PageTimingLog("led", 12)
+    page_timing_log.add_page(PageTiming(0x9000))
+    page_timing = PageTiming(0x9800)
+    page_timing.durations["crc"] = 0.5
+    page_timing_log.add_page(page_timing, retries=2, failed=True)
+    page_timing_log.finish()
+
+    summary = page_timing_log.get_summary()
+    assert summary["pages"] == 1
+    assert summary["failed_pages"] == 1
+    assert summary["retries"] == 2
+    assert summary["crc"]["max"] == 0.5
+    assert "1 failed pages" in page_timing_log.format_summary()
@@ -0,0 +1,145 @@
+import os
+
+import pytest
+from serial.serialutil import SerialException
+
+from modi_firmware_updater.util import firmware_cache
+from modi_firmware_updater.util.firmware_image import get_firmware_image
+from modi_firmware_updater.util.firmware_manifest import NETWORK
+from modi_firmware_updater.util.pacer import Pacer
+from modi_firmware_updater.util.page_timing import PageTimingLog
+from modi_firmware_updater.util.paged_flash import FLASH_LAYOUTS, PagedFlash
+from modi_firmware_updater.util.rate_controller import RateController
+
+
+class FakeBootloader:
+    def __init__(self, crc_failures=0):
+        self.crc_failures = crc_failures
+        self.commands = []
+        self.frames = 0
+
+    def erase_page(self, page_addr):
+        self.commands.append(("erase", page_addr))
+        return True
+
+    def send_data(self, seq_num, encoded_data):
+        self.frames += 1
+
+    def check_crc(self, page_addr, page_crc):
+        self.commands.append(("crc", page_addr))
+        if self.crc_failures:
+            self.crc_failures -= 1
+            return False
+        return True
+
+
+def get_paged_flash(tmp_path, monkeypatch, bootloader):
+    monkeypatch.setattr(
+        firmware_cache.get_firmware_cache, "instances",
+        {(): firmware_cache.FirmwareCache(str(tmp_path / "cache"))},
+    )
+    layout = FLASH_LAYOUTS[NETWORK]
+    page_size = layout.page_size
+    bin_path = str(tmp_path / "network.bin")
+    # Pages at 0x800 data, 0x1000 empty and 0x1800 erased
+    data = bytearray(page_size * 4 + 12)
+    data[page_size:page_size * 2] = os.urandom(page_size)
+    data[page_size * 3:page_size * 4] = b"\xFF" * page_size
+    with open(bin_path, "wb") as bin_file:
+        bin_file.write(data)
+
+    firmware_image = get_firmware_image(bin_path, layout.bin_begin, page_size)
+    return PagedFlash(
+        layout, firmware_image, bootloader.erase_page, bootloader.send_data,
+        bootloader.check_crc, RateController(rate=1e6, max_rate=1e6), Pacer(),
+        bootloader, PageTimingLog("network", 0xFFF),
+    )
+
+
+def test_pages_are_written_at_their_layout_address(tmp_path, monkeypatch):
+    bootloader = FakeBootloader()
+    paged_flash = get_paged_flash(tmp_path, monkeypatch, bootloader)
+    written_pages = []
+    assert paged_flash.write(on_page_written=written_pages.append)
+
+    # Network pages are written above its bootloader, 0x8800 into the flash
+    assert bootloader.commands == [
+        ("erase", 0x08009000), ("crc", 0x08009000), ("erase", 0x0800A000),
+    ]
+    assert bootloader.frames == 0x800 // 8
+    assert written_pages == [0x800, 0x1800]
+    assert paged_flash.pages_written == 1
+
+
+def test_page_is_retried_until_its_crc_policy_runs_out(tmp_path, monkeypatch):
+    bootloader = FakeBootloader(crc_failures=1)
+    paged_flash = get_paged_flash(tmp_path, monkeypatch, bootloader)
+    assert paged_flash.write()
+    assert bootloader.commands.count(("crc", 0x08009000)) == 2
+
+    bootloader = FakeBootloader(crc_failures=10)
+    paged_flash = get_paged_flash(tmp_path, monkeypatch, bootloader)
+    assert not paged_flash.write()
+    assert paged_flash.error_message == "check crc failed."
+    assert ("erase", 0x0800A000) not in bootloader.commands
+    # Failed page is still timed, but not counted as written
+    summary = paged_flash.page_timing_log.get_summary()
+    assert summary["pages"] == 0
+    assert summary["failed_pages"] == 1
+    assert summary["retries"] == 2
+
+
+def test_erase_retries_start_over_after_every_erase(tmp_path, monkeypatch):
+    # Every erase fails once before it succeeds and the first two CRCs fail,
+    # which takes more erase attempts than one erase may have
+    bootloader = FakeBootloader(crc_failures=2)
+    erase_page = bootloader.erase_page
+    erase_results = iter([False, True] * 3)
+    bootloader.erase_page = lambda page_addr: erase_page(page_addr) and next(erase_results)
+    paged_flash = get_paged_flash(tmp_path, monkeypatch, bootloader)
+    assert paged_flash.write(pages={0x800})
+    assert bootloader.commands.count(("erase", 0x08009000)) == 6
+
+
+def test_raising_crc_request_is_a_failed_attempt(tmp_path, monkeypatch):
+    bootloader = FakeBootloader()
+    check_crc = bootloader.check_crc
+    crc_errors = iter([Exception("Response timed-out")])
+
+    def raise_once(page_addr, page_crc):
+        check_crc(page_addr, page_crc)
+        crc_error = next(crc_errors, None)
+        if crc_error:
+            raise crc_error
+        return True
+
+    bootloader.check_crc = raise_once
+    paged_flash = get_paged_flash(tmp_path, monkeypatch, bootloader)
+    assert paged_flash.write()
+    assert bootloader.commands.count(("crc", 0x08009000)) == 2
+    assert paged_flash.page_timing_log.get_summary()["retries"] == 1
+
+
+def test_page_fails_once_raising_erases_run_out(tmp_path, monkeypatch):
+    # Same engine writes the network base, whose erase requests raise too
+    bootloader = FakeBootloader()
+    erase_page = bootloader.erase_page
+
+    def time_out(page_addr):
+        erase_page(page_addr)
+        raise Exception("Response timed-out")
+
+    bootloader.erase_page = time_out
+    paged_flash = get_paged_flash(tmp_path, monkeypatch, bootloader)
+    assert not paged_flash.write()
+    assert paged_flash.error_message == "erase flash failed: Response timed-out"
+    assert bootloader.commands == [("erase", 0x08009000)] * 3
+    assert paged_flash.page_timing_log.get_summary()["failed_pages"] == 1
+
+    def close_port(page_addr):
+        raise SerialException("Port is closed")
+
+    bootloader.erase_page = close_port
+    paged_flash = get_paged_flash(tmp_path, monkeypatch, bootloader)
+    with pytest.raises(SerialException):
+        paged_flash.write()
@@ -0,0 +1,29 @@
+import time
+
+from modi_firmware_updater.util.progress_model import ProgressModel
+
+
+def test_progress_spans_the_whole_queue():
+    progress_model = ProgressModel(min_sample_time=0)
+    progress_model.add_module(1, 3000)
+    progress_model.add_module(2, 1000)
+    assert progress_model.progress == 0
+    assert progress_model.eta is None
+
+    progress_model.advance(1, 1000)
+    assert progress_model.progress == 25
+    progress_model.complete(1)
+    assert progress_model.progress == 75
+    assert progress_model.remaining_work == 1000
+
+
+def test_eta_follows_smoothed_throughput():
+    progress_model = ProgressModel(smoothing=0.5, min_sample_time=0.01)
+    progress_model.add_module(1, 10000)
+    progress_model.advance(1, 0)
+    for _ in range(3):
+        time.sleep(0.02)
+        progress_model.advance(1, 200)
+
+    # About 10000 bytes/s, so 9400 bytes left take about a second
+    assert 0.3 < progress_model.eta < 3
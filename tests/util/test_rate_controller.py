@@ -0,0 +1,26 @@
+from modi_firmware_updater.util.rate_controller import (RateController,
+                                                        get_rate_controller)
+
+
+def test_rate_increases_additively_and_decreases_multiplicatively():
+    rate_controller = RateController(rate=1000, min_rate=250, max_rate=1200, increase=50, decrease=0.5)
+    for _ in range(3):
+        rate_controller.on_success()
+    assert rate_controller.rate == 1150
+    rate_controller.on_success()
+    assert rate_controller.rate == 1200
+
+    rate_controller.on_failure()
+    assert rate_controller.rate == 600
+    assert rate_controller.interval == 1 / 600
+    for _ in range(3):
+        rate_controller.on_failure()
+    assert rate_controller.rate == 250
+    assert rate_controller.to_dict() == {"rate": 250, "successes": 4, "failures": 4}
+
+
+def test_rates_are_kept_per_module_type_and_port():
+    rate_controller = get_rate_controller("led", "/dev/ttyACM9")
+    assert get_rate_controller("led", "/dev/ttyACM9") is rate_controller
+    assert get_rate_controller("led", "/dev/ttyACM8") is not rate_controller
+    assert get_rate_controller("motor", "/dev/ttyACM9") is not rate_controller
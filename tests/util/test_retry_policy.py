@@ -0,0 +1,74 @@
+import pytest
+from serial.serialutil import SerialException
+
+from modi_firmware_updater.util import retry_policy as retry_policy_module
+from modi_firmware_updater.util.retry_policy import (RetryPolicy,
+                                                     format_retry_summary,
+                                                     get_retry_counts)
+
+
+def test_retries_are_bounded_and_counted():
+    retry_policy = RetryPolicy(max_attempts=3, base_delay=0.001, jitter=0)
+    calls = []
+
+    @retry_policy
+    def send():
+        calls.append(None)
+        raise Exception("Response timed-out")
+
+    with pytest.raises(Exception):
+        send()
+    assert len(calls) == 3
+    assert retry_policy.to_dict()["retries"] == 2
+    assert retry_policy.failures == 1
+    assert retry_policy.retry_time >= 0.001 + 0.002
+
+
+def test_fatal_exceptions_are_not_retried():
+    retry_policy = RetryPolicy(max_attempts=5, base_delay=0)
+    calls = []
+
+    def send():
+        calls.append(None)
+        raise SerialException("Port is closed")
+
+    with pytest.raises(SerialException):
+        retry_policy.call(send)
+    assert len(calls) == 1
+
+
+class FakeClock:
+    """Clock which only moves while sleeping"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.now += delay
+
+
+def test_attempts_stop_at_time_budget(monkeypatch):
+    monkeypatch.setattr(retry_policy_module, "time", FakeClock())
+    retry_policy = RetryPolicy(max_attempts=100, base_delay=0.01, backoff=1, jitter=0, time_budget=0.035)
+    attempts = retry_policy.begin()
+    retries = 0
+    while attempts.retry():
+        retries += 1
+    assert retries == 3
+
+
+def test_retry_summary_leaves_out_earlier_runs(monkeypatch):
+    retry_policy = RetryPolicy(max_attempts=2, base_delay=0, jitter=0)
+    monkeypatch.setattr(retry_policy_module.get_retry_policy, "instances", {("page_crc", ): retry_policy})
+    retry_policy.begin().retry()
+    assert format_retry_summary(dict()).startswith("Retries of page_crc: 1, 0 given up")
+
+    retry_counts = get_retry_counts()
+    assert format_retry_summary(retry_counts) == ""
+    attempts = retry_policy.begin()
+    attempts.retry()
+    attempts.retry()
+    assert format_retry_summary(retry_counts).startswith("Retries of page_crc: 1, 1 given up")
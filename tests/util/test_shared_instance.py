@@ -0,0 +1,20 @@
+from modi_firmware_updater.util.shared_instance import shared_instance
+
+
+def test_one_instance_is_made_per_arguments():
+    made = []
+
+    @shared_instance
+    def get_instance(name: str = "default") -> list:
+        """Instance of name"""
+        made.append(name)
+        return [name]
+
+    assert get_instance() is get_instance()
+    assert get_instance("motor") is get_instance("motor")
+    assert made == ["default", "motor"]
+    assert get_instance.__doc__ == "Instance of name"
+
+    replacement = get_instance.set_instance(["led"], "motor")
+    assert get_instance("motor") is replacement
+    assert get_instance.get_instances() == {(): ["default"], ("motor", ): ["led"]}
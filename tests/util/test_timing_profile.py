@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from modi_firmware_updater.util import timing_profile
+from modi_firmware_updater.util.timing_profile import (DEFAULT_TIMINGS,
+                                                       TimingProfile)
+
+
+def test_timings_are_overridden_by_name(tmp_path):
+    profile_path = tmp_path / "timing_profile.json"
+    profile_path.write_text(json.dumps({"reboot_settle": 0.2}))
+
+    timing_profile = TimingProfile.load(str(profile_path))
+    assert timing_profile.get("reboot_settle") == 0.2
+    assert timing_profile.get("close_settle") == DEFAULT_TIMINGS["close_settle"]
+
+    with pytest.raises(ValueError):
+        TimingProfile({"reboot_setle": 0.2})
+
+
+def test_waits_are_counted_as_idle_time():
+    timing_profile = TimingProfile({"request_gap": 0.001, "reboot_settle": 0})
+    timing_profile.wait("request_gap")
+    timing_profile.wait("request_gap")
+    timing_profile.wait("reboot_settle")
+    assert timing_profile.idle_time == pytest.approx(0.002)
+    assert timing_profile.get_idle_times() == {"request_gap": pytest.approx(0.002)}
+
+    timing_profile.reset_idle_time()
+    assert timing_profile.idle_time == 0
+
+
+@pytest.mark.parametrize("profile_text", [
+    '{"reboot_settle": ',
+    '{"reboot_setle": 0.2}',
+    '{"reboot_settle": -1}',
+    '{"reboot_settle": "1"}',
+    '[0.2]',
+])
+def test_bad_profile_falls_back_to_default_timings(tmp_path, monkeypatch, profile_text):
+    profile_path = tmp_path / "timing_profile.json"
+    profile_path.write_text(profile_text)
+    monkeypatch.setattr(timing_profile, "get_default_timing_profile_path", lambda: str(profile_path))
+    monkeypatch.setattr(timing_profile.get_timing_profile, "instances", dict())
+
+    with pytest.raises(ValueError):
+        TimingProfile.load(str(profile_path))
+    assert timing_profile.get_timing_profile().timings == DEFAULT_TIMINGS
@@ -0,0 +1,46 @@
+from modi_firmware_updater.util.update_events import (ERROR, MODULE_DONE,
+                                                      PAGE_DONE, STM32_MODULES,
+                                                      UpdateEvents)
+
+
+def test_events_reach_their_subscribers():
+    update_events = UpdateEvents()
+    received = []
+    errors = []
+    update_events.subscribe(received.append)
+    update_events.subscribe(errors.append, (ERROR, ))
+
+    update_events.emit(MODULE_DONE, STM32_MODULES, "led", 12, 100)
+    update_events.emit(ERROR, STM32_MODULES, "led", 13, message="check crc failed.")
+
+    assert [update_event.event_type for update_event in received] == [MODULE_DONE, ERROR]
+    assert len(errors) == 1 and errors[0].module_id == 13
+
+    update_events.unsubscribe(received.append)
+    assert not update_events.emit(MODULE_DONE, STM32_MODULES, "led", 12, 100)
+
+
+def test_page_events_are_throttled_per_module():
+    update_events = UpdateEvents(min_interval=60)
+    received = []
+    update_events.subscribe(received.append)
+
+    assert update_events.emit(PAGE_DONE, STM32_MODULES, "led", 12, 10)
+    assert not update_events.emit(PAGE_DONE, STM32_MODULES, "led", 12, 20)
+    assert update_events.emit(PAGE_DONE, STM32_MODULES, "motor", 14, 20)
+    # Last page of a module is always delivered
+    assert update_events.emit(PAGE_DONE, STM32_MODULES, "led", 12, 100)
+    assert len(received) == 3
+
+
+def test_broken_subscriber_does_not_stop_others():
+    update_events = UpdateEvents()
+    received = []
+
+    def broken_callback(update_event):
+        raise ValueError("broken")
+
+    update_events.subscribe(broken_callback)
+    update_events.subscribe(received.append)
+    assert update_events.emit(MODULE_DONE, STM32_MODULES, "led", 12, 100)
+    assert len(received) == 1